@@ -18,11 +18,36 @@ class Configuracion:
     # Configuración de Base de Datos
     DB_PATH: str = os.getenv('DB_PATH', 'data/gym_database.db')
     
+    # Perfil de PRAGMAs aplicado a cada conexión SQLite
+    DB_JOURNAL_MODE: str = os.getenv('DB_JOURNAL_MODE', 'WAL')
+    DB_SYNCHRONOUS: str = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+    DB_CACHE_SIZE_KB: int = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))
+    DB_MMAP_SIZE_MB: int = int(os.getenv('DB_MMAP_SIZE_MB', '128'))
+    DB_TEMP_STORE: str = os.getenv('DB_TEMP_STORE', 'MEMORY')
+    DB_MANTENIMIENTO_INTERVALO_SEGUNDOS: int = int(os.getenv('DB_MANTENIMIENTO_INTERVALO_SEGUNDOS', '300'))
+    
+    # Perfil de consultas: tiempos por sentencia y log de las que superen el umbral
+    DB_PERFIL_CONSULTAS: bool = os.getenv('DB_PERFIL_CONSULTAS', 'true').lower() == 'true'
+    DB_SLOW_QUERY_MS: float = float(os.getenv('DB_SLOW_QUERY_MS', '100'))
+    
+    # Almacén de archivos binarios (fotos de progreso) fuera de la BD
+    BLOBS_DIR: str = os.getenv('BLOBS_DIR', 'data/blobs')
+    MINIATURAS_CACHE_MB: int = int(os.getenv('MINIATURAS_CACHE_MB', '32'))
+    
     # Configuración de Servidor
     SERVER_HOST: str = os.getenv('SERVER_HOST', '0.0.0.0')
     SERVER_PORT: int = int(os.getenv('SERVER_PORT', '8000'))
     SERVER_WORKERS: int = int(os.getenv('SERVER_WORKERS', '4'))
     
+    # Pool de conexiones a BD (por defecto una conexión por worker)
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', str(SERVER_WORKERS)))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv('DB_POOL_TIMEOUT_SECONDS', '30'))
+    
+    # Ejecutores fuera del event loop: threads para I/O de BD, procesos para bcrypt
+    DB_THREAD_POOL_SIZE: int = int(os.getenv('DB_THREAD_POOL_SIZE', str(DB_POOL_SIZE)))
+    HASH_PROCESS_POOL_SIZE: int = int(os.getenv('HASH_PROCESS_POOL_SIZE', str(min(4, os.cpu_count() or 1))))
+    
     # Configuración de Seguridad
     SECRET_KEY: str = os.getenv('SECRET_KEY', 'cambiar-en-produccion-clave-super-secreta')
     JWT_ALGORITHM: str = 'HS256'
@@ -34,18 +59,69 @@ class Configuracion:
     LOG_FILE: str = os.getenv('LOG_FILE', 'logs/app.log')
     LOG_MAX_SIZE_MB: int = int(os.getenv('LOG_MAX_SIZE_MB', '10'))
     LOG_BACKUP_COUNT: int = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    # Escritura de logs en un thread aparte: tamaño de la cola y política al
+    # llenarse ('descartar' INFO/DEBUG o 'bloquear' al llamador)
+    LOG_ASINCRONO: bool = os.getenv('LOG_ASINCRONO', 'true').lower() == 'true'
+    LOG_COLA_MAX: int = int(os.getenv('LOG_COLA_MAX', '10000'))
+    LOG_POLITICA_COLA: str = os.getenv('LOG_POLITICA_COLA', 'descartar')
+    # Formato del archivo de log ('json' o 'texto') y muestreo de los GET
+    # exitosos en el log de peticiones (se registra 1 de cada N; 1 = todos)
+    LOG_FORMATO_ARCHIVO: str = os.getenv('LOG_FORMATO_ARCHIVO', 'json')
+    LOG_MUESTREO_GET_OK: int = int(os.getenv('LOG_MUESTREO_GET_OK', '10'))
     
     # Configuración de Rate Limiting
     RATE_LIMIT_ENABLED: bool = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
     RATE_LIMIT_PER_MINUTE: int = int(os.getenv('RATE_LIMIT_PER_MINUTE', '60'))
     
+    # Ingesta por lotes: presupuesto propio de rate limiting y tamaño máximo
+    RATE_LIMIT_LOTE_POR_MINUTO: int = int(os.getenv('RATE_LIMIT_LOTE_POR_MINUTO', '10'))
+    LOTE_MAX_ITEMS: int = int(os.getenv('LOTE_MAX_ITEMS', '500'))
+    
+    # Compresión de respuestas (Brotli si está brotli-asgi, si no GZip) y
+    # serialización con orjson si está instalado
+    COMPRESION_HABILITADA: bool = os.getenv('COMPRESION_HABILITADA', 'true').lower() == 'true'
+    COMPRESION_TAMANO_MINIMO: int = int(os.getenv('COMPRESION_TAMANO_MINIMO', '1024'))
+    COMPRESION_NIVEL_GZIP: int = int(os.getenv('COMPRESION_NIVEL_GZIP', '6'))
+    COMPRESION_BROTLI: bool = os.getenv('COMPRESION_BROTLI', 'true').lower() == 'true'
+    COMPRESION_NIVEL_BROTLI: int = int(os.getenv('COMPRESION_NIVEL_BROTLI', '4'))
+    JSON_RAPIDO: bool = os.getenv('JSON_RAPIDO', 'true').lower() == 'true'
+    
+    # Cabecera Idempotency-Key: horas que se conserva la respuesta original y
+    # segundos que una petición en curso mantiene reservada su clave
+    IDEMPOTENCIA_TTL_HORAS: float = float(os.getenv('IDEMPOTENCIA_TTL_HORAS', '24'))
+    IDEMPOTENCIA_EN_CURSO_SEGUNDOS: float = float(os.getenv('IDEMPOTENCIA_EN_CURSO_SEGUNDOS', '60'))
+    
+    # Sondas de salud: segundos que se reutiliza el resultado de /readyz y /health
+    READYZ_CACHE_SECONDS: float = float(os.getenv('READYZ_CACHE_SECONDS', '5'))
+    HEALTH_CACHE_SECONDS: float = float(os.getenv('HEALTH_CACHE_SECONDS', '15'))
+    
     # Configuración de Aplicación Cliente
     MADRE_BASE_URL: str = os.getenv('MADRE_BASE_URL', 'http://localhost:8000')
     SYNC_INTERVAL_SECONDS: int = int(os.getenv('SYNC_INTERVAL_SECONDS', '300'))
+    HIJA_OFFLINE_DB_PATH: str = os.getenv('HIJA_OFFLINE_DB_PATH', 'data/hija_offline.db')
+    # Timeout por request; los reintentos son seguros gracias a Idempotency-Key
+    HIJA_TIMEOUT_SEGUNDOS: float = float(os.getenv('HIJA_TIMEOUT_SEGUNDOS', '10'))
+    # Reenvío de la cola offline: registros por POST y espera máxima sin evento de reconexión
+    OFFLINE_LOTE_TAMANO: int = int(os.getenv('OFFLINE_LOTE_TAMANO', '100'))
+    OFFLINE_REINTENTO_SEGUNDOS: float = float(os.getenv('OFFLINE_REINTENTO_SEGUNDOS', '60'))
+    
+    # Sesión HTTP del cliente: conexiones keep-alive reutilizadas por host
+    HTTP_POOL_CONNECTIONS: int = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv('HTTP_POOL_MAXSIZE', '8'))
+    HTTP_POOL_BLOCK: bool = os.getenv('HTTP_POOL_BLOCK', 'false').lower() == 'true'
+    
+    # Monitor de conectividad: sondeo con conexión y backoff (con jitter) sin ella
+    RED_INTERVALO_SONDEO_SEGUNDOS: float = float(os.getenv('RED_INTERVALO_SONDEO_SEGUNDOS', '30'))
+    RED_ESPERA_MINIMA_SEGUNDOS: float = float(os.getenv('RED_ESPERA_MINIMA_SEGUNDOS', '1'))
+    RED_ESPERA_MAXIMA_SEGUNDOS: float = float(os.getenv('RED_ESPERA_MAXIMA_SEGUNDOS', '60'))
     
     # Configuración de Caché
     CACHE_ENABLED: bool = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
-    CACHE_TTL_SECONDS: int = int(os.getenv('CACHE_TTL_SECONDS', '3600'))
+    # La caché de respuestas vive en este proceso: las escrituras de otros
+    # procesos y el cambio de mes no la invalidan, así que el TTL es corto
+    CACHE_TTL_SECONDS: int = int(os.getenv('CACHE_TTL_SECONDS', '60'))
+    CACHE_MAX_ENTRADAS: int = int(os.getenv('CACHE_MAX_ENTRADAS', '512'))
+    CONTEO_CACHE_SECONDS: float = float(os.getenv('CONTEO_CACHE_SECONDS', '60'))
     
     # Validación de membresía
     MEMBERSHIP_CHECK_HOURS: int = int(os.getenv('MEMBERSHIP_CHECK_HOURS', '72'))
@@ -54,6 +130,18 @@ class Configuracion:
     ENVIRONMENT: str = os.getenv('ENVIRONMENT', 'development')
     DEBUG: bool = os.getenv('DEBUG', 'false').lower() == 'true'
     
+    @classmethod
+    def pragmas_sqlite(cls) -> dict:
+        """Perfil de PRAGMAs SQLite derivado de la configuración"""
+        return {
+            'journal_mode': cls.DB_JOURNAL_MODE,
+            'synchronous': cls.DB_SYNCHRONOUS,
+            'busy_timeout': cls.DB_BUSY_TIMEOUT_MS,
+            'cache_size': -cls.DB_CACHE_SIZE_KB,  # Negativo = tamaño en KiB
+            'mmap_size': cls.DB_MMAP_SIZE_MB * 1024 * 1024,
+            'temp_store': cls.DB_TEMP_STORE,
+        }
+    
     @classmethod
     def validar_configuracion(cls) -> bool:
         """Validar que la configuración sea correcta al inicio"""
@@ -96,6 +184,9 @@ class Configuracion:
         print(f"Entorno: {cls.ENVIRONMENT}")
         print(f"Debug: {cls.DEBUG}")
         print(f"Base de Datos: {cls.DB_PATH}")
+        print(f"Pool de Conexiones BD: {cls.DB_POOL_SIZE}")
+        print(f"Ejecutores: {cls.DB_THREAD_POOL_SIZE} threads BD, {cls.HASH_PROCESS_POOL_SIZE} procesos hash")
+        print(f"Modo de Journal BD: {cls.DB_JOURNAL_MODE} (synchronous={cls.DB_SYNCHRONOUS})")
         print(f"Servidor: {cls.SERVER_HOST}:{cls.SERVER_PORT}")
         print(f"Nivel de Log: {cls.LOG_LEVEL}")
         print(f"Archivo de Log: {cls.LOG_FILE}")
@@ -0,0 +1,12 @@
+"""
+Configuración común de las pruebas
+
+La instancia global gestor_bd se crea al importar madre_db; se apunta
+DB_PATH a un archivo temporal antes de cualquier import para que las
+pruebas nunca abran data/gym_database.db.
+"""
+
+import os
+import tempfile
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='gym_pruebas_'), 'gym_database.db')
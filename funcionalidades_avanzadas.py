@@ -7,6 +7,13 @@ from pathlib import Path
 from dataclasses import dataclass
 import threading
 import queue
+from config.settings import config
+from shared.pool_conexiones import obtener_pool
+from shared.almacen_blobs import AlmacenBlobs
+from shared.miniaturas import ServicioMiniaturas
+from shared.logger import obtener_logger
+
+logger = obtener_logger(__name__)
 
 
 @dataclass
@@ -14,7 +21,7 @@ class ProgressPhoto:
     id: int
     user_id: int
     fecha: str
-    imagen_base64: str
+    imagen_ref: str
     peso_kg: float
     notas: str
     medidas: Dict[str, float]
@@ -66,16 +73,20 @@ class GestorFuncionalidadesAvanzadas:
 
     def __init__(self, db_path: str='data/gym_database.db'):
         self.db_path = db_path
+        self.pool = obtener_pool(db_path)
+        self.almacen = AlmacenBlobs(config.BLOBS_DIR)
+        self.miniaturas = ServicioMiniaturas(self.almacen, config.
+            MINIATURAS_CACHE_MB * 1024 * 1024)
         self._inicializar_tablas()
         self.processing_queue = queue.Queue()
         self.worker_thread = threading.Thread(target=self._procesar_cola,
             daemon=True)
         self.worker_thread.start()
+        if self._hay_fotos_sin_migrar():
+            self.processing_queue.put(self.migrar_fotos_a_blobs)
 
     def _get_connection(self) ->sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return self.pool.adquirir()
 
     def _inicializar_tablas(self):
         conn = self._get_connection()
@@ -86,7 +97,8 @@ class GestorFuncionalidadesAvanzadas:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 fecha TEXT NOT NULL,
-                imagen_base64 TEXT NOT NULL,
+                imagen_base64 TEXT,
+                imagen_ref TEXT,
                 peso_kg REAL,
                 notas TEXT,
                 medidas_json TEXT,
@@ -181,6 +193,11 @@ class GestorFuncionalidadesAvanzadas:
             )
         """
             )
+        columnas_fotos = {row['name'] for row in cursor.execute(
+            'PRAGMA table_info(fotos_progreso)')}
+        if 'imagen_ref' not in columnas_fotos:
+            cursor.execute(
+                'ALTER TABLE fotos_progreso ADD COLUMN imagen_ref TEXT')
         cursor.execute(
             'CREATE INDEX IF NOT EXISTS idx_fotos_user ON fotos_progreso(user_id)'
             )
@@ -203,9 +220,7 @@ class GestorFuncionalidadesAvanzadas:
 
     def agregar_foto_progreso(self, user_id: int, imagen_path: str, peso_kg:
         float, notas: str='', medidas: Optional[Dict[str, float]]=None) ->int:
-        with open(imagen_path, 'rb') as f:
-            imagen_bytes = f.read()
-            imagen_base64 = base64.b64encode(imagen_bytes).decode('utf-8')
+        imagen_ref = self.almacen.guardar_archivo(imagen_path)
         medidas = medidas or {}
         medidas_json = json.dumps(medidas)
         fecha = datetime.now().isoformat()
@@ -214,13 +229,14 @@ class GestorFuncionalidadesAvanzadas:
         cursor.execute(
             """
             INSERT INTO fotos_progreso 
-            (user_id, fecha, imagen_base64, peso_kg, notas, medidas_json)
-            VALUES (?, ?, ?, ?, ?, ?)
+            (user_id, fecha, imagen_base64, imagen_ref, peso_kg, notas, medidas_json)
+            VALUES (?, ?, '', ?, ?, ?, ?)
         """
-            , (user_id, fecha, imagen_base64, peso_kg, notas, medidas_json))
+            , (user_id, fecha, imagen_ref, peso_kg, notas, medidas_json))
         foto_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        self.processing_queue.put(lambda : self.miniaturas.generar(imagen_ref))
         self._verificar_logros_progreso(user_id)
         return foto_id
 
@@ -230,7 +246,8 @@ class GestorFuncionalidadesAvanzadas:
         cursor = conn.cursor()
         cursor.execute(
             """
-            SELECT * FROM fotos_progreso
+            SELECT id, user_id, fecha, imagen_ref, peso_kg, notas, medidas_json
+            FROM fotos_progreso
             WHERE user_id = ?
             ORDER BY fecha DESC
             LIMIT ?
@@ -241,21 +258,83 @@ class GestorFuncionalidadesAvanzadas:
             medidas = json.loads(row['medidas_json']) if row['medidas_json'
                 ] else {}
             foto = ProgressPhoto(id=row['id'], user_id=row['user_id'],
-                fecha=row['fecha'], imagen_base64=row['imagen_base64'],
+                fecha=row['fecha'], imagen_ref=row['imagen_ref'] or '',
                 peso_kg=row['peso_kg'], notas=row['notas'], medidas=medidas)
             fotos.append(foto)
         conn.close()
         return fotos
 
+    def leer_imagen_progreso(self, imagen_ref: str) ->bytes:
+        if not imagen_ref:
+            raise FileNotFoundError(
+                'La foto aún no se ha migrado al almacén de imágenes')
+        return self.almacen.leer(imagen_ref)
+
+    def obtener_miniatura_progreso(self, imagen_ref: str, tamano: str):
+        if not imagen_ref:
+            raise FileNotFoundError(
+                'La foto aún no se ha migrado al almacén de imágenes')
+        return self.miniaturas.obtener(imagen_ref, tamano)
+
+    def _hay_fotos_sin_migrar(self) ->bool:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT 1 FROM fotos_progreso
+            WHERE imagen_ref IS NULL AND imagen_base64 != ''
+            LIMIT 1
+        """
+            )
+        pendiente = cursor.fetchone() is not None
+        conn.close()
+        return pendiente
+
+    def migrar_fotos_a_blobs(self, tamano_lote: int=20) ->int:
+        # Mueve las fotos antiguas (base64 en la BD) al almacén de blobs por
+        # lotes pequeños, para no retener la conexión ni la memoria mucho tiempo
+        migradas = 0
+        while True:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, imagen_base64 FROM fotos_progreso
+                WHERE imagen_ref IS NULL AND imagen_base64 != ''
+                LIMIT ?
+            """
+                , (tamano_lote,))
+            filas = cursor.fetchall()
+            conn.close()
+            if not filas:
+                break
+            actualizaciones = [(self.almacen.guardar(base64.b64decode(row[
+                'imagen_base64'])), row['id']) for row in filas]
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.executemany(
+                """
+                UPDATE fotos_progreso SET imagen_ref = ?, imagen_base64 = ''
+                WHERE id = ?
+            """
+                , actualizaciones)
+            conn.commit()
+            conn.close()
+            migradas += len(actualizaciones)
+        if migradas:
+            logger.info(f'Fotos de progreso migradas al almacén de blobs: {migradas}')
+        return migradas
+
     def comparar_fotos_progreso(self, user_id: int, foto1_id: int, foto2_id:
         int) ->Dict:
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM fotos_progreso WHERE id = ?', (foto1_id,)
+        consulta = (
+            'SELECT fecha, peso_kg, medidas_json FROM fotos_progreso WHERE id = ?'
             )
+        cursor.execute(consulta, (foto1_id,))
         foto1 = cursor.fetchone()
-        cursor.execute('SELECT * FROM fotos_progreso WHERE id = ?', (foto2_id,)
-            )
+        cursor.execute(consulta, (foto2_id,))
         foto2 = cursor.fetchone()
         conn.close()
         if not foto1 or not foto2:
@@ -387,6 +466,7 @@ class GestorFuncionalidadesAvanzadas:
             'SELECT COUNT(*) as total FROM fotos_progreso WHERE user_id = ?',
             (user_id,))
         total_fotos = cursor.fetchone()['total']
+        conn.close()
         if total_fotos >= 1:
             self._otorgar_logro(user_id, 'Primera Foto',
                 'Has registrado tu primera foto de progreso', 'progreso', '📸')
@@ -396,7 +476,6 @@ class GestorFuncionalidadesAvanzadas:
         if total_fotos >= 50:
             self._otorgar_logro(user_id, 'Maestro del Progreso',
                 'Has registrado 50 fotos de progreso', 'progreso', '🎥', 3)
-        conn.close()
 
     def _otorgar_logro_objetivo(self, user_id: int, tipo_objetivo: str):
         nombre = f'Objetivo de {tipo_objetivo.capitalize()} Alcanzado'
@@ -553,12 +632,14 @@ class GestorFuncionalidadesAvanzadas:
         while True:
             try:
                 task = self.processing_queue.get(timeout=1)
-                task()
-                self.processing_queue.task_done()
             except queue.Empty:
                 continue
+            try:
+                task()
             except Exception as e:
                 print(f'Error procesando tarea: {e}')
+            finally:
+                self.processing_queue.task_done()
 
 
 gestor_funcionalidades = GestorFuncionalidadesAvanzadas()
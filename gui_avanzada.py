@@ -1,17 +1,20 @@
 import customtkinter as ctk
-from typing import List
+from typing import List, Optional, Set
 from funcionalidades_avanzadas import gestor_funcionalidades, ProgressPhoto, Objetivo, Logro
 from datetime import datetime
-import base64
-from io import BytesIO
-from PIL import Image
+from shared.tareas_ui import EjecutorTareasUI
 
 
 class PanelProgreso(ctk.CTkScrollableFrame):
 
-    def __init__(self, master, user_id: int, **kwargs):
+    def __init__(self, master, user_id: int, tareas: Optional[
+        EjecutorTareasUI]=None, **kwargs):
         super().__init__(master, **kwargs)
         self.user_id = user_id
+        # Sin ejecutor compartido, el panel usa uno propio y lo cierra al destruirse
+        self._tareas_propias = tareas is None
+        self.tareas = tareas or EjecutorTareasUI(self, max_workers=2)
+        self._vistas_imagenes: Set[str] = set()
         titulo = ctk.CTkLabel(self, text='📊 Mi Progreso', font=ctk.CTkFont(
             size=24, weight='bold'))
         titulo.pack(pady=(20, 10))
@@ -37,6 +40,7 @@ class PanelProgreso(ctk.CTkScrollableFrame):
         self._cargar_fotos_progreso()
 
     def _cargar_fotos_progreso(self):
+        self._cancelar_imagenes('tarjeta')
         for widget in self.frame_timeline.winfo_children():
             widget.destroy()
         fotos = gestor_funcionalidades.obtener_linea_tiempo_progreso(self.
@@ -59,6 +63,10 @@ class PanelProgreso(ctk.CTkScrollableFrame):
         lbl_fecha = ctk.CTkLabel(card, text=f'📅 {fecha_str}', font=ctk.
             CTkFont(size=14, weight='bold'))
         lbl_fecha.pack(pady=(10, 5), anchor='w', padx=10)
+        lbl_miniatura = ctk.CTkLabel(card, text='Cargando...', width=160,
+            height=160)
+        lbl_miniatura.pack(pady=5, padx=10, anchor='w')
+        self._cargar_imagen_async(foto, 'tarjeta', lbl_miniatura)
         info_frame = ctk.CTkFrame(card)
         info_frame.pack(fill='x', padx=10, pady=5)
         lbl_peso = ctk.CTkLabel(info_frame, text=
@@ -82,20 +90,50 @@ class PanelProgreso(ctk.CTkScrollableFrame):
         ventana = ctk.CTkToplevel(self)
         ventana.title('Foto de Progreso')
         ventana.geometry('600x700')
-        try:
-            imagen_bytes = base64.b64decode(foto.imagen_base64)
-            imagen = Image.open(BytesIO(imagen_bytes))
-            max_size = 550, 550
-            imagen.thumbnail(max_size, Image.Resampling.LANCZOS)
-            lbl_info = ctk.CTkLabel(ventana, text=
-                f"""Foto del {datetime.fromisoformat(foto.fecha).strftime('%d/%m/%Y')}
+        lbl_info = ctk.CTkLabel(ventana, text=
+            f"""Foto del {datetime.fromisoformat(foto.fecha).strftime('%d/%m/%Y')}
 Peso: {foto.peso_kg} kg"""
-                , font=ctk.CTkFont(size=14))
-            lbl_info.pack(pady=20)
-        except Exception as e:
-            lbl_error = ctk.CTkLabel(ventana, text=
-                f'Error al cargar imagen: {e}', font=ctk.CTkFont(size=12))
-            lbl_error.pack(pady=20)
+            , font=ctk.CTkFont(size=14))
+        lbl_info.pack(pady=20)
+        lbl_imagen = ctk.CTkLabel(ventana, text='Cargando imagen...', font=
+            ctk.CTkFont(size=12))
+        lbl_imagen.pack(pady=10)
+        self._cargar_imagen_async(foto, 'visor', lbl_imagen)
+
+    def _cancelar_imagenes(self, tamano: Optional[str]=None):
+        prefijo = f'imagen_{tamano}_' if tamano else 'imagen_'
+        for vista in [v for v in self._vistas_imagenes if v.startswith(
+            prefijo)]:
+            self.tareas.cancelar(vista)
+            self._vistas_imagenes.discard(vista)
+
+    def destroy(self):
+        self._cancelar_imagenes()
+        if self._tareas_propias:
+            self.tareas.cerrar()
+        super().destroy()
+
+    def _cargar_imagen_async(self, foto: ProgressPhoto, tamano: str, destino):
+        # La lectura y decodificación ocurren en el ejecutor; recargar la
+        # línea de tiempo o destruir el panel descarta las cargas en curso.
+        # La vista incluye el widget destino: dos visores de la misma foto
+        # no se cancelan entre sí
+        vista = f'imagen_{tamano}_{foto.id}_{id(destino)}'
+        self._vistas_imagenes.add(vista)
+        self.tareas.ejecutar(gestor_funcionalidades.
+            obtener_miniatura_progreso, foto.imagen_ref, tamano, vista=
+            vista, al_terminar=lambda imagen: self._mostrar_imagen(
+            destino, imagen), al_fallar=lambda e: self._mostrar_error_imagen
+            (destino, e))
+
+    def _mostrar_imagen(self, destino, imagen):
+        if destino.winfo_exists():
+            destino.configure(image=ctk.CTkImage(light_image=imagen, size=
+                imagen.size), text='')
+
+    def _mostrar_error_imagen(self, destino, error: BaseException):
+        if destino.winfo_exists():
+            destino.configure(text=f'Error al cargar imagen: {error}')
 
     def _mostrar_dialogo_nueva_foto(self):
         dialogo = ctk.CTkToplevel(self)
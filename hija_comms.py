@@ -4,138 +4,186 @@ Implementa comunicación robusta con manejo de conectividad offline
 """
 
 import requests
-import json
-from typing import Dict, Optional, List
+from requests.adapters import HTTPAdapter
+import asyncio
+from typing import Callable, Dict, Optional, List
 from datetime import datetime
 import time
-import queue
 import threading
+import uuid
 
 from config.settings import config
 from shared.logger import obtener_logger
+from shared.network_monitor import MonitorRed
+from shared.offline_queue import AlmacenOffline
+
+# httpx es opcional: sin él, el cliente asíncrono delega en el cliente síncrono
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 # Configurar logger
 logger = obtener_logger(__name__)
 
+# Métodos que llevan Idempotency-Key: la misma clave se reutiliza en cada
+# reintento, así el servidor no repite una escritura que ya confirmó
+METODOS_IDEMPOTENTES = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Rutas que no son escrituras de negocio (login): sin Idempotency-Key, para
+# que el servidor no guarde su respuesta con el token
+RUTAS_SIN_IDEMPOTENCIA = ('/api/auth/',)
+
+
+def _requiere_clave_idempotencia(metodo: str, endpoint: str) -> bool:
+    return metodo in METODOS_IDEMPOTENTES and not endpoint.startswith(RUTAS_SIN_IDEMPOTENCIA)
+
+
+# Respuestas tras las que una escritura debe reintentarse más tarde (desde la
+# cola offline) en lugar de darse por fallida: token vencido, clave aún en
+# curso en el servidor, rate limit o error del servidor
+ESTADOS_REINTENTABLES = {401, 409, 429}
+
+
+def _es_reintentable(respuesta) -> bool:
+    """True si no hubo respuesta o su status indica un fallo transitorio"""
+    return (respuesta is None or respuesta.status_code in ESTADOS_REINTENTABLES
+            or respuesta.status_code >= 500)
+
+
+def crear_sesion_http() -> requests.Session:
+    """
+    Crear sesión HTTP con pool de conexiones keep-alive
+    
+    Reutilizar la sesión evita el handshake TCP en cada llamada al servidor.
+    """
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,  # Hosts distintos en caché
+        pool_maxsize=config.HTTP_POOL_MAXSIZE,          # Conexiones por host
+        pool_block=config.HTTP_POOL_BLOCK
+    )
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    return sesion
+
 
 class GestorConectividad:
-    """Gestor de estado de conectividad de red"""
+    """
+    Gestor de estado de conectividad de red
     
-    def __init__(self):
-        self.conectado = False
-        self.ultima_verificacion = None
-        self.intentos_fallidos = 0
-        self.max_intentos = 5
+    Envoltorio del MonitorRed: el sondeo ocurre en segundo plano, así que
+    esta_conectado() solo lee el estado cacheado y nunca hace requests.
+    """
+    
+    def __init__(self, sesion: Optional[requests.Session] = None):
+        self.sesion = sesion or crear_sesion_http()
+        self.monitor = MonitorRed(
+            self._sondear_servidor,
+            intervalo_conectado=config.RED_INTERVALO_SONDEO_SEGUNDOS,
+            espera_minima=config.RED_ESPERA_MINIMA_SEGUNDOS,
+            espera_maxima=config.RED_ESPERA_MAXIMA_SEGUNDOS
+        )
+        self.monitor.iniciar()
+    
+    @property
+    def conectado(self) -> bool:
+        return self.monitor.conectado
+    
+    @property
+    def intentos_fallidos(self) -> int:
+        return self.monitor.fallos_consecutivos
+    
+    def _sondear_servidor(self) -> bool:
+        """Sondeo ejecutado por el monitor en su propio thread"""
+        respuesta = self.sesion.get(f"{config.MADRE_BASE_URL}/readyz", timeout=5)
+        return respuesta.status_code == 200
+    
+    def suscribir(self, callback: Callable[[bool], None]):
+        """Registrar una función a invocar con el nuevo estado en cada transición"""
+        self.monitor.suscribir(callback)
+    
+    def desuscribir(self, callback: Callable[[bool], None]):
+        """Dejar de notificar a una función suscrita"""
+        self.monitor.desuscribir(callback)
+    
+    def suscribir_reconexion(self, callback: Callable[[], None]):
+        """Registrar una función a invocar cada vez que se recupera la conexión"""
+        self.monitor.suscribir(lambda conectado: callback() if conectado else None)
+    
+    def actualizar_estado(self, conectado: bool):
+        """Registrar el resultado de un contacto con el servidor"""
+        self.monitor.reportar(conectado)
     
     def verificar_conectividad(self) -> bool:
-        """Verificar si hay conectividad con el servidor"""
+        """Verificar ahora la conectividad con el servidor (bloqueante)"""
         try:
-            respuesta = requests.get(
-                f"{config.MADRE_BASE_URL}/health",
-                timeout=5
-            )
-            
-            if respuesta.status_code == 200:
-                self.conectado = True
-                self.intentos_fallidos = 0
-                self.ultima_verificacion = datetime.now()
-                logger.info("✅ Conectividad verificada exitosamente")
-                return True
-        
+            conectado = self._sondear_servidor()
         except requests.exceptions.RequestException as e:
-            self.conectado = False
-            self.intentos_fallidos += 1
             logger.warning(f"❌ Sin conectividad con servidor: {e}")
+            conectado = False
         
-        return False
+        self.monitor.reportar(conectado)
+        return conectado
     
     def esta_conectado(self) -> bool:
-        """Obtener estado actual de conectividad"""
-        # Verificar si necesitamos actualizar el estado
-        if self.ultima_verificacion:
-            segundos_desde_verificacion = (datetime.now() - self.ultima_verificacion).total_seconds()
-            if segundos_desde_verificacion > 60:  # Verificar cada minuto
-                return self.verificar_conectividad()
-        else:
-            return self.verificar_conectividad()
-        
-        return self.conectado
+        """Obtener estado actual de conectividad (sin requests)"""
+        return self.monitor.conectado
+    
+    def cerrar(self):
+        """Detener el sondeo en segundo plano"""
+        self.monitor.detener()
 
 
 class ColaOperacionesOffline:
     """Cola de operaciones pendientes para cuando no hay conexión"""
     
-    def __init__(self):
-        self.cola = queue.Queue()
-        self.operaciones_pendientes = []
-        self._cargar_operaciones_persistidas()
+    MAX_INTENTOS = 3
+    
+    def __init__(self, almacen: AlmacenOffline):
+        self.almacen = almacen
     
     def agregar_operacion(self, operacion: Dict):
-        """Agregar operación a la cola"""
+        """Agregar operación a la cola (un INSERT, sin reescribir la cola)"""
         operacion['timestamp'] = datetime.now().isoformat()
         operacion['intentos'] = 0
-        
-        self.cola.put(operacion)
-        self.operaciones_pendientes.append(operacion)
-        self._persistir_operaciones()
+        # El servidor descarta reenvíos con la misma clave
+        operacion.setdefault('clave_idempotencia', str(uuid.uuid4()))
+        operacion['id'] = self.almacen.encolar(operacion)
         
         logger.info(f"Operación agregada a cola offline: {operacion.get('tipo', 'desconocida')}")
     
     def obtener_operacion(self) -> Optional[Dict]:
         """Obtener siguiente operación de la cola"""
-        try:
-            return self.cola.get_nowait()
-        except queue.Empty:
-            return None
+        return self.almacen.siguiente_operacion()
+    
+    def obtener_lote(self, limite: int) -> List[Dict]:
+        """Obtener las siguientes operaciones listas para enviarse"""
+        return self.almacen.siguiente_lote(limite)
     
     def marcar_completada(self, operacion: Dict):
         """Marcar operación como completada"""
-        if operacion in self.operaciones_pendientes:
-            self.operaciones_pendientes.remove(operacion)
-            self._persistir_operaciones()
-            logger.info(f"Operación completada: {operacion.get('tipo', 'desconocida')}")
+        self.almacen.completar(operacion['id'])
+        logger.info(f"Operación completada: {operacion.get('tipo', 'desconocida')}")
+    
+    def marcar_completadas(self, operaciones: List[Dict]):
+        """Marcar varias operaciones como completadas en una transacción"""
+        self.almacen.completar_lote([op['id'] for op in operaciones])
+        logger.info(f"{len(operaciones)} operaciones offline completadas")
     
     def marcar_fallida(self, operacion: Dict):
         """Marcar operación como fallida y reintentar"""
-        operacion['intentos'] += 1
+        intentos = self.almacen.registrar_fallo(operacion['id'], self.MAX_INTENTOS)
+        operacion['intentos'] = intentos
         
-        if operacion['intentos'] < 3:
-            # Reintentar
-            self.cola.put(operacion)
-            logger.warning(f"Reintentando operación (intento {operacion['intentos']})")
+        if intentos < self.MAX_INTENTOS:
+            logger.warning(f"Reintentando operación (intento {intentos})")
         else:
-            # Demasiados intentos, remover
-            if operacion in self.operaciones_pendientes:
-                self.operaciones_pendientes.remove(operacion)
-            logger.error(f"Operación fallida después de 3 intentos: {operacion}")
-        
-        self._persistir_operaciones()
-    
-    def _persistir_operaciones(self):
-        """Guardar operaciones pendientes en archivo"""
-        try:
-            with open('data/operaciones_offline.json', 'w') as f:
-                json.dump(self.operaciones_pendientes, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error persistiendo operaciones: {e}")
+            logger.error(f"Operación fallida después de {self.MAX_INTENTOS} intentos: {operacion}")
     
-    def _cargar_operaciones_persistidas(self):
-        """Cargar operaciones pendientes desde archivo"""
-        try:
-            with open('data/operaciones_offline.json', 'r') as f:
-                self.operaciones_pendientes = json.load(f)
-                
-                # Recargar en cola
-                for op in self.operaciones_pendientes:
-                    self.cola.put(op)
-                
-                logger.info(f"Cargadas {len(self.operaciones_pendientes)} operaciones pendientes")
-        
-        except FileNotFoundError:
-            self.operaciones_pendientes = []
-        except Exception as e:
-            logger.error(f"Error cargando operaciones: {e}")
-            self.operaciones_pendientes = []
+    def contar_pendientes(self) -> int:
+        """Número de operaciones esperando envío"""
+        return self.almacen.contar_pendientes()
 
 
 class ClienteAPI:
@@ -144,9 +192,19 @@ class ClienteAPI:
     def __init__(self):
         self.base_url = config.MADRE_BASE_URL
         self.token_jwt = None
-        self.gestor_conectividad = GestorConectividad()
-        self.cola_offline = ColaOperacionesOffline()
-        self.timeout = 30
+        self.sesion = crear_sesion_http()
+        self.gestor_conectividad = GestorConectividad(self.sesion)
+        
+        # Cola offline y cachés en SQLite local (importa los JSON antiguos)
+        self.almacen = AlmacenOffline(config.HIJA_OFFLINE_DB_PATH)
+        self.almacen.migrar_desde_json()
+        self.cola_offline = ColaOperacionesOffline(self.almacen)
+        self.timeout = config.HIJA_TIMEOUT_SEGUNDOS
+        
+        # El procesador de la cola despierta al recuperar la conexión
+        self._evento_reconexion = threading.Event()
+        self._evento_reconexion.set()
+        self.gestor_conectividad.suscribir_reconexion(self._evento_reconexion.set)
         
         # Iniciar procesador de cola offline
         self.procesador_thread = threading.Thread(
@@ -155,8 +213,13 @@ class ClienteAPI:
         )
         self.procesador_thread.start()
     
-    def _hacer_request(self, metodo: str, endpoint: str, **kwargs) -> Optional[Dict]:
-        """Hacer request HTTP con manejo robusto de errores"""
+    def _enviar(self, metodo: str, endpoint: str, **kwargs) -> Optional[requests.Response]:
+        """
+        Enviar request HTTP con reintentos ante timeouts
+        
+        Devuelve la respuesta sin interpretar (cualquier status) o None si
+        no se pudo contactar al servidor.
+        """
         url = f"{self.base_url}{endpoint}"
         
         # Agregar timeout por defecto
@@ -166,25 +229,22 @@ class ClienteAPI:
         headers = kwargs.get('headers', {})
         if self.token_jwt:
             headers['Authorization'] = f"Bearer {self.token_jwt}"
+        if _requiere_clave_idempotencia(metodo, endpoint):
+            headers.setdefault('Idempotency-Key', str(uuid.uuid4()))
         kwargs['headers'] = headers
         
         # Intentar con backoff exponencial
         max_intentos = 3
         for intento in range(max_intentos):
             try:
-                respuesta = requests.request(metodo, url, **kwargs)
+                respuesta = self.sesion.request(metodo, url, **kwargs)
+                self.gestor_conectividad.actualizar_estado(True)
                 
-                # Verificar código de respuesta
-                if respuesta.status_code < 300:
-                    logger.info(f"✅ {metodo} {endpoint} - Status: {respuesta.status_code}")
-                    return respuesta.json() if respuesta.content else {}
-                elif respuesta.status_code == 401:
-                    logger.warning("Token JWT expirado o inválido")
-                    self.token_jwt = None
-                    return None
-                else:
-                    logger.warning(f"⚠️ {metodo} {endpoint} - Status: {respuesta.status_code}")
-                    return None
+                # 409: el servidor aún procesa el intento anterior con esta clave
+                if respuesta.status_code == 409 and intento < max_intentos - 1:
+                    time.sleep(2 ** intento)
+                    continue
+                return respuesta
             
             except requests.exceptions.Timeout:
                 logger.warning(f"⏱️ Timeout en intento {intento + 1} de {max_intentos}")
@@ -193,17 +253,44 @@ class ClienteAPI:
             
             except requests.exceptions.ConnectionError as e:
                 logger.error(f"❌ Error de conexión: {e}")
-                self.gestor_conectividad.conectado = False
+                self.gestor_conectividad.actualizar_estado(False)
                 return None
             
             except Exception as e:
                 logger.error(f"❌ Error inesperado: {e}", exc_info=True)
                 return None
         
-        # Todos los intentos fallaron
+        # Todos los intentos fallaron: el servidor no responde a tiempo
         logger.error(f"❌ Todos los intentos fallaron para {metodo} {endpoint}")
+        self.gestor_conectividad.actualizar_estado(False)
         return None
     
+    def _interpretar_respuesta(self, metodo: str, endpoint: str, respuesta) -> Optional[Dict]:
+        """Convertir una respuesta HTTP (requests o httpx) en datos o None"""
+        if respuesta.status_code < 300:
+            logger.info(f"✅ {metodo} {endpoint} - Status: {respuesta.status_code}")
+            return respuesta.json() if respuesta.content else {}
+        elif respuesta.status_code == 401:
+            logger.warning("Token JWT expirado o inválido")
+            self.token_jwt = None
+            return None
+        else:
+            logger.warning(f"⚠️ {metodo} {endpoint} - Status: {respuesta.status_code}")
+            return None
+    
+    def _hacer_request(self, metodo: str, endpoint: str, **kwargs) -> Optional[Dict]:
+        """Hacer request HTTP con manejo robusto de errores"""
+        respuesta = self._enviar(metodo, endpoint, **kwargs)
+        if respuesta is None:
+            return None
+        return self._interpretar_respuesta(metodo, endpoint, respuesta)
+    
+    def cerrar(self):
+        """Detener el monitor de red y cerrar las conexiones HTTP y el almacén local"""
+        self.gestor_conectividad.cerrar()
+        self.sesion.close()
+        self.almacen.cerrar()
+    
     def login(self, email: str, password: str) -> Optional[Dict]:
         """Autenticar usuario y obtener token JWT"""
         datos = {
@@ -221,107 +308,365 @@ class ClienteAPI:
         return None
     
     def obtener_rutinas_usuario(self, usuario_id: int) -> List[Dict]:
-        """Obtener rutinas asignadas al usuario"""
+        """
+        Obtener rutinas asignadas al usuario con sincronización incremental
+        
+        Envía el ETag y la versión de la caché local: si nada cambió el
+        servidor responde 304, y si hubo cambios solo envía esos registros.
+        """
+        cache = self._leer_cache_rutinas(usuario_id)
+        
         if not self.gestor_conectividad.esta_conectado():
             logger.warning("Sin conexión - usando datos en caché")
-            return self._cargar_rutinas_cache(usuario_id)
+            return cache['rutinas']
         
-        # Intentar obtener del servidor
-        respuesta = self._hacer_request('GET', f'/api/usuarios/{usuario_id}/rutinas')
+        endpoint = f'/api/usuarios/{usuario_id}/rutinas'
+        respuesta = self._enviar('GET', endpoint, **self._parametros_sync_rutinas(cache))
         
-        if respuesta:
-            rutinas = respuesta.get('rutinas', [])
-            self._guardar_rutinas_cache(usuario_id, rutinas)
-            return rutinas
+        if respuesta is not None and respuesta.status_code == 304:
+            logger.debug(f"Rutinas sin cambios para usuario {usuario_id} (304)")
+            return cache['rutinas']
+        
+        datos = self._interpretar_respuesta('GET', endpoint, respuesta) if respuesta is not None else None
+        if datos:
+            return self._aplicar_cambios_rutinas(
+                usuario_id, cache, datos, respuesta.headers.get('ETag')
+            )
         
         # Fallback a caché
-        return self._cargar_rutinas_cache(usuario_id)
+        return cache['rutinas']
+    
+    @staticmethod
+    def _parametros_sync_rutinas(cache: Dict) -> Dict:
+        """Parámetros de request para pedir solo los cambios desde la caché"""
+        parametros = {'params': {'since': cache['version']}}
+        if cache['etag']:
+            parametros['headers'] = {'If-None-Match': cache['etag']}
+        return parametros
+    
+    def _aplicar_cambios_rutinas(self, usuario_id: int, cache: Dict, datos: Dict,
+                                 etag: Optional[str]) -> List[Dict]:
+        """Aplicar a la caché local solo los registros cambiados"""
+        cambios = datos.get('rutinas', [])
+        
+        if cambios or datos.get('completo') or etag != cache['etag']:
+            rutinas = self.almacen.aplicar_cambios_rutinas(
+                usuario_id, cambios,
+                completo=bool(datos.get('completo')),
+                version=datos.get('version', 0),
+                etag=etag
+            )
+        else:
+            rutinas = cache['rutinas']
+        logger.info(f"Rutinas sincronizadas: {len(cambios)} cambios, {len(rutinas)} en caché")
+        return rutinas
+    
+    def obtener_mensajes(self, usuario_id: int) -> List[Dict]:
+        """Obtener mensajes recibidos por el usuario"""
+        respuesta = self._hacer_request('GET', f'/api/usuarios/{usuario_id}/mensajes')
+        return respuesta.get('mensajes', []) if respuesta else []
+    
+    def obtener_progreso(self, usuario_id: int) -> List[Dict]:
+        """Obtener historial de progreso del usuario"""
+        respuesta = self._hacer_request('GET', f'/api/usuarios/{usuario_id}/progreso')
+        return respuesta.get('progreso', []) if respuesta else []
     
     def registrar_progreso(self, usuario_id: int, datos_progreso: Dict):
-        """Registrar progreso de entrenamiento"""
-        if not self.gestor_conectividad.esta_conectado():
-            # Agregar a cola offline
-            self.cola_offline.agregar_operacion({
-                'tipo': 'registrar_progreso',
-                'usuario_id': usuario_id,
-                'datos': datos_progreso
-            })
-            logger.info("Progreso guardado en cola offline")
-            return True
+        """
+        Registrar progreso de entrenamiento
         
-        # Enviar al servidor
-        respuesta = self._hacer_request(
-            'POST',
-            f'/api/usuarios/{usuario_id}/progreso',
-            json=datos_progreso
-        )
+        Si el envío no llega a completarse, la operación pasa a la cola
+        offline con la misma clave de idempotencia: si el servidor ya la
+        había guardado, el reenvío no la duplica.
+        """
+        operacion = {
+            'tipo': 'registrar_progreso',
+            'usuario_id': usuario_id,
+            'datos': datos_progreso,
+            'clave_idempotencia': str(uuid.uuid4())
+        }
+        
+        if self.gestor_conectividad.esta_conectado():
+            respuesta = self._enviar(
+                'POST',
+                f'/api/usuarios/{usuario_id}/progreso',
+                json=datos_progreso,
+                headers={'Idempotency-Key': operacion['clave_idempotencia']}
+            )
+            if not _es_reintentable(respuesta):
+                return self._interpretar_respuesta(
+                    'POST', f'/api/usuarios/{usuario_id}/progreso', respuesta
+                ) is not None
+            if respuesta is not None:
+                self._interpretar_respuesta('POST', f'/api/usuarios/{usuario_id}/progreso', respuesta)
         
-        return respuesta is not None
+        # Agregar a cola offline
+        self.cola_offline.agregar_operacion(operacion)
+        logger.info("Progreso guardado en cola offline")
+        return True
     
     def _procesar_cola_offline(self):
-        """Procesar cola de operaciones offline en segundo plano"""
+        """
+        Procesar cola de operaciones offline en segundo plano
+        
+        Despierta al recuperar la conexión (o cada OFFLINE_REINTENTO_SEGUNDOS
+        para reintentar operaciones en espera) y vacía la cola por lotes.
+        """
         while True:
+            self._evento_reconexion.wait(timeout=config.OFFLINE_REINTENTO_SEGUNDOS)
+            self._evento_reconexion.clear()
             try:
-                # Esperar a tener conexión
-                if not self.gestor_conectividad.esta_conectado():
-                    time.sleep(10)
-                    continue
-                
-                # Procesar operaciones pendientes
-                operacion = self.cola_offline.obtener_operacion()
-                
-                if operacion:
-                    logger.info(f"Procesando operación offline: {operacion.get('tipo')}")
-                    
-                    # Ejecutar según tipo
-                    if operacion['tipo'] == 'registrar_progreso':
-                        respuesta = self._hacer_request(
-                            'POST',
-                            f"/api/usuarios/{operacion['usuario_id']}/progreso",
-                            json=operacion['datos']
-                        )
-                        
-                        if respuesta:
-                            self.cola_offline.marcar_completada(operacion)
-                        else:
-                            self.cola_offline.marcar_fallida(operacion)
-                
-                else:
-                    # No hay operaciones, esperar
-                    time.sleep(5)
-            
+                if self.cola_offline.contar_pendientes() and self.gestor_conectividad.esta_conectado():
+                    self._vaciar_cola_offline()
             except Exception as e:
                 logger.error(f"Error procesando cola offline: {e}", exc_info=True)
-                time.sleep(5)
     
-    def _guardar_rutinas_cache(self, usuario_id: int, rutinas: List[Dict]):
-        """Guardar rutinas en caché local"""
+    def _vaciar_cola_offline(self):
+        """Reenviar las operaciones pendientes en lotes de OFFLINE_LOTE_TAMANO"""
+        while True:
+            lote = self.cola_offline.obtener_lote(config.OFFLINE_LOTE_TAMANO)
+            if not lote:
+                return
+            
+            logger.info(f"Reenviando lote de {len(lote)} operaciones offline")
+            if not self._reenviar_lote(lote, dividir=True):
+                return
+    
+    def _reenviar_lote(self, lote: List[Dict], dividir: bool) -> bool:
+        """
+        Enviar un lote de la cola offline y aplicar el resultado por operación
+        
+        Si el servidor rechaza el lote entero con un 4xx (p. ej. 413), no se
+        descuenta ningún intento: con dividir=True las operaciones se
+        reenvían de a una, y solo la que vuelva a ser rechazada queda marcada
+        como fallida.
+        
+        Returns:
+            False si hay que dejar de vaciar la cola (sin conexión o fallo
+            transitorio); las operaciones no resueltas siguen en espera
+        """
+        endpoint = '/api/progreso/lote'
+        respuesta = self._enviar('POST', endpoint, json={
+            'registros': [
+                {
+                    'usuario_id': op['usuario_id'],
+                    'clave_idempotencia': op['clave_idempotencia'],
+                    'fecha': op['timestamp'],
+                    'datos': op['datos']
+                }
+                for op in lote
+            ]
+        })
+        
+        if _es_reintentable(respuesta):
+            # Sin conexión o servidor no disponible: el lote sigue en cola
+            # hasta la próxima reconexión o reintento
+            if respuesta is not None:
+                self._interpretar_respuesta('POST', endpoint, respuesta)
+            return False
+        
+        datos = self._interpretar_respuesta('POST', endpoint, respuesta)
+        if datos is None:
+            if dividir and len(lote) > 1:
+                for op in lote:
+                    if not self._reenviar_lote([op], dividir=False):
+                        return False
+            else:
+                self.cola_offline.marcar_fallida(lote[0])
+            return True
+        
+        resultados = datos.get('resultados', [])
+        completadas = []
+        for i, op in enumerate(lote):
+            resultado = resultados[i] if i < len(resultados) else {}
+            if resultado.get('exito'):
+                completadas.append(op)
+            else:
+                self.cola_offline.marcar_fallida(op)
+        self.cola_offline.marcar_completadas(completadas)
+        return True
+    
+    def _leer_cache_rutinas(self, usuario_id: int) -> Dict:
+        """Cargar caché local de rutinas con su versión y ETag"""
         try:
-            cache_file = f'data/cache_rutinas_{usuario_id}.json'
-            with open(cache_file, 'w') as f:
-                json.dump({
-                    'timestamp': datetime.now().isoformat(),
-                    'rutinas': rutinas
-                }, f, indent=2)
-            logger.debug(f"Rutinas guardadas en caché para usuario {usuario_id}")
+            return self.almacen.leer_rutinas(usuario_id)
         except Exception as e:
-            logger.error(f"Error guardando caché: {e}")
+            logger.error(f"Error cargando caché: {e}")
+            return {'rutinas': [], 'version': 0, 'etag': None}
     
     def _cargar_rutinas_cache(self, usuario_id: int) -> List[Dict]:
         """Cargar rutinas desde caché local"""
-        try:
-            cache_file = f'data/cache_rutinas_{usuario_id}.json'
-            with open(cache_file, 'r') as f:
-                cache = json.load(f)
-                logger.info(f"Rutinas cargadas desde caché (guardado: {cache['timestamp']})")
-                return cache.get('rutinas', [])
-        except FileNotFoundError:
-            logger.warning("No hay caché disponible")
-            return []
-        except Exception as e:
-            logger.error(f"Error cargando caché: {e}")
-            return []
+        return self._leer_cache_rutinas(usuario_id)['rutinas']
+
+
+class ClienteAPIAsync:
+    """
+    Transporte asíncrono con los mismos métodos que ClienteAPI
+    
+    Comparte token, caché, cola offline y estado de conectividad con el
+    cliente síncrono. Con httpx usa un AsyncClient con keep-alive; sin él,
+    ejecuta los métodos del cliente síncrono en threads, de modo que las
+    llamadas siguen pudiendo lanzarse en paralelo.
+    
+    Debe usarse siempre desde el mismo event loop (ver PuenteAsyncio).
+    """
+    
+    def __init__(self, cliente: ClienteAPI):
+        self.cliente = cliente
+        self._http = None
+    
+    def _obtener_http(self):
+        """Crear el AsyncClient dentro del event loop que lo usará"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.cliente.base_url,
+                timeout=self.cliente.timeout,
+                limits=httpx.Limits(
+                    max_connections=config.HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=config.HTTP_POOL_MAXSIZE
+                )
+            )
+        return self._http
+    
+    async def _enviar(self, metodo: str, endpoint: str, **kwargs):
+        """Enviar request HTTP con reintentos sin bloquear el event loop"""
+        if httpx is None:
+            return await asyncio.to_thread(self.cliente._enviar, metodo, endpoint, **kwargs)
+        
+        headers = kwargs.pop('headers', {})
+        if self.cliente.token_jwt:
+            headers['Authorization'] = f"Bearer {self.cliente.token_jwt}"
+        if _requiere_clave_idempotencia(metodo, endpoint):
+            headers.setdefault('Idempotency-Key', str(uuid.uuid4()))
+        
+        max_intentos = 3
+        for intento in range(max_intentos):
+            try:
+                respuesta = await self._obtener_http().request(
+                    metodo, endpoint, headers=headers, **kwargs
+                )
+                self.cliente.gestor_conectividad.actualizar_estado(True)
+                
+                # 409: el servidor aún procesa el intento anterior con esta clave
+                if respuesta.status_code == 409 and intento < max_intentos - 1:
+                    await asyncio.sleep(2 ** intento)
+                    continue
+                return respuesta
+            
+            except httpx.TimeoutException:
+                logger.warning(f"⏱️ Timeout en intento {intento + 1} de {max_intentos}")
+                if intento < max_intentos - 1:
+                    await asyncio.sleep(2 ** intento)  # Backoff sin bloquear el loop
+            
+            except httpx.TransportError as e:
+                logger.error(f"❌ Error de conexión: {e}")
+                self.cliente.gestor_conectividad.actualizar_estado(False)
+                return None
+            
+            except Exception as e:
+                logger.error(f"❌ Error inesperado: {e}", exc_info=True)
+                return None
+        
+        logger.error(f"❌ Todos los intentos fallaron para {metodo} {endpoint}")
+        self.cliente.gestor_conectividad.actualizar_estado(False)
+        return None
+    
+    async def _hacer_request(self, metodo: str, endpoint: str, **kwargs) -> Optional[Dict]:
+        """Hacer request HTTP sin bloquear el event loop"""
+        respuesta = await self._enviar(metodo, endpoint, **kwargs)
+        if respuesta is None:
+            return None
+        return self.cliente._interpretar_respuesta(metodo, endpoint, respuesta)
+    
+    async def login(self, email: str, password: str) -> Optional[Dict]:
+        """Autenticar usuario y obtener token JWT"""
+        respuesta = await self._hacer_request(
+            'POST', '/api/auth/login', json={"email": email, "password": password}
+        )
+        
+        if respuesta and respuesta.get('exito'):
+            self.cliente.token_jwt = respuesta.get('token')
+            logger.info(f"Login exitoso para {email}")
+            return respuesta.get('usuario')
+        
+        return None
+    
+    async def obtener_rutinas_usuario(self, usuario_id: int) -> List[Dict]:
+        """Obtener rutinas con sincronización incremental (con fallback a caché)"""
+        cache = await asyncio.to_thread(self.cliente._leer_cache_rutinas, usuario_id)
+        
+        if not self.cliente.gestor_conectividad.esta_conectado():
+            logger.warning("Sin conexión - usando datos en caché")
+            return cache['rutinas']
+        
+        endpoint = f'/api/usuarios/{usuario_id}/rutinas'
+        respuesta = await self._enviar(
+            'GET', endpoint, **self.cliente._parametros_sync_rutinas(cache)
+        )
+        
+        if respuesta is not None and respuesta.status_code == 304:
+            logger.debug(f"Rutinas sin cambios para usuario {usuario_id} (304)")
+            return cache['rutinas']
+        
+        datos = self.cliente._interpretar_respuesta('GET', endpoint, respuesta) if respuesta is not None else None
+        if datos:
+            return await asyncio.to_thread(
+                self.cliente._aplicar_cambios_rutinas,
+                usuario_id, cache, datos, respuesta.headers.get('ETag')
+            )
+        
+        return cache['rutinas']
+    
+    async def obtener_mensajes(self, usuario_id: int) -> List[Dict]:
+        """Obtener mensajes recibidos por el usuario"""
+        respuesta = await self._hacer_request('GET', f'/api/usuarios/{usuario_id}/mensajes')
+        return respuesta.get('mensajes', []) if respuesta else []
+    
+    async def obtener_progreso(self, usuario_id: int) -> List[Dict]:
+        """Obtener historial de progreso del usuario"""
+        respuesta = await self._hacer_request('GET', f'/api/usuarios/{usuario_id}/progreso')
+        return respuesta.get('progreso', []) if respuesta else []
+    
+    async def registrar_progreso(self, usuario_id: int, datos_progreso: Dict):
+        """Registrar progreso de entrenamiento (a la cola offline si no se completa)"""
+        operacion = {
+            'tipo': 'registrar_progreso',
+            'usuario_id': usuario_id,
+            'datos': datos_progreso,
+            'clave_idempotencia': str(uuid.uuid4())
+        }
+        endpoint = f'/api/usuarios/{usuario_id}/progreso'
+        
+        if self.cliente.gestor_conectividad.esta_conectado():
+            respuesta = await self._enviar(
+                'POST', endpoint, json=datos_progreso,
+                headers={'Idempotency-Key': operacion['clave_idempotencia']}
+            )
+            if not _es_reintentable(respuesta):
+                return self.cliente._interpretar_respuesta('POST', endpoint, respuesta) is not None
+            if respuesta is not None:
+                self.cliente._interpretar_respuesta('POST', endpoint, respuesta)
+        
+        await asyncio.to_thread(self.cliente.cola_offline.agregar_operacion, operacion)
+        logger.info("Progreso guardado en cola offline")
+        return True
+    
+    async def cargar_paneles(self, usuario_id: int) -> Dict[str, List[Dict]]:
+        """Cargar en paralelo los datos de todos los paneles tras el login"""
+        rutinas, mensajes, progreso = await asyncio.gather(
+            self.obtener_rutinas_usuario(usuario_id),
+            self.obtener_mensajes(usuario_id),
+            self.obtener_progreso(usuario_id)
+        )
+        return {'rutinas': rutinas, 'mensajes': mensajes, 'progreso': progreso}
+    
+    async def cerrar(self):
+        """Cerrar las conexiones del cliente asíncrono"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
 
 # Instancia global del cliente
 cliente_api = ClienteAPI()
+cliente_api_async = ClienteAPIAsync(cliente_api)
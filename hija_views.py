@@ -4,12 +4,15 @@ UI optimizada con todas las funcionalidades para alumnos
 TODOS LOS TEXTOS EN CASTELLANO
 """
 
+import queue
 import customtkinter as ctk
 from typing import Optional, Dict, List
 from datetime import datetime
 
-from hija_comms import cliente_api
+from hija_comms import cliente_api, cliente_api_async
+from config.settings import config
 from shared.logger import obtener_logger
+from shared.tareas_ui import PuenteAsyncio
 
 # Configurar logger
 logger = obtener_logger(__name__)
@@ -28,6 +31,20 @@ class AplicacionHija(ctk.CTk):
         # Variables de estado
         self.usuario_actual = None
         self.rutinas = []
+        self.mensajes = []
+        self.progreso = []
+        self._sync_programada = None
+        
+        # Event loop de fondo para las llamadas asíncronas al servidor
+        self.puente = PuenteAsyncio(self)
+        self.protocol("WM_DELETE_WINDOW", self._al_cerrar_ventana)
+        
+        # El monitor de red notifica los cambios desde su thread; se aplican
+        # en el hilo de Tk leyendo esta cola (sin requests en la interfaz)
+        self.label_conectividad = None
+        self._cambios_conectividad: "queue.SimpleQueue[bool]" = queue.SimpleQueue()
+        cliente_api.gestor_conectividad.suscribir(self._cambios_conectividad.put)
+        self._aplicar_cambios_conectividad()
         
         # Crear interfaz de login
         self._crear_pantalla_login()
@@ -107,8 +124,8 @@ class AplicacionHija(ctk.CTk):
         # Bind Enter key
         self.entry_password.bind('<Return>', lambda e: self._hacer_login())
         
-        # Verificar conectividad inicial
-        self._actualizar_estado_conectividad()
+        # Estado de conectividad actual (cacheado por el monitor)
+        self._pintar_conectividad(cliente_api.gestor_conectividad.esta_conectado())
         
         # Link de ayuda
         help_label = ctk.CTkLabel(
@@ -119,9 +136,25 @@ class AplicacionHija(ctk.CTk):
         )
         help_label.pack(pady=(10, 40))
     
-    def _actualizar_estado_conectividad(self):
+    def _aplicar_cambios_conectividad(self):
+        """Aplicar en el hilo de Tk las transiciones notificadas por el monitor"""
+        conectado = None
+        while True:
+            try:
+                conectado = self._cambios_conectividad.get_nowait()
+            except queue.Empty:
+                break
+        if conectado is not None:
+            self._pintar_conectividad(conectado)
+        
+        self.after(250, self._aplicar_cambios_conectividad)
+    
+    def _pintar_conectividad(self, conectado: bool):
         """Actualizar indicador de conectividad"""
-        if cliente_api.gestor_conectividad.esta_conectado():
+        if self.label_conectividad is None or not self.label_conectividad.winfo_exists():
+            return
+        
+        if conectado:
             self.label_conectividad.configure(
                 text="🟢 Conectado al servidor",
                 text_color="green"
@@ -131,9 +164,6 @@ class AplicacionHija(ctk.CTk):
                 text="🔴 Sin conexión - Modo offline disponible",
                 text_color="orange"
             )
-        
-        # Actualizar cada 10 segundos
-        self.after(10000, self._actualizar_estado_conectividad)
     
     def _hacer_login(self):
         """Procesar inicio de sesión"""
@@ -145,26 +175,76 @@ class AplicacionHija(ctk.CTk):
             self.label_error.configure(text="Por favor completa todos los campos")
             return
         
-        # Limpiar error
-        self.label_error.configure(text="")
+        # Indicar que el login está en curso
+        self.label_error.configure(text="⏳ Iniciando sesión...", text_color="gray")
         
-        # Intentar login
+        # Intentar login sin bloquear la ventana
         logger.info(f"Intentando login para {email}")
         
-        usuario = cliente_api.login(email, password)
-        
+        self.puente.ejecutar(
+            cliente_api_async.login(email, password),
+            vista='login',
+            al_terminar=lambda usuario: self._login_completado(email, usuario),
+            al_fallar=lambda e: self._login_completado(email, None)
+        )
+    
+    def _login_completado(self, email: str, usuario: Optional[Dict]):
+        """Continuar tras la respuesta del servidor al login"""
         if usuario:
             self.usuario_actual = usuario
             logger.info(f"Login exitoso: {usuario['nombre']}")
             
             # Cambiar a pantalla principal
             self._crear_pantalla_principal()
+            
+            # Cargar todos los paneles en paralelo
+            self.puente.ejecutar(
+                cliente_api_async.cargar_paneles(usuario['id']),
+                vista='paneles',
+                al_terminar=self._paneles_cargados
+            )
+            self._programar_sync_rutinas()
         else:
             self.label_error.configure(
-                text="❌ Credenciales inválidas o sin conexión"
+                text="❌ Credenciales inválidas o sin conexión",
+                text_color="red"
             )
             logger.warning(f"Login fallido para {email}")
     
+    def _paneles_cargados(self, datos: Dict):
+        """Guardar los datos iniciales obtenidos tras el login"""
+        if self.usuario_actual is None:
+            return  # La sesión se cerró mientras se cargaba
+        
+        self.rutinas = datos['rutinas']
+        self.mensajes = datos['mensajes']
+        self.progreso = datos['progreso']
+        logger.info(
+            f"Paneles cargados: {len(self.rutinas)} rutinas, "
+            f"{len(self.mensajes)} mensajes, {len(self.progreso)} registros de progreso"
+        )
+    
+    def _programar_sync_rutinas(self):
+        """Programar la próxima sincronización periódica de rutinas"""
+        self._sync_programada = self.after(
+            config.SYNC_INTERVAL_SECONDS * 1000, self._sync_periodica_rutinas
+        )
+    
+    def _sync_periodica_rutinas(self):
+        """Sincronizar rutinas en segundo plano (un 304 si no hubo cambios)"""
+        if self.usuario_actual is None:
+            return
+        self.puente.ejecutar(
+            cliente_api_async.obtener_rutinas_usuario(self.usuario_actual['id']),
+            vista='sync_rutinas',
+            al_terminar=self._rutinas_actualizadas
+        )
+        self._programar_sync_rutinas()
+    
+    def _rutinas_actualizadas(self, rutinas: List[Dict]):
+        """Guardar las rutinas de una sync periódica"""
+        self.rutinas = rutinas
+    
     def _crear_pantalla_principal(self):
         """Crear pantalla principal de la aplicación"""
         # Limpiar ventana
@@ -239,6 +319,8 @@ class AplicacionHija(ctk.CTk):
     
     def _limpiar_contenido(self):
         """Limpiar el frame de contenido"""
+        # Descartar cargas en curso de la vista anterior
+        self.puente.cancelar('contenido')
         for widget in self.content_frame.winfo_children():
             widget.destroy()
     
@@ -356,25 +438,42 @@ class AplicacionHija(ctk.CTk):
         rutinas_frame = ctk.CTkScrollableFrame(self.content_frame, height=500)
         rutinas_frame.pack(fill="both", expand=True, padx=40, pady=20)
         
-        # Simular rutinas (en producción vendría del servidor)
+        if self.rutinas:
+            for rutina in self.rutinas:
+                self._crear_card_rutina(rutinas_frame, rutina)
+            return
+        
+        # Simular rutinas mientras no haya datos del servidor
         rutinas_ejemplo = [
             {
                 "nombre": "Rutina de Fuerza - Día A",
                 "descripcion": "Enfoque en pecho, hombros y tríceps",
-                "duracion": "45 minutos",
-                "ejercicios": 8
+                "duracion_minutos": 45,
+                "ejercicios": [
+                    {"nombre": "Press de banca"},
+                    {"nombre": "Press militar"},
+                    {"nombre": "Fondos en paralelas"}
+                ]
             },
             {
                 "nombre": "Rutina de Piernas",
                 "descripcion": "Entrenamiento completo de tren inferior",
-                "duracion": "60 minutos",
-                "ejercicios": 10
+                "duracion_minutos": 60,
+                "ejercicios": [
+                    {"nombre": "Sentadilla"},
+                    {"nombre": "Peso muerto rumano"},
+                    {"nombre": "Prensa"},
+                    {"nombre": "Elevación de talones"}
+                ]
             },
             {
                 "nombre": "Cardio y Resistencia",
                 "descripcion": "Mejora tu capacidad cardiovascular",
-                "duracion": "30 minutos",
-                "ejercicios": 5
+                "duracion_minutos": 30,
+                "ejercicios": [
+                    {"nombre": "Cinta"},
+                    {"nombre": "Remo"}
+                ]
             }
         ]
         
@@ -397,7 +496,7 @@ class AplicacionHija(ctk.CTk):
         # Descripción
         desc_label = ctk.CTkLabel(
             card,
-            text=rutina["descripcion"],
+            text=rutina.get("descripcion") or "",
             font=ctk.CTkFont(size=12),
             text_color="gray"
         )
@@ -409,14 +508,14 @@ class AplicacionHija(ctk.CTk):
         
         duracion_label = ctk.CTkLabel(
             info_frame,
-            text=f"⏱️ {rutina['duracion']}",
+            text=f"⏱️ {rutina['duracion_minutos']} min" if rutina.get('duracion_minutos') else "⏱️ N/A",
             font=ctk.CTkFont(size=11)
         )
         duracion_label.pack(side="left", padx=10)
         
         ejercicios_label = ctk.CTkLabel(
             info_frame,
-            text=f"💪 {rutina['ejercicios']} ejercicios",
+            text=f"💪 {len(rutina.get('ejercicios') or [])} ejercicios",
             font=ctk.CTkFont(size=11)
         )
         ejercicios_label.pack(side="left", padx=10)
@@ -438,7 +537,24 @@ class AplicacionHija(ctk.CTk):
     def _sincronizar_rutinas(self):
         """Sincronizar rutinas con el servidor"""
         logger.info("Sincronizando rutinas...")
-        # TODO: Implementar sincronización real
+        self._limpiar_contenido()
+        
+        cargando = ctk.CTkLabel(
+            self.content_frame,
+            text="⏳ Sincronizando rutinas con el servidor...",
+            font=ctk.CTkFont(size=16)
+        )
+        cargando.pack(pady=50)
+        
+        self.puente.ejecutar(
+            cliente_api_async.obtener_rutinas_usuario(self.usuario_actual['id']),
+            vista='contenido',
+            al_terminar=self._rutinas_sincronizadas
+        )
+    
+    def _rutinas_sincronizadas(self, rutinas: List[Dict]):
+        """Mostrar las rutinas recibidas del servidor"""
+        self.rutinas = rutinas
         self.mostrar_rutinas()
     
     def mostrar_progreso(self):
@@ -516,8 +632,18 @@ class AplicacionHija(ctk.CTk):
     def _cerrar_sesion(self):
         """Cerrar sesión del usuario"""
         self.usuario_actual = None
+        self.rutinas = []
+        self.mensajes = []
+        self.progreso = []
         cliente_api.token_jwt = None
         
+        # Descartar cargas en curso de la sesión
+        for vista in ('login', 'paneles', 'contenido', 'sync_rutinas'):
+            self.puente.cancelar(vista)
+        if self._sync_programada is not None:
+            self.after_cancel(self._sync_programada)
+            self._sync_programada = None
+        
         # Volver a pantalla de login
         for widget in self.winfo_children():
             widget.destroy()
@@ -525,6 +651,13 @@ class AplicacionHija(ctk.CTk):
         self._crear_pantalla_login()
         
         logger.info("Sesión cerrada")
+    
+    def _al_cerrar_ventana(self):
+        """Liberar conexiones y detener el loop de fondo al salir"""
+        cliente_api.gestor_conectividad.desuscribir(self._cambios_conectividad.put)
+        self.puente.cerrar(cliente_api_async.cerrar())
+        cliente_api.cerrar()
+        self.destroy()
 
 
 if __name__ == "__main__":
@@ -5,18 +5,64 @@ Gestión completa de alumnos, rutinas, evaluaciones y administración del gimnas
 
 import sqlite3
 import hashlib
-import bcrypt
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 from contextlib import contextmanager
 from dataclasses import dataclass
 import json
+import base64
+import threading
+import time
+
+from config.settings import config
+from shared.pool_conexiones import obtener_pool
+from shared.seguridad import generar_hash_password, verificar_password
 
 # Configurar logging estructurado
 logger = logging.getLogger(__name__)
 
+# Columnas públicas de usuarios (nunca incluye password_hash)
+COLUMNAS_ALUMNO = "id, nombre, email, telefono, fecha_registro, estado, equipo, nivel, foto_perfil"
+
+
+# Recursos exportables: tabla, columnas y columna de fecha para filtrar
+RECURSOS_EXPORTABLES = {
+    'usuarios': (
+        'usuarios',
+        ['id', 'nombre', 'email', 'telefono', 'fecha_registro', 'estado', 'equipo', 'nivel'],
+        'fecha_registro'
+    ),
+    'pagos': (
+        'pagos',
+        ['id', 'alumno_id', 'monto', 'fecha_pago', 'tipo_membresia', 'periodo_inicio',
+         'periodo_fin', 'metodo_pago', 'estado', 'factura_numero'],
+        'fecha_pago'
+    ),
+    'asistencia': (
+        'asistencia',
+        ['id', 'alumno_id', 'fecha', 'hora_entrada', 'hora_salida', 'tipo_sesion'],
+        'fecha'
+    ),
+}
+
+
+def codificar_cursor(nombre: str, alumno_id: int) -> str:
+    """Codificar la posición (nombre, id) de la última fila como cursor opaco"""
+    crudo = json.dumps([nombre, alumno_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> Tuple[str, int]:
+    """Decodificar un cursor de paginación; lanza ValueError si es inválido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        nombre, alumno_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return str(nombre), int(alumno_id)
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
 
 @dataclass
 class Alumno:
@@ -52,6 +98,11 @@ class GestorBaseDatos:
     def __init__(self, db_path: str = 'data/gym_database.db'):
         self.db_path = db_path
         self._asegurar_directorio()
+        self.pool = obtener_pool(db_path)
+        self._conteos_cache: Dict[Optional[str], Tuple[int, float]] = {}
+        self._conteos_lock = threading.Lock()
+        self._reservas_idempotencia = 0
+        self._oyentes_cambios: List[Callable[[Tuple[str, ...]], None]] = []
         self._inicializar_base_datos()
         logger.info(f"Base de datos inicializada: {db_path}")
     
@@ -60,10 +111,15 @@ class GestorBaseDatos:
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
     
     @contextmanager
-    def _obtener_conexion(self):
-        """Context manager para conexiones seguras a BD"""
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+    def _obtener_conexion(self, cambios: Tuple[str, ...] = ()):
+        """
+        Context manager para conexiones seguras a BD (tomadas del pool compartido)
+        
+        Args:
+            cambios: Tablas que modifica la transacción; se notifican a los
+                     suscriptores de suscribir_cambios() tras el commit
+        """
+        conn = self.pool.adquirir()
         try:
             yield conn
             conn.commit()
@@ -72,7 +128,21 @@ class GestorBaseDatos:
             logger.error(f"Error en transacción BD: {e}")
             raise
         finally:
-            conn.close()
+            self.pool.liberar(conn)
+        
+        if cambios:
+            self._notificar_cambios(cambios)
+    
+    def suscribir_cambios(self, callback: Callable[[Tuple[str, ...]], None]):
+        """Registrar una función a invocar con las tablas modificadas tras cada commit"""
+        self._oyentes_cambios.append(callback)
+    
+    def _notificar_cambios(self, tablas: Tuple[str, ...]):
+        for callback in list(self._oyentes_cambios):
+            try:
+                callback(tablas)
+            except Exception as e:
+                logger.error(f"Error notificando cambios en {tablas}: {e}")
     
     def _inicializar_base_datos(self):
         """Crear todas las tablas necesarias con índices optimizados"""
@@ -110,6 +180,7 @@ class GestorBaseDatos:
                     creador_id INTEGER,
                     fecha_creacion TEXT NOT NULL,
                     activa INTEGER DEFAULT 1,
+                    version INTEGER NOT NULL DEFAULT 0,
                     FOREIGN KEY (creador_id) REFERENCES usuarios(id)
                 )
             """)
@@ -125,6 +196,7 @@ class GestorBaseDatos:
                     fecha_fin TEXT,
                     completada INTEGER DEFAULT 0,
                     progreso_porcentaje REAL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0,
                     FOREIGN KEY (alumno_id) REFERENCES usuarios(id),
                     FOREIGN KEY (rutina_id) REFERENCES rutinas(id)
                 )
@@ -195,10 +267,82 @@ class GestorBaseDatos:
                 )
             """)
             
+            # Registros de progreso enviados por la app del alumno; la clave de
+            # idempotencia evita duplicados cuando la cola offline reintenta
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS registros_progreso (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    alumno_id INTEGER NOT NULL,
+                    fecha TEXT NOT NULL,
+                    datos_json TEXT NOT NULL,
+                    clave_idempotencia TEXT UNIQUE,
+                    fecha_recepcion TEXT NOT NULL,
+                    FOREIGN KEY (alumno_id) REFERENCES usuarios(id)
+                )
+            """)
+            
+            # Respuestas de escrituras con cabecera Idempotency-Key: un reintento
+            # con la misma clave recibe la respuesta original sin reejecutarse.
+            # status_code NULL indica que la petición original sigue en curso
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS claves_idempotencia (
+                    clave TEXT PRIMARY KEY,
+                    huella TEXT NOT NULL,
+                    status_code INTEGER,
+                    cuerpo BLOB,
+                    content_type TEXT,
+                    expira REAL NOT NULL
+                )
+            """)
+            
+            # Estadísticas materializadas, mantenidas de forma incremental
+            # por los métodos de escritura (evita agregados sobre el histórico)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS estadisticas_mensuales (
+                    mes TEXT PRIMARY KEY,
+                    asistencias INTEGER NOT NULL DEFAULT 0,
+                    ingresos REAL NOT NULL DEFAULT 0,
+                    usuarios_nuevos INTEGER NOT NULL DEFAULT 0,
+                    rutinas_nuevas INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS contadores_gimnasio (
+                    clave TEXT PRIMARY KEY,
+                    valor REAL NOT NULL DEFAULT 0
+                )
+            """)
+            
+            # Versión global de cambios para sincronización incremental (delta sync)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS versiones_sync (
+                    entidad TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            
+            # Bases de datos anteriores al seguimiento de cambios: las filas
+            # existentes reciben una versión para que la primera sync las incluya
+            for tabla in ('rutinas', 'asignaciones_rutinas'):
+                columnas = {row['name'] for row in cursor.execute(f"PRAGMA table_info({tabla})")}
+                if 'version' not in columnas:
+                    cursor.execute(
+                        f"ALTER TABLE {tabla} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+                    )
+                    cursor.execute(
+                        f"UPDATE {tabla} SET version = ?", (self._siguiente_version(cursor),)
+                    )
+            
             # Crear índices para optimización de consultas
             indices = [
                 "CREATE INDEX IF NOT EXISTS idx_usuarios_email ON usuarios(email)",
                 "CREATE INDEX IF NOT EXISTS idx_usuarios_estado ON usuarios(estado)",
+                "CREATE INDEX IF NOT EXISTS idx_usuarios_nombre ON usuarios(nombre, id)",
+                "CREATE INDEX IF NOT EXISTS idx_usuarios_estado_nombre ON usuarios(estado, nombre, id)",
+                # Permite que LIKE 'prefijo%' (insensible a mayúsculas) use un índice
+                "CREATE INDEX IF NOT EXISTS idx_usuarios_nombre_nocase ON usuarios(nombre COLLATE NOCASE)",
+                "CREATE INDEX IF NOT EXISTS idx_usuarios_fecha_registro ON usuarios(fecha_registro)",
                 "CREATE INDEX IF NOT EXISTS idx_rutinas_activa ON rutinas(activa)",
                 "CREATE INDEX IF NOT EXISTS idx_asignaciones_alumno ON asignaciones_rutinas(alumno_id)",
                 "CREATE INDEX IF NOT EXISTS idx_asignaciones_rutina ON asignaciones_rutinas(rutina_id)",
@@ -209,17 +353,106 @@ class GestorBaseDatos:
                 "CREATE INDEX IF NOT EXISTS idx_mensajes_dest ON mensajes(destinatario_id)",
                 "CREATE INDEX IF NOT EXISTS idx_asistencia_alumno ON asistencia(alumno_id)",
                 "CREATE INDEX IF NOT EXISTS idx_asistencia_fecha ON asistencia(fecha)",
+                "CREATE INDEX IF NOT EXISTS idx_progreso_alumno_fecha ON registros_progreso(alumno_id, fecha)",
+                "CREATE INDEX IF NOT EXISTS idx_idempotencia_expira ON claves_idempotencia(expira)",
             ]
             
             for indice in indices:
                 cursor.execute(indice)
             
+            cursor.execute("SELECT COUNT(*) as total FROM contadores_gimnasio")
+            requiere_backfill = cursor.fetchone()['total'] == 0
+            
             logger.info("Tablas e índices creados exitosamente")
+        
+        # Bases de datos existentes: poblar estadísticas desde el histórico
+        if requiere_backfill:
+            self.reconstruir_estadisticas()
+    
+    def verificar_conexion(self) -> bool:
+        """Comprobar que la BD responde con un SELECT 1 sobre una conexión del pool"""
+        with self._obtener_conexion() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return True
+    
+    def _incrementar_estadistica_mensual(self, cursor: sqlite3.Cursor, fecha: str,
+                                         campo: str, cantidad: float = 1):
+        """Sumar a un campo de estadisticas_mensuales dentro de la transacción actual"""
+        cursor.execute(f"""
+            INSERT INTO estadisticas_mensuales (mes, {campo}) VALUES (?, ?)
+            ON CONFLICT(mes) DO UPDATE SET {campo} = {campo} + excluded.{campo}
+        """, (fecha[:7], cantidad))
+    
+    def _incrementar_contador(self, cursor: sqlite3.Cursor, clave: str, cantidad: float = 1):
+        """Sumar a un contador global dentro de la transacción actual"""
+        cursor.execute("""
+            INSERT INTO contadores_gimnasio (clave, valor) VALUES (?, ?)
+            ON CONFLICT(clave) DO UPDATE SET valor = valor + excluded.valor
+        """, (clave, cantidad))
+    
+    def _siguiente_version(self, cursor: sqlite3.Cursor, entidad: str = 'rutinas') -> int:
+        """
+        Obtener la siguiente versión global de cambios dentro de la transacción
+        
+        Las escrituras en SQLite son serializadas, así que las versiones se
+        confirman en orden y un cliente con ?since=N nunca pierde cambios.
+        """
+        cursor.execute("""
+            INSERT INTO versiones_sync (entidad, version) VALUES (?, 1)
+            ON CONFLICT(entidad) DO UPDATE SET version = version + 1
+        """, (entidad,))
+        cursor.execute("SELECT version FROM versiones_sync WHERE entidad = ?", (entidad,))
+        return cursor.fetchone()['version']
+    
+    def reconstruir_estadisticas(self):
+        """
+        Recalcular las estadísticas materializadas desde las tablas de origen
+        
+        Se usa para el backfill inicial o tras cargas masivas de datos que
+        no pasen por los métodos de escritura del gestor.
+        """
+        with self._obtener_conexion(cambios=('estadisticas_mensuales', 'contadores_gimnasio')) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("DELETE FROM estadisticas_mensuales")
+            cursor.execute("DELETE FROM contadores_gimnasio")
+            
+            # Agregados mensuales por tabla de origen (WHERE true evita la
+            # ambigüedad de ON CONFLICT tras un SELECT)
+            fuentes = [
+                ("asistencias", "COUNT(*)", "asistencia", "fecha"),
+                ("ingresos", "SUM(monto)", "pagos", "fecha_pago"),
+                ("usuarios_nuevos", "COUNT(*)", "usuarios", "fecha_registro"),
+                ("rutinas_nuevas", "COUNT(*)", "rutinas", "fecha_creacion"),
+            ]
+            for campo, agregado, tabla, columna_fecha in fuentes:
+                cursor.execute(f"""
+                    INSERT INTO estadisticas_mensuales (mes, {campo})
+                    SELECT substr({columna_fecha}, 1, 7), {agregado}
+                    FROM {tabla} WHERE true
+                    GROUP BY substr({columna_fecha}, 1, 7)
+                    ON CONFLICT(mes) DO UPDATE SET {campo} = excluded.{campo}
+                """)
+            
+            cursor.execute("""
+                INSERT INTO contadores_gimnasio (clave, valor)
+                SELECT 'alumnos_activos', COUNT(*) FROM usuarios WHERE estado = 'activo'
+            """)
+            cursor.execute("""
+                INSERT INTO contadores_gimnasio (clave, valor)
+                SELECT 'rutinas_activas', COUNT(*) FROM rutinas WHERE activa = 1
+            """)
+            
+            logger.info("Estadísticas materializadas reconstruidas")
     
     def crear_usuario(self, nombre: str, email: str, password: str, 
-                     telefono: str = "", equipo: str = "", nivel: str = "principiante") -> int:
+                     telefono: str = "", equipo: str = "", nivel: str = "principiante",
+                     password_hash: Optional[bytes] = None) -> int:
         """
         Crear nuevo usuario con hash seguro de contraseña (bcrypt)
+        
+        Si se recibe password_hash (calculado fuera, p. ej. en el pool de
+        procesos del servidor) no se vuelve a calcular el hash.
         """
         try:
             # Validar complejidad de contraseña
@@ -227,10 +460,11 @@ class GestorBaseDatos:
                 raise ValueError("La contraseña debe tener al menos 8 caracteres")
             
             # Hash seguro con bcrypt
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            if password_hash is None:
+                password_hash = generar_hash_password(password)
             fecha_registro = datetime.now().isoformat()
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('usuarios', 'estadisticas_mensuales', 'contadores_gimnasio')) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO usuarios 
@@ -239,8 +473,12 @@ class GestorBaseDatos:
                 """, (nombre, email, password_hash, telefono, fecha_registro, equipo, nivel))
                 
                 usuario_id = cursor.lastrowid
-                logger.info(f"Usuario creado: {email} (ID: {usuario_id})")
-                return usuario_id
+                self._incrementar_estadistica_mensual(cursor, fecha_registro, 'usuarios_nuevos')
+                self._incrementar_contador(cursor, 'alumnos_activos')
+            
+            self._invalidar_conteos()
+            logger.info(f"Usuario creado: {email} (ID: {usuario_id})")
+            return usuario_id
         
         except sqlite3.IntegrityError:
             logger.warning(f"Email duplicado: {email}")
@@ -253,6 +491,21 @@ class GestorBaseDatos:
         """
         Verificar credenciales con límite de intentos fallidos
         """
+        credenciales = self.obtener_credenciales(email)
+        if not credenciales:
+            return None
+        
+        # Verificar contraseña con bcrypt
+        password_valida = verificar_password(password, credenciales['password_hash'])
+        return self.registrar_resultado_login(credenciales, password_valida)
+    
+    def obtener_credenciales(self, email: str) -> Optional[Dict]:
+        """
+        Obtener datos de autenticación de un usuario sin verificar la contraseña
+        
+        Devuelve None si el email no existe o la cuenta está bloqueada.
+        Permite verificar el hash bcrypt fuera de la conexión a BD.
+        """
         with self._obtener_conexion() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -261,31 +514,46 @@ class GestorBaseDatos:
             """, (email,))
             
             usuario = cursor.fetchone()
+        
+        if not usuario:
+            logger.warning(f"Intento de login con email inexistente: {email}")
+            return None
+        
+        # Verificar si cuenta está bloqueada
+        if usuario['intentos_fallidos'] >= 5:
+            logger.warning(f"Cuenta bloqueada por intentos fallidos: {email}")
+            return None
+        
+        return dict(usuario)
+    
+    def registrar_resultado_login(self, credenciales: Dict, password_valida: bool) -> Optional[Dict]:
+        """
+        Registrar el resultado de una verificación de contraseña
+        
+        Args:
+            credenciales: Datos devueltos por obtener_credenciales
+            password_valida: Resultado de la verificación bcrypt
+        
+        Returns:
+            Datos públicos del usuario si el login fue exitoso, None si no
+        """
+        with self._obtener_conexion() as conn:
+            cursor = conn.cursor()
             
-            if not usuario:
-                logger.warning(f"Intento de login con email inexistente: {email}")
-                return None
-            
-            # Verificar si cuenta está bloqueada
-            if usuario['intentos_fallidos'] >= 5:
-                logger.warning(f"Cuenta bloqueada por intentos fallidos: {email}")
-                return None
-            
-            # Verificar contraseña con bcrypt
-            if bcrypt.checkpw(password.encode('utf-8'), usuario['password_hash']):
+            if password_valida:
                 # Login exitoso - resetear intentos fallidos
                 cursor.execute("""
                     UPDATE usuarios 
                     SET intentos_fallidos = 0, ultimo_acceso = ?
                     WHERE id = ?
-                """, (datetime.now().isoformat(), usuario['id']))
+                """, (datetime.now().isoformat(), credenciales['id']))
                 
-                logger.info(f"Login exitoso: {email}")
+                logger.info(f"Login exitoso: {credenciales['email']}")
                 return {
-                    'id': usuario['id'],
-                    'nombre': usuario['nombre'],
-                    'email': usuario['email'],
-                    'estado': usuario['estado']
+                    'id': credenciales['id'],
+                    'nombre': credenciales['nombre'],
+                    'email': credenciales['email'],
+                    'estado': credenciales['estado']
                 }
             else:
                 # Contraseña incorrecta - incrementar contador
@@ -293,53 +561,229 @@ class GestorBaseDatos:
                     UPDATE usuarios 
                     SET intentos_fallidos = intentos_fallidos + 1
                     WHERE id = ?
-                """, (usuario['id'],))
+                """, (credenciales['id'],))
                 
-                logger.warning(f"Contraseña incorrecta para: {email}")
+                logger.warning(f"Contraseña incorrecta para: {credenciales['email']}")
                 return None
     
+    @staticmethod
+    def _fila_a_alumno(row: sqlite3.Row) -> Alumno:
+        """Convertir una fila de usuarios en Alumno"""
+        return Alumno(
+            id=row['id'],
+            nombre=row['nombre'],
+            email=row['email'],
+            telefono=row['telefono'],
+            fecha_registro=row['fecha_registro'],
+            estado=row['estado'],
+            equipo=row['equipo'],
+            nivel=row['nivel'],
+            foto_perfil=row['foto_perfil']
+        )
+    
     def obtener_alumnos(self, estado: Optional[str] = None, 
                         limite: int = 100, offset: int = 0) -> List[Alumno]:
         """
-        Obtener lista de alumnos con paginación
+        Obtener lista de alumnos con paginación por OFFSET
+        
+        Para recorrer listas grandes usar obtener_alumnos_pagina (keyset).
         """
         with self._obtener_conexion() as conn:
             cursor = conn.cursor()
             
             if estado:
-                cursor.execute("""
-                    SELECT id, nombre, email, telefono, fecha_registro, 
-                           estado, equipo, nivel, foto_perfil
+                cursor.execute(f"""
+                    SELECT {COLUMNAS_ALUMNO}
                     FROM usuarios
                     WHERE estado = ?
-                    ORDER BY nombre
+                    ORDER BY nombre, id
                     LIMIT ? OFFSET ?
                 """, (estado, limite, offset))
             else:
-                cursor.execute("""
-                    SELECT id, nombre, email, telefono, fecha_registro,
-                           estado, equipo, nivel, foto_perfil
+                cursor.execute(f"""
+                    SELECT {COLUMNAS_ALUMNO}
                     FROM usuarios
-                    ORDER BY nombre
+                    ORDER BY nombre, id
                     LIMIT ? OFFSET ?
                 """, (limite, offset))
             
-            alumnos = []
-            for row in cursor.fetchall():
-                alumno = Alumno(
-                    id=row['id'],
-                    nombre=row['nombre'],
-                    email=row['email'],
-                    telefono=row['telefono'],
-                    fecha_registro=row['fecha_registro'],
-                    estado=row['estado'],
-                    equipo=row['equipo'],
-                    nivel=row['nivel'],
-                    foto_perfil=row['foto_perfil']
-                )
-                alumnos.append(alumno)
+            return [self._fila_a_alumno(row) for row in cursor.fetchall()]
+    
+    def obtener_alumnos_pagina(self, estado: Optional[str] = None, limite: int = 100,
+                               cursor_pagina: Optional[str] = None,
+                               buscar: Optional[str] = None
+                               ) -> Tuple[List[Alumno], Optional[str]]:
+        """
+        Obtener una página de alumnos con paginación por cursor (keyset)
+        
+        Cada página continúa después del último (nombre, id) visto usando el
+        índice compuesto, así que el costo no depende de la profundidad.
+        
+        Args:
+            estado: Filtrar por estado (opcional)
+            limite: Tamaño de página
+            cursor_pagina: Cursor devuelto por la página anterior (None = inicio)
+            buscar: Prefijo del nombre, sin distinguir mayúsculas (opcional)
+        
+        Returns:
+            Tupla (alumnos, siguiente_cursor); siguiente_cursor es None en la última página
+        """
+        condiciones = []
+        parametros: list = []
+        
+        if estado:
+            condiciones.append("estado = ?")
+            parametros.append(estado)
+        
+        if buscar:
+            prefijo = buscar.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            condiciones.append("nombre LIKE ? ESCAPE '\\'")
+            parametros.append(f"{prefijo}%")
+        
+        if cursor_pagina:
+            nombre, alumno_id = decodificar_cursor(cursor_pagina)
+            condiciones.append("(nombre, id) > (?, ?)")
+            parametros.extend([nombre, alumno_id])
+        
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        
+        with self._obtener_conexion() as conn:
+            cursor = conn.cursor()
+            # Se pide una fila extra para saber si hay página siguiente
+            cursor.execute(f"""
+                SELECT {COLUMNAS_ALUMNO}
+                FROM usuarios
+                {where}
+                ORDER BY nombre, id
+                LIMIT ?
+            """, (*parametros, limite + 1))
+            filas = cursor.fetchall()
+        
+        alumnos = [self._fila_a_alumno(row) for row in filas[:limite]]
+        siguiente = None
+        if len(filas) > limite:
+            ultimo = alumnos[-1]
+            siguiente = codificar_cursor(ultimo.nombre, ultimo.id)
+        
+        return alumnos, siguiente
+    
+    def contar_alumnos(self, estado: Optional[str] = None, exacto: bool = True) -> int:
+        """
+        Contar alumnos, separado de la paginación
+        
+        El conteo exacto se cachea durante CONTEO_CACHE_SECONDS y se invalida
+        al crear usuarios. El estimado usa los contadores materializados o
+        las estadísticas del planificador (sqlite_stat1) sin recorrer la tabla.
+        """
+        if not exacto:
+            estimado = self._estimar_alumnos(estado)
+            if estimado is not None:
+                return estimado
+        
+        ahora = time.monotonic()
+        with self._conteos_lock:
+            cacheado = self._conteos_cache.get(estado)
+            if cacheado and cacheado[1] > ahora:
+                return cacheado[0]
+        
+        with self._obtener_conexion() as conn:
+            if estado:
+                fila = conn.execute(
+                    "SELECT COUNT(*) as total FROM usuarios WHERE estado = ?", (estado,)
+                ).fetchone()
+            else:
+                fila = conn.execute("SELECT COUNT(*) as total FROM usuarios").fetchone()
+        
+        total = fila['total']
+        with self._conteos_lock:
+            self._conteos_cache[estado] = (total, ahora + config.CONTEO_CACHE_SECONDS)
+        return total
+    
+    def _estimar_alumnos(self, estado: Optional[str]) -> Optional[int]:
+        """Estimar el número de alumnos sin contar filas (None si no hay datos)"""
+        with self._obtener_conexion() as conn:
+            if estado == 'activo':
+                fila = conn.execute(
+                    "SELECT valor FROM contadores_gimnasio WHERE clave = 'alumnos_activos'"
+                ).fetchone()
+                return int(fila['valor']) if fila else None
             
-            return alumnos
+            try:
+                fila = conn.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE idx = 'idx_usuarios_estado_nombre'"
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # sqlite_stat1 no existe hasta el primer ANALYZE/PRAGMA optimize
+                return None
+        
+        if not fila:
+            return None
+        # Formato de stat: "<filas> <filas por estado> ..."
+        partes = fila['stat'].split()
+        return int(partes[1] if estado and len(partes) > 1 else partes[0])
+    
+    def _invalidar_conteos(self):
+        """Descartar los conteos de alumnos cacheados"""
+        with self._conteos_lock:
+            self._conteos_cache.clear()
+    
+    def leer_lote_exportacion(self, recurso: str, desde: Optional[str] = None,
+                              hasta: Optional[str] = None,
+                              posicion: Optional[Tuple[str, int]] = None,
+                              tamano_lote: int = 500) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        Leer un lote de filas de un recurso exportable
+        
+        Pagina por (fecha, id) usando el índice de fecha; cada lote es una
+        consulta independiente que toma una conexión del pool solo mientras
+        dura, así un cliente lento no retiene conexiones ni un snapshot de
+        lectura. El servidor pide cada lote con ejecutar_bd.
+        
+        Args:
+            recurso: Clave de RECURSOS_EXPORTABLES (usuarios, pagos, asistencia)
+            desde: Fecha ISO inicial inclusiva (opcional)
+            hasta: Fecha ISO final inclusiva (opcional)
+            posicion: Posición devuelta por el lote anterior (None = inicio)
+            tamano_lote: Filas leídas por consulta
+        
+        Returns:
+            (filas, posicion): filas como diccionarios con las columnas del
+            recurso y la posición para pedir el lote siguiente (None si no hay más)
+        """
+        if recurso not in RECURSOS_EXPORTABLES:
+            raise ValueError(f"Recurso no exportable: {recurso}")
+        
+        tabla, columnas, columna_fecha = RECURSOS_EXPORTABLES[recurso]
+        
+        filtros = []
+        valores: list = []
+        if desde:
+            filtros.append(f"{columna_fecha} >= ?")
+            valores.append(desde)
+        if hasta:
+            # Inclusivo por día: fecha_pago '2024-01-31T18:00' entra con hasta='2024-01-31'
+            filtros.append(f"{columna_fecha} < ?")
+            valores.append((datetime.fromisoformat(hasta) + timedelta(days=1)).date().isoformat())
+        if posicion is not None:
+            filtros.append(f"({columna_fecha}, id) > (?, ?)")
+            valores.extend(posicion)
+        
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+        
+        with self._obtener_conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {', '.join(columnas)}
+                FROM {tabla}
+                {where}
+                ORDER BY {columna_fecha}, id
+                LIMIT ?
+            """, (*valores, tamano_lote))
+            filas = cursor.fetchall()
+        
+        if len(filas) < tamano_lote:
+            return [dict(fila) for fila in filas], None
+        return [dict(fila) for fila in filas], (filas[-1][columna_fecha], filas[-1]['id'])
     
     def crear_rutina(self, nombre: str, descripcion: str, nivel_dificultad: str,
                      duracion_minutos: int, ejercicios: List[Dict], 
@@ -351,17 +795,20 @@ class GestorBaseDatos:
             ejercicios_json = json.dumps(ejercicios)
             fecha_creacion = datetime.now().isoformat()
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('rutinas', 'estadisticas_mensuales', 'contadores_gimnasio')) as conn:
                 cursor = conn.cursor()
+                version = self._siguiente_version(cursor)
                 cursor.execute("""
                     INSERT INTO rutinas
                     (nombre, descripcion, nivel_dificultad, duracion_minutos, 
-                     ejercicios_json, creador_id, fecha_creacion)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                     ejercicios_json, creador_id, fecha_creacion, version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """, (nombre, descripcion, nivel_dificultad, duracion_minutos,
-                      ejercicios_json, creador_id, fecha_creacion))
+                      ejercicios_json, creador_id, fecha_creacion, version))
                 
                 rutina_id = cursor.lastrowid
+                self._incrementar_estadistica_mensual(cursor, fecha_creacion, 'rutinas_nuevas')
+                self._incrementar_contador(cursor, 'rutinas_activas')
                 logger.info(f"Rutina creada: {nombre} (ID: {rutina_id})")
                 return rutina_id
         
@@ -377,13 +824,14 @@ class GestorBaseDatos:
         try:
             fecha_asignacion = datetime.now().isoformat()
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('asignaciones_rutinas',)) as conn:
                 cursor = conn.cursor()
+                version = self._siguiente_version(cursor)
                 cursor.execute("""
                     INSERT INTO asignaciones_rutinas
-                    (alumno_id, rutina_id, fecha_asignacion, fecha_inicio, fecha_fin)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (alumno_id, rutina_id, fecha_asignacion, fecha_inicio, fecha_fin))
+                    (alumno_id, rutina_id, fecha_asignacion, fecha_inicio, fecha_fin, version)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (alumno_id, rutina_id, fecha_asignacion, fecha_inicio, fecha_fin, version))
                 
                 asignacion_id = cursor.lastrowid
                 logger.info(f"Rutina {rutina_id} asignada a alumno {alumno_id}")
@@ -393,6 +841,50 @@ class GestorBaseDatos:
             logger.error(f"Error asignando rutina: {e}")
             raise
     
+    def version_rutinas_alumno(self, alumno_id: int) -> int:
+        """
+        Versión más reciente de las rutinas asignadas a un alumno
+        
+        Sirve como ETag barato: si no cambió, el cliente ya tiene todo.
+        """
+        with self._obtener_conexion() as conn:
+            fila = conn.execute("""
+                SELECT COALESCE(MAX(MAX(a.version, r.version)), 0) as version
+                FROM asignaciones_rutinas a
+                JOIN rutinas r ON r.id = a.rutina_id
+                WHERE a.alumno_id = ?
+            """, (alumno_id,)).fetchone()
+        return fila['version']
+    
+    def obtener_rutinas_alumno(self, alumno_id: int, desde_version: int = 0) -> List[Dict]:
+        """
+        Obtener las asignaciones de rutinas de un alumno cambiadas después de una versión
+        
+        Con desde_version=0 devuelve todas. Cada elemento incluye 'activa' y
+        'completada' para que el cliente pueda retirar rutinas de su caché.
+        """
+        with self._obtener_conexion() as conn:
+            filas = conn.execute("""
+                SELECT a.id as asignacion_id, a.rutina_id, a.fecha_inicio, a.fecha_fin,
+                       a.completada, a.progreso_porcentaje,
+                       r.nombre, r.descripcion, r.nivel_dificultad, r.duracion_minutos,
+                       r.ejercicios_json, r.activa,
+                       MAX(a.version, r.version) as version
+                FROM asignaciones_rutinas a
+                JOIN rutinas r ON r.id = a.rutina_id
+                WHERE a.alumno_id = ? AND (a.version > ? OR r.version > ?)
+                ORDER BY a.id
+            """, (alumno_id, desde_version, desde_version)).fetchall()
+        
+        rutinas = []
+        for row in filas:
+            rutina = dict(row)
+            rutina['ejercicios'] = json.loads(rutina.pop('ejercicios_json') or '[]')
+            rutina['activa'] = bool(rutina['activa'])
+            rutina['completada'] = bool(rutina['completada'])
+            rutinas.append(rutina)
+        return rutinas
+    
     def registrar_evaluacion(self, alumno_id: int, peso_kg: float, 
                            altura_cm: float, porcentaje_grasa: Optional[float] = None,
                            masa_muscular_kg: Optional[float] = None,
@@ -410,7 +902,7 @@ class GestorBaseDatos:
             
             medidas_json = json.dumps(medidas) if medidas else None
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('evaluaciones',)) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO evaluaciones
@@ -437,7 +929,7 @@ class GestorBaseDatos:
         try:
             fecha_pago = datetime.now().isoformat()
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('pagos', 'estadisticas_mensuales')) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO pagos
@@ -448,6 +940,7 @@ class GestorBaseDatos:
                       periodo_inicio, periodo_fin, metodo_pago))
                 
                 pago_id = cursor.lastrowid
+                self._incrementar_estadistica_mensual(cursor, fecha_pago, 'ingresos', monto)
                 logger.info(f"Pago registrado: ${monto} - Alumno {alumno_id}")
                 return pago_id
         
@@ -463,7 +956,7 @@ class GestorBaseDatos:
         try:
             fecha_envio = datetime.now().isoformat()
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('mensajes',)) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO mensajes
@@ -487,7 +980,7 @@ class GestorBaseDatos:
             fecha = datetime.now().date().isoformat()
             hora_entrada = datetime.now().time().isoformat()
             
-            with self._obtener_conexion() as conn:
+            with self._obtener_conexion(cambios=('asistencia', 'estadisticas_mensuales')) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO asistencia
@@ -496,6 +989,7 @@ class GestorBaseDatos:
                 """, (alumno_id, fecha, hora_entrada, tipo_sesion))
                 
                 asistencia_id = cursor.lastrowid
+                self._incrementar_estadistica_mensual(cursor, fecha, 'asistencias')
                 logger.info(f"Asistencia registrada: Alumno {alumno_id}")
                 return asistencia_id
         
@@ -503,45 +997,362 @@ class GestorBaseDatos:
             logger.error(f"Error registrando asistencia: {e}")
             raise
     
-    def obtener_estadisticas(self) -> Dict:
+    def _alumnos_existentes(self, cursor: sqlite3.Cursor, alumno_ids: List[int]) -> set:
+        """Obtener cuáles de los IDs recibidos existen en usuarios (una sola consulta)"""
+        unicos = list(set(alumno_ids))
+        if not unicos:
+            return set()
+        marcadores = ", ".join("?" * len(unicos))
+        cursor.execute(f"SELECT id FROM usuarios WHERE id IN ({marcadores})", unicos)
+        return {row['id'] for row in cursor.fetchall()}
+    
+    def _insertar_lote(self, cursor: sqlite3.Cursor, sql: str, filas: List[tuple]) -> List[int]:
         """
-        Obtener estadísticas generales del gimnasio
+        Insertar filas con executemany y devolver sus IDs
+        
+        Dentro de la transacción la conexión tiene el lock de escritura, así
+        que los IDs AUTOINCREMENT asignados son consecutivos.
+        """
+        if not filas:
+            return []
+        cursor.executemany(sql, filas)
+        ultimo_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(ultimo_id - len(filas) + 1, ultimo_id + 1))
+    
+    def registrar_asistencias_lote(self, registros: List[Dict]) -> List[Dict]:
+        """
+        Registrar muchas asistencias en una sola transacción
+        
+        Args:
+            registros: Lista de dicts con alumno_id, tipo_sesion (opcional) y
+                       fecha_hora ISO (opcional, por defecto ahora)
+        
+        Returns:
+            Un resultado por registro, en el mismo orden:
+            {'indice', 'exito', 'asistencia_id'} o {'indice', 'exito', 'error'}
+        """
+        resultados: List[Optional[Dict]] = [None] * len(registros)
+        
+        with self._obtener_conexion(cambios=('asistencia', 'estadisticas_mensuales')) as conn:
+            cursor = conn.cursor()
+            existentes = self._alumnos_existentes(cursor, [r['alumno_id'] for r in registros])
+            
+            filas, indices = [], []
+            for i, registro in enumerate(registros):
+                if registro['alumno_id'] not in existentes:
+                    resultados[i] = {'indice': i, 'exito': False, 'error': 'Alumno no encontrado'}
+                    continue
+                momento = registro.get('fecha_hora') or datetime.now()
+                if isinstance(momento, str):
+                    try:
+                        momento = datetime.fromisoformat(momento)
+                    except ValueError:
+                        resultados[i] = {'indice': i, 'exito': False, 'error': 'fecha_hora inválida'}
+                        continue
+                filas.append((
+                    registro['alumno_id'],
+                    momento.date().isoformat(),
+                    momento.time().isoformat(),
+                    registro.get('tipo_sesion') or 'general'
+                ))
+                indices.append(i)
+            
+            ids = self._insertar_lote(cursor, """
+                INSERT INTO asistencia
+                (alumno_id, fecha, hora_entrada, tipo_sesion)
+                VALUES (?, ?, ?, ?)
+            """, filas)
+            
+            # Actualizar estadísticas agrupando por mes
+            por_mes: Dict[str, int] = {}
+            for fila in filas:
+                por_mes[fila[1][:7]] = por_mes.get(fila[1][:7], 0) + 1
+            for mes, cantidad in por_mes.items():
+                self._incrementar_estadistica_mensual(cursor, mes, 'asistencias', cantidad)
+        
+        for i, asistencia_id in zip(indices, ids):
+            resultados[i] = {'indice': i, 'exito': True, 'asistencia_id': asistencia_id}
+        
+        logger.info(f"Lote de asistencia: {len(ids)}/{len(registros)} registradas")
+        return resultados
+    
+    def registrar_evaluaciones_lote(self, evaluaciones: List[Dict]) -> List[Dict]:
+        """
+        Registrar muchas evaluaciones corporales en una sola transacción
+        
+        Args:
+            evaluaciones: Lista de dicts con los mismos campos que
+                          registrar_evaluacion, más fecha ISO opcional
+        
+        Returns:
+            Un resultado por evaluación, en el mismo orden:
+            {'indice', 'exito', 'evaluacion_id'} o {'indice', 'exito', 'error'}
+        """
+        resultados: List[Optional[Dict]] = [None] * len(evaluaciones)
+        
+        with self._obtener_conexion(cambios=('evaluaciones',)) as conn:
+            cursor = conn.cursor()
+            existentes = self._alumnos_existentes(cursor, [e['alumno_id'] for e in evaluaciones])
+            
+            filas, indices = [], []
+            for i, ev in enumerate(evaluaciones):
+                if ev['alumno_id'] not in existentes:
+                    resultados[i] = {'indice': i, 'exito': False, 'error': 'Alumno no encontrado'}
+                    continue
+                if not ev.get('altura_cm') or ev['altura_cm'] <= 0:
+                    resultados[i] = {'indice': i, 'exito': False, 'error': 'Altura inválida'}
+                    continue
+                
+                fecha = ev.get('fecha') or datetime.now()
+                if isinstance(fecha, str):
+                    try:
+                        datetime.fromisoformat(fecha)
+                    except ValueError:
+                        resultados[i] = {'indice': i, 'exito': False, 'error': 'Fecha inválida'}
+                        continue
+                if isinstance(fecha, datetime):
+                    fecha = fecha.isoformat()
+                
+                # Calcular IMC
+                altura_m = ev['altura_cm'] / 100
+                imc = ev['peso_kg'] / (altura_m ** 2)
+                medidas = ev.get('medidas')
+                
+                filas.append((
+                    ev['alumno_id'], fecha, ev['peso_kg'], ev['altura_cm'], imc,
+                    ev.get('porcentaje_grasa'), ev.get('masa_muscular_kg'),
+                    json.dumps(medidas) if medidas else None,
+                    ev.get('notas', ''), ev.get('evaluador_id')
+                ))
+                indices.append(i)
+            
+            ids = self._insertar_lote(cursor, """
+                INSERT INTO evaluaciones
+                (alumno_id, fecha, peso_kg, altura_cm, imc, 
+                 porcentaje_grasa, masa_muscular_kg, medidas_json, notas, evaluador_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, filas)
+        
+        for i, evaluacion_id in zip(indices, ids):
+            resultados[i] = {'indice': i, 'exito': True, 'evaluacion_id': evaluacion_id}
+        
+        logger.info(f"Lote de evaluaciones: {len(ids)}/{len(evaluaciones)} registradas")
+        return resultados
+    
+    def registrar_progreso(self, alumno_id: int, datos: Dict,
+                           fecha: Optional[str] = None,
+                           clave_idempotencia: Optional[str] = None) -> int:
+        """
+        Registrar un progreso de entrenamiento enviado por el alumno
+        
+        Si la clave de idempotencia ya fue registrada devuelve el ID existente.
+        """
+        resultado = self.registrar_progresos_lote([{
+            'usuario_id': alumno_id,
+            'datos': datos,
+            'fecha': fecha,
+            'clave_idempotencia': clave_idempotencia
+        }])[0]
+        if not resultado['exito']:
+            raise ValueError(resultado['error'])
+        return resultado['progreso_id']
+    
+    def registrar_progresos_lote(self, registros: List[Dict]) -> List[Dict]:
+        """
+        Registrar muchos progresos en una sola transacción
+        
+        Args:
+            registros: Lista de dicts con usuario_id, datos, fecha ISO
+                       (opcional) y clave_idempotencia (opcional)
+        
+        Returns:
+            Un resultado por registro, en el mismo orden:
+            {'indice', 'exito', 'progreso_id', 'duplicado'} o {'indice', 'exito', 'error'}
+        """
+        resultados: List[Optional[Dict]] = [None] * len(registros)
+        fecha_recepcion = datetime.now().isoformat()
+        insertados = 0
+        
+        with self._obtener_conexion(cambios=('registros_progreso',)) as conn:
+            cursor = conn.cursor()
+            existentes = self._alumnos_existentes(cursor, [r['usuario_id'] for r in registros])
+            
+            # ON CONFLICT resuelve en el propio INSERT las claves ya registradas
+            # (reintentos, otro lote concurrente o repetidas en este lote), sin
+            # la carrera de un SELECT previo; rowcount indica si hubo fila nueva
+            conflictos: Dict[int, str] = {}
+            for i, registro in enumerate(registros):
+                if registro['usuario_id'] not in existentes:
+                    resultados[i] = {'indice': i, 'exito': False, 'error': 'Alumno no encontrado'}
+                    continue
+                
+                fecha = registro.get('fecha') or fecha_recepcion
+                if isinstance(fecha, str):
+                    try:
+                        datetime.fromisoformat(fecha)
+                    except ValueError:
+                        resultados[i] = {'indice': i, 'exito': False, 'error': 'Fecha inválida'}
+                        continue
+                if isinstance(fecha, datetime):
+                    fecha = fecha.isoformat()
+                
+                clave = registro.get('clave_idempotencia')
+                cursor.execute("""
+                    INSERT INTO registros_progreso
+                    (alumno_id, fecha, datos_json, clave_idempotencia, fecha_recepcion)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(clave_idempotencia) DO NOTHING
+                """, (
+                    registro['usuario_id'],
+                    fecha,
+                    json.dumps(registro.get('datos') or {}),
+                    clave,
+                    fecha_recepcion
+                ))
+                if cursor.rowcount:
+                    insertados += 1
+                    resultados[i] = {'indice': i, 'exito': True,
+                                     'progreso_id': cursor.lastrowid, 'duplicado': False}
+                else:
+                    conflictos[i] = clave
+            
+            if conflictos:
+                claves = list(set(conflictos.values()))
+                marcadores = ", ".join("?" * len(claves))
+                cursor.execute(f"""
+                    SELECT clave_idempotencia, id FROM registros_progreso
+                    WHERE clave_idempotencia IN ({marcadores})
+                """, claves)
+                ids_por_clave = {row['clave_idempotencia']: row['id'] for row in cursor.fetchall()}
+                for i, clave in conflictos.items():
+                    resultados[i] = {'indice': i, 'exito': True,
+                                     'progreso_id': ids_por_clave[clave], 'duplicado': True}
+        
+        logger.info(f"Lote de progreso: {insertados}/{len(registros)} registrados")
+        return resultados
+    
+    def obtener_progreso(self, alumno_id: int, limite: int = 100) -> List[Dict]:
+        """Obtener los registros de progreso más recientes de un alumno"""
+        with self._obtener_conexion() as conn:
+            filas = conn.execute("""
+                SELECT id, fecha, datos_json
+                FROM registros_progreso
+                WHERE alumno_id = ?
+                ORDER BY fecha DESC
+                LIMIT ?
+            """, (alumno_id, limite)).fetchall()
+        
+        return [
+            {'id': row['id'], 'fecha': row['fecha'], 'datos': json.loads(row['datos_json'])}
+            for row in filas
+        ]
+    
+    def reservar_clave_idempotencia(self, clave: str, huella: str,
+                                    segundos_en_curso: float) -> Optional[Dict]:
         """
+        Reservar una clave de idempotencia para la petición que la trae
+        
+        La reserva caduca tras segundos_en_curso para que una petición
+        interrumpida (caída del servidor) no bloquee la clave hasta el TTL.
+        
+        Returns:
+            None si la clave quedó reservada para esta petición; si ya
+            existía, el registro guardado: {'huella', 'status_code',
+            'cuerpo', 'content_type'} (status_code None = en curso)
+        """
+        ahora = time.time()
         with self._obtener_conexion() as conn:
             cursor = conn.cursor()
             
-            # Total de alumnos activos
-            cursor.execute("SELECT COUNT(*) as total FROM usuarios WHERE estado = 'activo'")
-            alumnos_activos = cursor.fetchone()['total']
+            # Purga periódica de claves caducadas (usa idx_idempotencia_expira)
+            self._reservas_idempotencia += 1
+            if self._reservas_idempotencia % 256 == 0:
+                cursor.execute("DELETE FROM claves_idempotencia WHERE expira < ?", (ahora,))
+            else:
+                cursor.execute(
+                    "DELETE FROM claves_idempotencia WHERE clave = ? AND expira < ?",
+                    (clave, ahora)
+                )
             
-            # Asistencias del mes actual
-            mes_actual = datetime.now().strftime('%Y-%m')
             cursor.execute("""
-                SELECT COUNT(*) as total 
-                FROM asistencia 
-                WHERE fecha LIKE ?
-            """, (f"{mes_actual}%",))
-            asistencias_mes = cursor.fetchone()['total']
+                INSERT INTO claves_idempotencia (clave, huella, expira)
+                VALUES (?, ?, ?)
+                ON CONFLICT(clave) DO NOTHING
+            """, (clave, huella, ahora + segundos_en_curso))
+            if cursor.rowcount == 1:
+                return None
             
-            # Ingresos del mes
             cursor.execute("""
-                SELECT SUM(monto) as total 
-                FROM pagos 
-                WHERE fecha_pago LIKE ?
-            """, (f"{mes_actual}%",))
-            ingresos_mes = cursor.fetchone()['total'] or 0
+                SELECT huella, status_code, cuerpo, content_type
+                FROM claves_idempotencia WHERE clave = ?
+            """, (clave,))
+            return dict(cursor.fetchone())
+    
+    def guardar_respuesta_idempotente(self, clave: str, status_code: int, cuerpo: bytes,
+                                      content_type: Optional[str], ttl_segundos: float):
+        """Guardar la respuesta de una petición reservada para devolverla en reintentos"""
+        with self._obtener_conexion() as conn:
+            conn.execute("""
+                UPDATE claves_idempotencia
+                SET status_code = ?, cuerpo = ?, content_type = ?, expira = ?
+                WHERE clave = ?
+            """, (status_code, cuerpo, content_type, time.time() + ttl_segundos, clave))
+    
+    def liberar_clave_idempotencia(self, clave: str):
+        """Liberar una reserva cuya petición falló, para permitir reintentarla"""
+        with self._obtener_conexion() as conn:
+            conn.execute(
+                "DELETE FROM claves_idempotencia WHERE clave = ? AND status_code IS NULL",
+                (clave,)
+            )
+    
+    def obtener_estadisticas(self) -> Dict:
+        """
+        Obtener estadísticas generales del gimnasio
+        
+        Lee las tablas materializadas (O(1)), no recorre el histórico.
+        """
+        with self._obtener_conexion() as conn:
+            cursor = conn.cursor()
             
-            # Rutinas activas
-            cursor.execute("SELECT COUNT(*) as total FROM rutinas WHERE activa = 1")
-            rutinas_activas = cursor.fetchone()['total']
+            # Contadores globales (alumnos activos, rutinas activas)
+            cursor.execute("SELECT clave, valor FROM contadores_gimnasio")
+            contadores = {row['clave']: row['valor'] for row in cursor.fetchall()}
+            
+            # Asistencias e ingresos del mes actual
+            mes_actual = datetime.now().strftime('%Y-%m')
+            cursor.execute("""
+                SELECT asistencias, ingresos
+                FROM estadisticas_mensuales
+                WHERE mes = ?
+            """, (mes_actual,))
+            mes = cursor.fetchone()
             
             return {
-                'alumnos_activos': alumnos_activos,
-                'asistencias_mes': asistencias_mes,
-                'ingresos_mes': ingresos_mes,
-                'rutinas_activas': rutinas_activas
+                'alumnos_activos': int(contadores.get('alumnos_activos', 0)),
+                'asistencias_mes': mes['asistencias'] if mes else 0,
+                'ingresos_mes': mes['ingresos'] if mes else 0,
+                'rutinas_activas': int(contadores.get('rutinas_activas', 0))
             }
 
 
 # Instancia global del gestor
-gestor_bd = GestorBaseDatos()
+gestor_bd = GestorBaseDatos(config.DB_PATH)
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Utilidades de mantenimiento de la base de datos")
+    parser.add_argument(
+        '--reconstruir-estadisticas',
+        action='store_true',
+        help="Recalcular las estadísticas materializadas desde el histórico"
+    )
+    args = parser.parse_args()
+    
+    if args.reconstruir_estadisticas:
+        gestor_bd.reconstruir_estadisticas()
+        print(f"✅ Estadísticas reconstruidas: {gestor_bd.obtener_estadisticas()}")
+    else:
+        parser.print_help()
@@ -0,0 +1,155 @@
+"""
+Capa de Ejecución para el Servidor de la Aplicación Madre
+Saca del event loop de FastAPI el trabajo bloqueante: las llamadas a la
+base de datos van a un pool de threads y el hash de contraseñas (bcrypt,
+intensivo en CPU) a un pool de procesos
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from config.settings import config
+from shared.logger import obtener_logger
+from shared.metricas import metricas
+from shared.seguridad import iniciar_proceso_hash
+
+# Configurar logger
+logger = obtener_logger(__name__)
+
+_ejecutor_bd: Optional[ThreadPoolExecutor] = None
+_ejecutor_hash: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+# Tiempo de ejecución de cada operación de BD (en su thread) y del hash de
+# contraseñas (incluye la espera por un proceso libre)
+metrica_bd = metricas.histograma(
+    "gym_bd_operacion_segundos", "Duración de operaciones de GestorBaseDatos", ("operacion",)
+)
+metrica_hash = metricas.histograma(
+    "gym_hash_password_segundos", "Duración del hash/verificación bcrypt", ("funcion",),
+    limites=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+def _medir_bd(funcion: Callable, args: tuple, kwargs: dict) -> Any:
+    """Ejecutar en el thread de BD registrando la duración de la operación"""
+    inicio = time.perf_counter()
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        metrica_bd.observar(time.perf_counter() - inicio, getattr(funcion, '__name__', 'desconocida'))
+
+
+def _obtener_ejecutor_bd() -> ThreadPoolExecutor:
+    """Crear (una sola vez) el pool de threads para I/O de BD"""
+    global _ejecutor_bd
+    if _ejecutor_bd is None:
+        with _lock:
+            if _ejecutor_bd is None:
+                _ejecutor_bd = ThreadPoolExecutor(
+                    max_workers=config.DB_THREAD_POOL_SIZE,
+                    thread_name_prefix="bd"
+                )
+                logger.info(f"Pool de threads BD iniciado ({config.DB_THREAD_POOL_SIZE} workers)")
+    return _ejecutor_bd
+
+
+def _obtener_ejecutor_hash() -> ProcessPoolExecutor:
+    """
+    Crear (una sola vez) el pool de procesos para hash de contraseñas
+    
+    Los workers se lanzan con 'spawn': el servidor corre junto a la GUI, el
+    mantenimiento de BD y el listener de logs, y un fork copiaría locks
+    tomados y conexiones SQLite abiertas por esos threads. Cada worker
+    reimporta el módulo principal, por eso madre_main.py no configura nada
+    al importarse y madre_server.py como script delega en uvicorn; las
+    funciones de hash viven en shared.seguridad, que solo importa bcrypt.
+    """
+    global _ejecutor_hash
+    if _ejecutor_hash is None:
+        with _lock:
+            if _ejecutor_hash is None:
+                _ejecutor_hash = ProcessPoolExecutor(
+                    max_workers=config.HASH_PROCESS_POOL_SIZE,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=iniciar_proceso_hash
+                )
+                logger.info(f"Pool de procesos hash iniciado ({config.HASH_PROCESS_POOL_SIZE} workers)")
+    return _ejecutor_hash
+
+
+async def iniciar_ejecutores():
+    """
+    Crear los pools y arrancar los procesos de hash (al iniciar el servidor)
+    
+    Con 'spawn' cada worker tarda en importar sus módulos; lanzarlos aquí
+    evita que ese costo caiga sobre el primer login.
+    """
+    loop = asyncio.get_running_loop()
+    _obtener_ejecutor_bd()
+    ejecutor_hash = _obtener_ejecutor_hash()
+    # Tareas simultáneas: el pool lanza un proceso por cada una sin worker libre
+    pids = await asyncio.gather(*(
+        loop.run_in_executor(ejecutor_hash, os.getpid)
+        for _ in range(config.HASH_PROCESS_POOL_SIZE)
+    ))
+    logger.info(f"Procesos de hash listos: {len(set(pids))}")
+
+
+async def ejecutar_bd(funcion: Callable, *args, **kwargs) -> Any:
+    """
+    Ejecutar una operación de base de datos en el pool de threads
+    
+    Args:
+        funcion: Método bloqueante (típicamente de gestor_bd)
+        *args, **kwargs: Argumentos para la función
+    
+    Returns:
+        Resultado de la función
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _obtener_ejecutor_bd(),
+        functools.partial(_medir_bd, funcion, args, kwargs)
+    )
+
+
+async def ejecutar_hash(funcion: Callable, *args) -> Any:
+    """
+    Ejecutar una función de hash de contraseñas en el pool de procesos
+    
+    La función debe estar definida a nivel de módulo (picklable), por
+    ejemplo las de shared.seguridad.
+    
+    Args:
+        funcion: Función de hash a ejecutar
+        *args: Argumentos para la función
+    
+    Returns:
+        Resultado de la función
+    """
+    loop = asyncio.get_running_loop()
+    inicio = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_obtener_ejecutor_hash(), funcion, *args)
+    finally:
+        metrica_hash.observar(time.perf_counter() - inicio, funcion.__name__)
+
+
+def cerrar_ejecutores():
+    """Detener los pools de ejecución (al cerrar el servidor)"""
+    global _ejecutor_bd, _ejecutor_hash
+    with _lock:
+        if _ejecutor_bd is not None:
+            _ejecutor_bd.shutdown(wait=True)
+            _ejecutor_bd = None
+        if _ejecutor_hash is not None:
+            _ejecutor_hash.shutdown(wait=True, cancel_futures=True)
+            _ejecutor_hash = None
+    logger.info("Ejecutores de BD y hash detenidos")
@@ -12,11 +12,282 @@ import threading
 from madre_db import gestor_bd, Alumno
 from config.settings import config
 from shared.logger import obtener_logger
+from shared.tareas_ui import EjecutorTareasUI
 
 # Configurar logger
 logger = obtener_logger(__name__)
 
 
+class TablaAlumnosVirtual(ctk.CTkFrame):
+    """
+    Tabla de alumnos virtualizada
+    
+    Mantiene un número fijo de filas de widgets que se reutilizan al
+    desplazarse, de modo que el costo de dibujo y la memoria no dependen
+    del número de alumnos. Los datos se piden por páginas (keyset) en
+    segundo plano a medida que el desplazamiento se acerca al final de
+    lo ya cargado.
+    """
+    
+    COLUMNAS = ["Nombre", "Email", "Teléfono", "Nivel", "Equipo", "Estado"]
+    FILAS_VISIBLES = 20
+    TAMANO_PAGINA = 100
+    MARGEN_PRECARGA = 40      # Filas restantes que disparan la siguiente página
+    FILAS_POR_PASO = 3        # Filas por paso de rueda del mouse
+    ESPERA_BUSQUEDA_MS = 250  # Pausa de tecleo antes de buscar
+    
+    def __init__(self, master, tareas: EjecutorTareasUI, estado: Optional[str] = "activo", **kwargs):
+        super().__init__(master, **kwargs)
+        self.tareas = tareas
+        self.estado = estado
+        
+        # Estado de los datos
+        self._alumnos: List[Alumno] = []
+        self._siguiente_cursor: Optional[str] = None
+        self._hay_mas = True
+        self._cargando = False
+        self._error: Optional[str] = None
+        self._total_estimado: Optional[int] = None
+        self._busqueda = ""
+        self._inicio = 0
+        self._espera_busqueda = None
+        
+        # Vistas propias para que recargar o destruir la tabla descarte cargas viejas
+        self._vista_pagina = f"tabla_alumnos_{id(self)}"
+        self._vista_total = f"tabla_alumnos_total_{id(self)}"
+        
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+        
+        # Búsqueda incremental por nombre
+        self.entry_buscar = ctk.CTkEntry(self, placeholder_text="🔍 Buscar por nombre...")
+        self.entry_buscar.grid(row=0, column=0, columnspan=2, padx=5, pady=(5, 10), sticky="ew")
+        self.entry_buscar.bind("<KeyRelease>", self._al_escribir)
+        
+        # Encabezados
+        encabezado = ctk.CTkFrame(self)
+        encabezado.grid(row=1, column=0, sticky="ew")
+        for i, texto in enumerate(self.COLUMNAS):
+            label = ctk.CTkLabel(
+                encabezado,
+                text=texto,
+                font=ctk.CTkFont(size=12, weight="bold"),
+                width=150,
+                anchor="w"
+            )
+            label.grid(row=0, column=i, padx=5, pady=5, sticky="w")
+        
+        # Pool fijo de filas
+        self.cuerpo = ctk.CTkFrame(self)
+        self.cuerpo.grid(row=2, column=0, sticky="nsew")
+        self._filas = [self._crear_fila(i) for i in range(self.FILAS_VISIBLES)]
+        self._mostrados: List[Optional[int]] = [None] * self.FILAS_VISIBLES
+        
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._al_desplazar)
+        self.scrollbar.grid(row=2, column=1, sticky="ns")
+        
+        self.label_estado = ctk.CTkLabel(self, text="", font=ctk.CTkFont(size=11), text_color="gray")
+        self.label_estado.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        
+        self._vincular_rueda(self.cuerpo)
+        
+        self.recargar()
+    
+    def _crear_fila(self, indice: int) -> List[ctk.CTkLabel]:
+        """Crear una fila reutilizable del pool"""
+        fila = ctk.CTkFrame(self.cuerpo)
+        fila.grid(row=indice, column=0, pady=1, sticky="ew")
+        self._vincular_rueda(fila)
+        
+        celdas = []
+        for i in range(len(self.COLUMNAS)):
+            label = ctk.CTkLabel(fila, text="", font=ctk.CTkFont(size=11), width=150, anchor="w")
+            label.grid(row=0, column=i, padx=5, pady=2, sticky="w")
+            self._vincular_rueda(label)
+            celdas.append(label)
+        return celdas
+    
+    def _vincular_rueda(self, widget):
+        """Desplazar la tabla con la rueda del mouse sobre cualquier fila"""
+        widget.bind("<MouseWheel>", self._al_rueda)
+        widget.bind("<Button-4>", self._al_rueda)  # Linux
+        widget.bind("<Button-5>", self._al_rueda)
+    
+    def destroy(self):
+        """Descartar cargas pendientes antes de destruir la tabla"""
+        self.tareas.cancelar(self._vista_pagina)
+        self.tareas.cancelar(self._vista_total)
+        super().destroy()
+    
+    # ---- Datos ----
+    
+    def recargar(self):
+        """Reiniciar la tabla y pedir la primera página"""
+        self.tareas.cancelar(self._vista_pagina)
+        self.tareas.cancelar(self._vista_total)
+        self._alumnos = []
+        self._siguiente_cursor = None
+        self._hay_mas = True
+        self._cargando = False
+        self._error = None
+        self._total_estimado = None
+        self._inicio = 0
+        self._mostrados = [None] * self.FILAS_VISIBLES
+        
+        # El total solo orienta la barra de desplazamiento; sin búsqueda se estima
+        if not self._busqueda:
+            self.tareas.ejecutar(
+                gestor_bd.contar_alumnos,
+                self.estado,
+                exacto=False,
+                vista=self._vista_total,
+                al_terminar=self._total_recibido
+            )
+        
+        self._cargar_pagina()
+        self._pintar()
+    
+    def _cargar_pagina(self):
+        """Pedir la siguiente página en segundo plano"""
+        if self._cargando or not self._hay_mas:
+            return
+        self._cargando = True
+        self.tareas.ejecutar(
+            gestor_bd.obtener_alumnos_pagina,
+            estado=self.estado,
+            limite=self.TAMANO_PAGINA,
+            cursor_pagina=self._siguiente_cursor,
+            buscar=self._busqueda or None,
+            vista=self._vista_pagina,
+            al_terminar=self._pagina_recibida,
+            al_fallar=self._error_pagina
+        )
+    
+    def _pagina_recibida(self, resultado):
+        """Agregar una página recibida y seguir precargando si hace falta"""
+        alumnos, siguiente = resultado
+        self._alumnos.extend(alumnos)
+        self._siguiente_cursor = siguiente
+        self._hay_mas = siguiente is not None
+        self._cargando = False
+        self._mover_a(self._inicio)
+    
+    def _error_pagina(self, error: BaseException):
+        logger.error(f"Error cargando alumnos: {error}")
+        self._cargando = False
+        self._error = str(error)
+        self._pintar()
+    
+    def _total_recibido(self, total: int):
+        self._total_estimado = total
+        self._pintar()
+    
+    def _total_virtual(self) -> int:
+        """Número de filas que representa la barra de desplazamiento"""
+        cargados = len(self._alumnos)
+        if not self._hay_mas:
+            return cargados
+        if self._total_estimado is not None:
+            return max(cargados + 1, self._total_estimado)
+        return cargados + self.TAMANO_PAGINA
+    
+    # ---- Desplazamiento ----
+    
+    def _mover_a(self, inicio: int):
+        """Posicionar la primera fila visible y precargar si se acerca al final"""
+        maximo = max(0, self._total_virtual() - self.FILAS_VISIBLES)
+        self._inicio = max(0, min(int(inicio), maximo))
+        
+        if self._inicio + self.FILAS_VISIBLES + self.MARGEN_PRECARGA >= len(self._alumnos):
+            self._cargar_pagina()
+        
+        self._pintar()
+    
+    def _al_desplazar(self, accion, *args):
+        """Comando de la barra de desplazamiento (protocolo yview de Tk)"""
+        if accion == "moveto":
+            self._mover_a(float(args[0]) * self._total_virtual())
+        elif accion == "scroll":
+            pasos = int(args[0])
+            unidad = self.FILAS_VISIBLES if args[1] == "pages" else self.FILAS_POR_PASO
+            self._mover_a(self._inicio + pasos * unidad)
+    
+    def _al_rueda(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            direccion = -1
+        else:
+            direccion = 1
+        self._mover_a(self._inicio + direccion * self.FILAS_POR_PASO)
+    
+    # ---- Búsqueda ----
+    
+    def _al_escribir(self, event=None):
+        """Esperar a que se deje de teclear antes de buscar"""
+        if self._espera_busqueda is not None:
+            self.after_cancel(self._espera_busqueda)
+        self._espera_busqueda = self.after(self.ESPERA_BUSQUEDA_MS, self._aplicar_busqueda)
+    
+    def _aplicar_busqueda(self):
+        self._espera_busqueda = None
+        texto = self.entry_buscar.get().strip()
+        if texto != self._busqueda:
+            self._busqueda = texto
+            self.recargar()
+    
+    # ---- Dibujo ----
+    
+    def _pintar(self):
+        """Actualizar solo las celdas cuyo alumno cambió"""
+        for i, celdas in enumerate(self._filas):
+            indice = self._inicio + i
+            alumno = self._alumnos[indice] if indice < len(self._alumnos) else None
+            alumno_id = alumno.id if alumno else None
+            if self._mostrados[i] == alumno_id:
+                continue
+            self._mostrados[i] = alumno_id
+            
+            if alumno:
+                datos = [
+                    alumno.nombre,
+                    alumno.email,
+                    alumno.telefono or "N/A",
+                    alumno.nivel or "N/A",
+                    alumno.equipo or "N/A",
+                    alumno.estado
+                ]
+            else:
+                datos = [""] * len(self.COLUMNAS)
+            for label, dato in zip(celdas, datos):
+                label.configure(text=dato)
+        
+        total = self._total_virtual()
+        if total:
+            self.scrollbar.set(self._inicio / total, min(1.0, (self._inicio + self.FILAS_VISIBLES) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        
+        self.label_estado.configure(text=self._texto_estado(), text_color="red" if self._error else "gray")
+    
+    def _texto_estado(self) -> str:
+        if self._error:
+            return f"❌ Error cargando alumnos: {self._error}"
+        cargados = len(self._alumnos)
+        if not cargados:
+            if self._cargando:
+                return "⏳ Cargando alumnos..."
+            if self._busqueda:
+                return f"Sin resultados para \"{self._busqueda}\""
+            return "No hay alumnos registrados. ¡Agrega el primero!"
+        
+        fin = min(self._inicio + self.FILAS_VISIBLES, cargados)
+        if self._hay_mas:
+            total = f"~{self._total_estimado}" if self._total_estimado else f"{cargados}+"
+        else:
+            total = str(cargados)
+        texto = f"Mostrando {self._inicio + 1}-{fin} de {total}"
+        return texto + " (cargando...)" if self._cargando else texto
+
+
 class AplicacionMadre(ctk.CTk):
     """Aplicación principal administrativa del entrenador"""
     
@@ -30,6 +301,9 @@ class AplicacionMadre(ctk.CTk):
         # Variables de estado
         self.usuario_actual = None
         
+        # Consultas a la BD fuera del hilo de la interfaz
+        self.tareas = EjecutorTareasUI(self)
+        
         # Crear interfaz
         self._crear_interfaz()
         
@@ -144,6 +418,8 @@ class AplicacionMadre(ctk.CTk):
     
     def limpiar_main_frame(self):
         """Limpiar el frame principal"""
+        # Descartar cargas en curso de la vista anterior
+        self.tareas.cancelar('principal')
         for widget in self.main_frame.winfo_children():
             widget.destroy()
     
@@ -159,10 +435,37 @@ class AplicacionMadre(ctk.CTk):
         )
         titulo.pack(pady=30)
         
-        # Obtener estadísticas
+        # Obtener estadísticas en segundo plano
+        cargando = self._crear_indicador_carga("⏳ Cargando estadísticas...")
+        self.tareas.ejecutar(
+            gestor_bd.obtener_estadisticas,
+            vista='principal',
+            al_terminar=lambda stats: self._pintar_dashboard(cargando, stats),
+            al_fallar=lambda e: self._mostrar_error_carga(
+                cargando, "❌ Error cargando estadísticas", e
+            )
+        )
+    
+    def _crear_indicador_carga(self, texto: str) -> ctk.CTkLabel:
+        """Mostrar marcador de carga en el frame principal"""
+        cargando = ctk.CTkLabel(
+            self.main_frame,
+            text=texto,
+            font=ctk.CTkFont(size=16),
+            text_color="gray"
+        )
+        cargando.pack(pady=50)
+        return cargando
+    
+    def _mostrar_error_carga(self, cargando: ctk.CTkLabel, mensaje: str, error: BaseException):
+        """Reemplazar el marcador de carga por un mensaje de error"""
+        logger.error(f"{mensaje}: {error}")
+        cargando.configure(text=f"{mensaje}: {error}", text_color="red")
+    
+    def _pintar_dashboard(self, cargando: ctk.CTkLabel, stats: dict):
+        """Dibujar las tarjetas del tablero con las estadísticas obtenidas"""
+        cargando.destroy()
         try:
-            stats = gestor_bd.obtener_estadisticas()
-            
             # Frame de tarjetas de estadísticas
             stats_frame = ctk.CTkFrame(self.main_frame)
             stats_frame.pack(fill="both", expand=True, padx=40, pady=20)
@@ -283,73 +586,9 @@ class AplicacionMadre(ctk.CTk):
         )
         btn_actualizar.pack(side="left", padx=10)
         
-        # Lista de alumnos
-        try:
-            alumnos = gestor_bd.obtener_alumnos(estado="activo", limite=50)
-            
-            if not alumnos:
-                mensaje = ctk.CTkLabel(
-                    self.main_frame,
-                    text="No hay alumnos registrados. ¡Agrega el primero!",
-                    font=ctk.CTkFont(size=16)
-                )
-                mensaje.pack(pady=50)
-                return
-            
-            # Frame scrollable para lista
-            lista_frame = ctk.CTkScrollableFrame(self.main_frame, height=500)
-            lista_frame.pack(fill="both", expand=True, padx=40, pady=20)
-            
-            # Encabezados
-            headers = ["Nombre", "Email", "Teléfono", "Nivel", "Equipo", "Estado"]
-            header_frame = ctk.CTkFrame(lista_frame)
-            header_frame.pack(fill="x", pady=(0, 10))
-            
-            for i, header in enumerate(headers):
-                label = ctk.CTkLabel(
-                    header_frame,
-                    text=header,
-                    font=ctk.CTkFont(size=12, weight="bold"),
-                    width=150
-                )
-                label.grid(row=0, column=i, padx=5, pady=5, sticky="w")
-            
-            # Filas de alumnos
-            for alumno in alumnos:
-                self._crear_fila_alumno(lista_frame, alumno)
-        
-        except Exception as e:
-            logger.error(f"Error cargando alumnos: {e}")
-            error_label = ctk.CTkLabel(
-                self.main_frame,
-                text=f"❌ Error cargando alumnos: {e}",
-                font=ctk.CTkFont(size=14),
-                text_color="red"
-            )
-            error_label.pack(pady=50)
-    
-    def _crear_fila_alumno(self, parent, alumno: Alumno):
-        """Crear fila de alumno en la lista"""
-        fila = ctk.CTkFrame(parent)
-        fila.pack(fill="x", pady=2)
-        
-        datos = [
-            alumno.nombre,
-            alumno.email,
-            alumno.telefono or "N/A",
-            alumno.nivel or "N/A",
-            alumno.equipo or "N/A",
-            alumno.estado
-        ]
-        
-        for i, dato in enumerate(datos):
-            label = ctk.CTkLabel(
-                fila,
-                text=dato,
-                font=ctk.CTkFont(size=11),
-                width=150
-            )
-            label.grid(row=0, column=i, padx=5, pady=5, sticky="w")
+        # Tabla virtualizada: filas reutilizadas y páginas cargadas al desplazarse
+        self.tabla_alumnos = TablaAlumnosVirtual(self.main_frame, self.tareas, estado="activo")
+        self.tabla_alumnos.pack(fill="both", expand=True, padx=40, pady=20)
     
     def dialogo_nuevo_alumno(self):
         """Mostrar diálogo para crear nuevo alumno"""
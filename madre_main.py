@@ -3,6 +3,7 @@ Aplicación Principal Madre (Entrenador Personal)
 Punto de entrada que inicia servidor API y GUI administrativa
 """
 
+import logging
 import threading
 import time
 import sys
@@ -12,14 +13,10 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config.settings import config
-from shared.logger import configurar_logging, obtener_logger
 
-# Configurar logging
-logger = configurar_logging(
-    nombre_app='gym_madre',
-    nivel=config.LOG_LEVEL,
-    archivo_log=config.LOG_FILE
-)
+# Los handlers se configuran en main(): los workers de hash (spawn) vuelven
+# a importar este módulo como __mp_main__ y no deben abrir el archivo de log
+logger = logging.getLogger('gym_madre')
 
 
 def iniciar_servidor():
@@ -66,6 +63,13 @@ def iniciar_gui():
 
 def main():
     """Función principal"""
+    from shared.logger import configurar_logging
+    configurar_logging(
+        nombre_app='gym_madre',
+        nivel=config.LOG_LEVEL,
+        archivo_log=config.LOG_FILE
+    )
+    
     print("\n" + "="*70)
     print("🏋️  SISTEMA DE GESTIÓN DE GIMNASIO - APLICACIÓN ENTRENADOR")
     print("="*70 + "\n")
@@ -3,39 +3,116 @@ Servidor API REST para Aplicación Madre (Entrenador Personal)
 Implementa FastAPI con validación Pydantic, rate limiting, autenticación JWT
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+if __name__ == "__main__":
+    # Como script se delega en "python -m uvicorn madre_server:app" antes de
+    # construir nada: el módulo principal pasa a ser uvicorn.__main__, que los
+    # workers de hash (spawn) no reimportan, en lugar de este archivo entero
+    import subprocess
+    import sys
+    from config.settings import config
+    
+    comando = [
+        sys.executable, "-m", "uvicorn", "madre_server:app",
+        "--host", config.SERVER_HOST,
+        "--port", str(config.SERVER_PORT),
+        "--log-level", config.LOG_LEVEL.lower()
+    ]
+    if config.DEBUG:
+        comando.append("--reload")
+    sys.exit(subprocess.call(comando))
+
+from fastapi import FastAPI, HTTPException, Depends, Query, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import List, Optional, Dict
-from datetime import datetime, timedelta
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, ValidationError, validator
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Dict, Set, Tuple
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import asyncio
+import csv
+import functools
+import hashlib
+import io
+import json
+import operator
+import threading
+import time
 import jwt
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
-from madre_db import gestor_bd, Alumno, Rutina
+from madre_db import gestor_bd, Alumno, Rutina, RECURSOS_EXPORTABLES
+from madre_ejecutor import ejecutar_bd, ejecutar_hash, cerrar_ejecutores, iniciar_ejecutores
 from config.settings import config
-from shared.logger import obtener_logger
+from shared.logger import FiltroMuestreo, detener_logging, obtener_logger
+from shared.metricas import metricas
+from shared.perfil_consultas import perfil_consultas
+from shared.pool_conexiones import cerrar_pools
+from shared.seguridad import generar_hash_password, verificar_password
+
+# orjson y brotli-asgi son opcionales: sin ellos se usa JSONResponse y GZip
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
 # Configurar logger
 logger = obtener_logger(__name__)
+logger.addFilter(FiltroMuestreo(config.LOG_MUESTREO_GET_OK))
+
+# Clase de respuesta JSON por defecto (orjson serializa varias veces más rápido)
+ClaseRespuestaJSON = ORJSONResponse if (orjson is not None and config.JSON_RAPIDO) else JSONResponse
 
 # Configurar rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+# Métricas HTTP (la ruta es la plantilla, p. ej. /api/usuarios/{usuario_id})
+metrica_peticiones = metricas.contador(
+    "gym_http_peticiones_total", "Peticiones HTTP atendidas", ("metodo", "ruta", "status")
+)
+metrica_latencia = metricas.histograma(
+    "gym_http_peticion_segundos", "Duración de las peticiones HTTP", ("metodo", "ruta")
+)
+metrica_en_curso = metricas.medidor(
+    "gym_http_peticiones_en_curso", "Peticiones HTTP en proceso"
+)
+metrica_rate_limit = metricas.contador(
+    "gym_rate_limit_rechazos_total", "Peticiones rechazadas por rate limiting", ("ruta",)
+)
+
+
+def _ruta_metrica(request: Request) -> str:
+    """Plantilla de la ruta atendida (acota la cardinalidad de las etiquetas)"""
+    ruta = request.scope.get("route")
+    return getattr(ruta, "path", "sin_ruta")
+
+
+def manejador_rate_limit(request: Request, exc: RateLimitExceeded) -> Response:
+    """Contar el rechazo y delegar la respuesta 429 en slowapi"""
+    metrica_rate_limit.inc(_ruta_metrica(request))
+    return _rate_limit_exceeded_handler(request, exc)
+
 # Crear aplicación FastAPI
 app = FastAPI(
     title="API Gestión de Gimnasio - Entrenador Personal",
     description="API REST para gestión completa de gimnasio y entrenamiento personalizado",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ClaseRespuestaJSON
 )
 
 # Agregar middleware de rate limiting
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, manejador_rate_limit)
 
 # Configurar CORS
 app.add_middleware(
@@ -114,6 +191,50 @@ class MensajeCrear(BaseModel):
     tipo: str = Field(default="personal", pattern="^(personal|grupal|anuncio)$")
 
 
+class AsistenciaLoteItem(BaseModel):
+    """Registro individual dentro de un lote de asistencia"""
+    alumno_id: int = Field(..., gt=0)
+    tipo_sesion: str = Field(default="general", max_length=50)
+    fecha_hora: Optional[datetime] = Field(None, description="Momento de entrada (por defecto ahora)")
+
+
+class AsistenciaLote(BaseModel):
+    """
+    Modelo para registrar asistencias en lote (p. ej. molinetes)
+    Cada registro se valida por separado contra AsistenciaLoteItem
+    """
+    registros: List[Dict[str, Any]] = Field(..., min_length=1, max_length=config.LOTE_MAX_ITEMS)
+
+
+class EvaluacionLoteItem(EvaluacionCrear):
+    """Evaluación individual dentro de un lote"""
+    fecha: Optional[datetime] = Field(None, description="Fecha de la evaluación (por defecto ahora)")
+
+
+class EvaluacionLote(BaseModel):
+    """
+    Modelo para registrar evaluaciones en lote
+    Cada evaluación se valida por separado contra EvaluacionLoteItem
+    """
+    evaluaciones: List[Dict[str, Any]] = Field(..., min_length=1, max_length=config.LOTE_MAX_ITEMS)
+
+
+class ProgresoLoteItem(BaseModel):
+    """Registro de progreso individual dentro de un lote de la cola offline"""
+    usuario_id: int = Field(..., gt=0)
+    clave_idempotencia: str = Field(..., min_length=1, max_length=100)
+    fecha: Optional[datetime] = Field(None, description="Momento del registro en el cliente")
+    datos: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ProgresoLote(BaseModel):
+    """
+    Modelo para reenviar en lote la cola offline de progreso
+    Cada registro se valida por separado contra ProgresoLoteItem
+    """
+    registros: List[Dict[str, Any]] = Field(..., min_length=1, max_length=config.LOTE_MAX_ITEMS)
+
+
 class RespuestaBase(BaseModel):
     """Modelo base para respuestas exitosas"""
     exito: bool = True
@@ -163,33 +284,329 @@ def verificar_token_jwt(token: str) -> Dict:
         )
 
 
+class ResultadoCacheado:
+    """
+    Resultado de una verificación costosa reutilizado durante un TTL
+    
+    Solo una corrutina recalcula a la vez; las demás esperan y reciben el
+    mismo valor, así una ráfaga de sondas produce una única consulta.
+    """
+    
+    def __init__(self, ttl_segundos: float):
+        self.ttl_segundos = ttl_segundos
+        self._valor: Any = None
+        self._error: Optional[Exception] = None
+        self._expira = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def obtener(self, productor: Callable[[], Awaitable[Any]]) -> Any:
+        """Devolver el valor cacheado o recalcularlo con productor()"""
+        if time.monotonic() >= self._expira:
+            async with self._lock:
+                if time.monotonic() >= self._expira:
+                    try:
+                        self._valor = await productor()
+                        self._error = None
+                    except Exception as e:
+                        self._valor = None
+                        self._error = e
+                    self._expira = time.monotonic() + self.ttl_segundos
+        
+        if self._error is not None:
+            raise self._error
+        return self._valor
+
+
+# Caches de las sondas de salud
+cache_readyz = ResultadoCacheado(config.READYZ_CACHE_SECONDS)
+cache_health = ResultadoCacheado(config.HEALTH_CACHE_SECONDS)
+
+class CacheRespuestas:
+    """
+    Caché en memoria de respuestas GET (TTL + LRU) invalidada por tabla
+    
+    Cada entrada guarda el cuerpo ya serializado junto con las tablas de
+    las que depende; cuando GestorBaseDatos confirma una escritura en una
+    de ellas, las entradas afectadas se descartan. Las invalidaciones llegan
+    desde los threads de BD, por eso el estado se protege con un lock.
+    """
+    
+    def __init__(self, max_entradas: int, ttl_segundos: float):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas: "OrderedDict[str, Tuple[float, bytes, str, Tuple[str, ...]]]" = OrderedDict()
+        self._por_tabla: Dict[str, Set[str]] = {}
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+    
+    @property
+    def generacion(self) -> int:
+        """Contador de invalidaciones; permite descartar resultados calculados antes de una"""
+        return self._generacion
+    
+    def obtener(self, clave: str) -> Optional[Tuple[bytes, str]]:
+        """Devolver (cuerpo, media_type) si la entrada existe y no expiró"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    self._quitar(clave)
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1], entrada[2]
+    
+    def guardar(self, clave: str, cuerpo: bytes, media_type: str,
+                tablas: Tuple[str, ...], generacion: int):
+        """Guardar una respuesta si ninguna escritura ocurrió mientras se calculaba"""
+        with self._lock:
+            if generacion != self._generacion:
+                return
+            self._quitar(clave)
+            self._entradas[clave] = (time.monotonic() + self.ttl_segundos, cuerpo, media_type, tablas)
+            for tabla in tablas:
+                self._por_tabla.setdefault(tabla, set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+    
+    def invalidar(self, tablas: Tuple[str, ...]):
+        """Descartar las entradas que dependen de alguna de las tablas"""
+        with self._lock:
+            self._generacion += 1
+            for tabla in tablas:
+                for clave in list(self._por_tabla.get(tabla, ())):
+                    self._quitar(clave)
+    
+    def _quitar(self, clave: str):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            for tabla in entrada[3]:
+                claves = self._por_tabla.get(tabla)
+                if claves is not None:
+                    claves.discard(clave)
+    
+    def estadisticas(self) -> Dict:
+        """Tamaño y tasa de aciertos de la caché"""
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos
+            }
+
+
+cache_respuestas = CacheRespuestas(config.CACHE_MAX_ENTRADAS, config.CACHE_TTL_SECONDS)
+gestor_bd.suscribir_cambios(cache_respuestas.invalidar)
+
+
+def cachear_respuesta(*tablas: str):
+    """
+    Decorador de endpoints GET que sirve la respuesta desde cache_respuestas
+    
+    La clave es la ruta más los parámetros de query ordenados; solo se
+    guardan respuestas 200. Debe aplicarse debajo de @limiter.limit.
+    
+    Args:
+        tablas: Tablas cuya modificación invalida la respuesta
+    """
+    def decorador(endpoint: Callable[..., Awaitable[Any]]):
+        @functools.wraps(endpoint)
+        async def envoltura(*args, **kwargs):
+            if not config.CACHE_ENABLED:
+                return await endpoint(*args, **kwargs)
+            
+            request: Request = kwargs["request"]
+            clave = f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}"
+            
+            entrada = cache_respuestas.obtener(clave)
+            if entrada is not None:
+                cuerpo, media_type = entrada
+                return Response(content=cuerpo, media_type=media_type, headers={"X-Cache": "HIT"})
+            
+            generacion = cache_respuestas.generacion
+            resultado = await endpoint(*args, **kwargs)
+            respuesta = resultado if isinstance(resultado, Response) else ClaseRespuestaJSON(content=resultado)
+            
+            if respuesta.status_code == status.HTTP_200_OK and not isinstance(respuesta, StreamingResponse):
+                cache_respuestas.guardar(clave, respuesta.body, respuesta.media_type, tablas, generacion)
+            respuesta.headers["X-Cache"] = "MISS"
+            return respuesta
+        
+        return envoltura
+    return decorador
+
+
+# Campos de Alumno expuestos por la API (foto_perfil se omite en listados)
+CAMPOS_ALUMNO_API = ('id', 'nombre', 'email', 'telefono', 'fecha_registro', 'estado', 'equipo', 'nivel')
+_valores_alumno = operator.attrgetter(*CAMPOS_ALUMNO_API)
+
+
+# Métodos cuyas peticiones pueden deduplicarse con la cabecera Idempotency-Key
+METODOS_IDEMPOTENTES = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Rutas excluidas: sus respuestas llevan credenciales (tokens) que no deben
+# quedar guardadas en claves_idempotencia
+RUTAS_SIN_IDEMPOTENCIA = ("/api/auth/",)
+
+# Errores 4xx deterministas: repetir la petición daría el mismo resultado,
+# así que se guardan como las respuestas 2xx. El resto (401, 409, 429...)
+# es transitorio y libera la clave para que el reintento se ejecute.
+ESTADOS_4XX_DETERMINISTAS = {400, 404, 422}
+
+
+@app.middleware("http")
+async def middleware_idempotencia(request: Request, call_next):
+    """
+    Deduplicar escrituras reintentadas que traen la cabecera Idempotency-Key
+    
+    La primera petición reserva la clave y su respuesta (2xx o un 4xx
+    determinista) se guarda durante IDEMPOTENCIA_TTL_HORAS; las repeticiones
+    reciben esa respuesta sin volver a ejecutarse. Mientras la original
+    sigue en curso se responde 409, y si la clave llega con otro cuerpo, 422.
+    Las rutas de autenticación no pasan por aquí.
+    """
+    clave = request.headers.get("Idempotency-Key")
+    if (not clave or request.method not in METODOS_IDEMPOTENTES
+            or request.url.path.startswith(RUTAS_SIN_IDEMPOTENCIA)):
+        return await call_next(request)
+    
+    if len(clave) > 255:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"exito": False, "error": "Idempotency-Key demasiado larga"}
+        )
+    
+    cuerpo = await request.body()
+    huella = hashlib.sha256(
+        f"{request.method} {request.url.path}?{request.url.query}\n".encode() + cuerpo
+    ).hexdigest()
+    
+    existente = await ejecutar_bd(
+        gestor_bd.reservar_clave_idempotencia, clave, huella,
+        config.IDEMPOTENCIA_EN_CURSO_SEGUNDOS
+    )
+    if existente is not None:
+        if existente['huella'] != huella:
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content={"exito": False, "error": "Idempotency-Key reutilizada con otra petición"}
+            )
+        if existente['status_code'] is None:
+            return JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={"exito": False, "error": "Petición original aún en curso"}
+            )
+        logger.info(f"Respuesta idempotente repetida: {request.method} {request.url.path}")
+        return Response(
+            content=existente['cuerpo'],
+            status_code=existente['status_code'],
+            media_type=existente['content_type'],
+            headers={"Idempotent-Replayed": "true"}
+        )
+    
+    try:
+        response = await call_next(request)
+        contenido = b"".join([fragmento async for fragmento in response.body_iterator])
+    except Exception:
+        await ejecutar_bd(gestor_bd.liberar_clave_idempotencia, clave)
+        raise
+    
+    if response.status_code < 300 or response.status_code in ESTADOS_4XX_DETERMINISTAS:
+        await ejecutar_bd(
+            gestor_bd.guardar_respuesta_idempotente, clave, response.status_code,
+            contenido, response.headers.get("content-type"),
+            config.IDEMPOTENCIA_TTL_HORAS * 3600
+        )
+    else:
+        # Error transitorio (5xx, 401, 409, 429...): el cliente debe poder
+        # reintentar con la misma clave
+        await ejecutar_bd(gestor_bd.liberar_clave_idempotencia, clave)
+    
+    return Response(
+        content=contenido,
+        status_code=response.status_code,
+        headers=dict(response.headers),
+        media_type=response.media_type
+    )
+
+
 @app.middleware("http")
 async def middleware_logging(request: Request, call_next):
-    """Middleware para logging de requests"""
-    inicio = datetime.now()
+    """Middleware para logging y métricas de requests"""
+    inicio = time.perf_counter()
+    metrica_en_curso.inc()
     
     # Procesar request
-    response = await call_next(request)
+    try:
+        response = await call_next(request)
+    except Exception:
+        ruta = _ruta_metrica(request)
+        metrica_peticiones.inc(request.method, ruta, "500")
+        metrica_latencia.observar(time.perf_counter() - inicio, request.method, ruta)
+        raise
+    finally:
+        metrica_en_curso.dec()
     
     # Calcular duración
-    duracion = (datetime.now() - inicio).total_seconds()
+    duracion = time.perf_counter() - inicio
+    ruta = _ruta_metrica(request)
+    metrica_peticiones.inc(request.method, ruta, str(response.status_code))
+    metrica_latencia.observar(duracion, request.method, ruta)
     
-    # Log del request
-    logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Duración: {duracion:.3f}s"
-    )
+    # Log del request: campos estructurados y los GET exitosos muestreados
+    # (FiltroMuestreo descarta el registro antes de formatearlo)
+    campos = {
+        'metodo': request.method,
+        'ruta': request.url.path,
+        'status': response.status_code,
+        'duracion_ms': round(duracion * 1000, 2)
+    }
+    if request.method == 'GET' and response.status_code < 400:
+        campos['muestreo'] = 'get_ok'
+    logger.info("Petición atendida", extra=campos)
     
     return response
 
 
+# Compresión de respuestas: se registra después de los middlewares anteriores
+# para quedar como la capa más externa (la caché de idempotencia guarda el
+# cuerpo sin comprimir y cada cliente lo recibe según su Accept-Encoding)
+if config.COMPRESION_HABILITADA:
+    if BrotliMiddleware is not None and config.COMPRESION_BROTLI:
+        app.add_middleware(
+            BrotliMiddleware,
+            quality=config.COMPRESION_NIVEL_BROTLI,
+            minimum_size=config.COMPRESION_TAMANO_MINIMO,
+            gzip_fallback=True
+        )
+    else:
+        app.add_middleware(
+            GZipMiddleware,
+            minimum_size=config.COMPRESION_TAMANO_MINIMO,
+            compresslevel=config.COMPRESION_NIVEL_GZIP
+        )
+
+
+def respuesta_json(contenido: Any, status_code: int = status.HTTP_200_OK,
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serializar directamente con la clase de respuesta configurada
+    
+    Para listados grandes: devolver la Response evita que FastAPI recorra
+    el contenido con jsonable_encoder y la validación de response_model.
+    """
+    return ClaseRespuestaJSON(content=contenido, status_code=status_code, headers=headers)
+
+
 @app.exception_handler(Exception)
 async def manejador_excepciones_global(request: Request, exc: Exception):
     """Manejador global de excepciones"""
     logger.error(f"Error no manejado: {exc}", exc_info=True)
     
-    return JSONResponse(
+    return ClaseRespuestaJSON(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "exito": False,
@@ -215,22 +632,52 @@ async def raiz():
     }
 
 
+@app.get("/livez", response_model=Dict, tags=["General"])
+async def liveness_probe():
+    """
+    Sonda de vida: el proceso responde
+    No hace I/O ni cuenta para el rate limiting
+    """
+    return {"estado": "vivo"}
+
+
+@app.get("/readyz", response_model=Dict, tags=["General"])
+async def readiness_probe():
+    """
+    Sonda de disponibilidad: la base de datos acepta consultas
+    Reutiliza el resultado de un SELECT 1 durante READYZ_CACHE_SECONDS
+    """
+    try:
+        await cache_readyz.obtener(lambda: ejecutar_bd(gestor_bd.verificar_conexion))
+        return {"estado": "listo", "base_datos": "conectada"}
+    except Exception as e:
+        logger.error(f"Error en readiness probe: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio no disponible"
+        )
+
+
 @app.get("/health", response_model=Dict, tags=["General"])
 @limiter.limit("30/minute")
 async def health_check(request: Request):
     """
-    Health check comprehensivo del sistema
-    Verifica estado de BD, configuración, etc.
+    Health check detallado del sistema
+    Verifica estado de BD y devuelve estadísticas cacheadas (HEALTH_CACHE_SECONDS)
     """
     try:
         # Verificar conexión a BD
-        estadisticas = gestor_bd.obtener_estadisticas()
+        estadisticas = await cache_health.obtener(
+            lambda: ejecutar_bd(gestor_bd.obtener_estadisticas)
+        )
         
         return {
             "estado": "saludable",
             "timestamp": datetime.now().isoformat(),
             "base_datos": "conectada",
             "estadisticas": estadisticas,
+            "pool_conexiones": gestor_bd.pool.estadisticas(),
+            "cache_respuestas": cache_respuestas.estadisticas(),
             "version": "2.0.0"
         }
     except Exception as e:
@@ -241,6 +688,33 @@ async def health_check(request: Request):
         )
 
 
+@app.get("/metrics", tags=["General"], include_in_schema=False)
+async def exponer_metricas():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return Response(
+        content=metricas.exponer(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/api/diagnostico/consultas", response_model=Dict, tags=["General"])
+@limiter.limit("10/minute")
+async def diagnostico_consultas(
+    request: Request,
+    limite: int = Query(20, ge=1, le=200),
+    orden: str = Query("total", pattern="^(total|media|max|llamadas)$")
+):
+    """
+    Sentencias SQL más costosas desde el arranque, agrupadas por huella
+    Las que superan DB_SLOW_QUERY_MS se registran además en el log con su plan
+    """
+    return {
+        "exito": True,
+        "umbral_lenta_ms": perfil_consultas.umbral_lenta_ms,
+        "consultas": perfil_consultas.resumen(limite, orden)
+    }
+
+
 @app.post("/api/auth/login", response_model=Dict, tags=["Autenticación"])
 @limiter.limit("10/minute")
 async def login(request: Request, credenciales: UsuarioLogin):
@@ -249,11 +723,22 @@ async def login(request: Request, credenciales: UsuarioLogin):
     Incluye rate limiting para prevenir ataques de fuerza bruta
     """
     try:
-        # Verificar credenciales
-        usuario = gestor_bd.verificar_credenciales(
-            credenciales.email,
-            credenciales.password
-        )
+        # Verificar credenciales: lectura en el pool de BD y bcrypt en el
+        # pool de procesos para no bloquear el event loop
+        usuario = None
+        datos_auth = await ejecutar_bd(gestor_bd.obtener_credenciales, credenciales.email)
+        
+        if datos_auth:
+            password_valida = await ejecutar_hash(
+                verificar_password,
+                credenciales.password,
+                datos_auth['password_hash']
+            )
+            usuario = await ejecutar_bd(
+                gestor_bd.registrar_resultado_login,
+                datos_auth,
+                password_valida
+            )
         
         if not usuario:
             logger.warning(f"Intento de login fallido: {credenciales.email}")
@@ -292,13 +777,17 @@ async def crear_usuario(request: Request, usuario: UsuarioCrear):
     Valida complejidad de contraseña y unicidad de email
     """
     try:
-        usuario_id = gestor_bd.crear_usuario(
+        password_hash = await ejecutar_hash(generar_hash_password, usuario.password)
+        
+        usuario_id = await ejecutar_bd(
+            gestor_bd.crear_usuario,
             nombre=usuario.nombre,
             email=usuario.email,
             password=usuario.password,
             telefono=usuario.telefono,
             equipo=usuario.equipo,
-            nivel=usuario.nivel
+            nivel=usuario.nivel,
+            password_hash=password_hash
         )
         
         logger.info(f"Usuario creado: {usuario.email} (ID: {usuario_id})")
@@ -323,45 +812,68 @@ async def crear_usuario(request: Request, usuario: UsuarioCrear):
 
 @app.get("/api/usuarios", response_model=Dict, tags=["Usuarios"])
 @limiter.limit("30/minute")
+@cachear_respuesta('usuarios')
 async def obtener_usuarios(
     request: Request,
     estado: Optional[str] = None,
-    limite: int = Field(100, ge=1, le=1000),
-    offset: int = Field(0, ge=0)
+    limite: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0, description="Obsoleto: usar cursor"),
+    cursor: Optional[str] = Query(None, description="Valor next_cursor de la página anterior"),
+    total: str = Query("estimado", pattern="^(ninguno|exacto|estimado)$")
 ):
     """
-    Obtener lista de usuarios/alumnos con paginación
+    Obtener lista de usuarios/alumnos con paginación por cursor
+    
+    Cada respuesta incluye next_cursor (null en la última página). El total
+    se incluye por defecto como estimado (contadores o sqlite_stat1, con el
+    conteo cacheado como respaldo); total=exacto lo cuenta y total=ninguno
+    lo omite.
     """
     try:
-        alumnos = gestor_bd.obtener_alumnos(
-            estado=estado,
-            limite=limite,
-            offset=offset
-        )
+        siguiente_cursor = None
+        if offset:
+            # Paginación por OFFSET heredada (costo lineal con la profundidad)
+            alumnos = await ejecutar_bd(
+                gestor_bd.obtener_alumnos,
+                estado=estado,
+                limite=limite,
+                offset=offset
+            )
+        else:
+            alumnos, siguiente_cursor = await ejecutar_bd(
+                gestor_bd.obtener_alumnos_pagina,
+                estado=estado,
+                limite=limite,
+                cursor_pagina=cursor
+            )
         
-        # Convertir a diccionarios
-        alumnos_dict = [
-            {
-                'id': a.id,
-                'nombre': a.nombre,
-                'email': a.email,
-                'telefono': a.telefono,
-                'fecha_registro': a.fecha_registro,
-                'estado': a.estado,
-                'equipo': a.equipo,
-                'nivel': a.nivel
-            }
-            for a in alumnos
-        ]
+        total_alumnos = None
+        if total != "ninguno":
+            total_alumnos = await ejecutar_bd(
+                gestor_bd.contar_alumnos,
+                estado=estado,
+                exacto=(total == "exacto")
+            )
         
-        return {
+        # Convertir a diccionarios (una sola llamada en C por alumno)
+        alumnos_dict = [dict(zip(CAMPOS_ALUMNO_API, _valores_alumno(a))) for a in alumnos]
+        
+        return respuesta_json({
             "exito": True,
-            "total": len(alumnos_dict),
+            "cantidad": len(alumnos_dict),
+            "total": total_alumnos,
+            "total_tipo": total,
             "limite": limite,
             "offset": offset,
+            "next_cursor": siguiente_cursor,
             "alumnos": alumnos_dict
-        }
+        })
     
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error obteniendo usuarios: {e}")
         raise HTTPException(
@@ -370,12 +882,52 @@ async def obtener_usuarios(
         )
 
 
+@app.get("/api/usuarios/{usuario_id}/rutinas", response_model=Dict, tags=["Rutinas"])
+@limiter.limit("60/minute")
+async def obtener_rutinas_usuario(
+    request: Request,
+    usuario_id: int,
+    since: int = Query(0, ge=0, description="Versión ya sincronizada por el cliente")
+):
+    """
+    Obtener rutinas asignadas a un alumno con sincronización incremental
+    
+    Responde 304 si el ETag enviado en If-None-Match sigue vigente. Con
+    ?since=N devuelve solo las asignaciones cambiadas después de la versión N.
+    """
+    try:
+        version = await ejecutar_bd(gestor_bd.version_rutinas_alumno, usuario_id)
+        etag = f'W/"rutinas-{usuario_id}-{version}"'
+        
+        etags_cliente = {e.strip() for e in request.headers.get("if-none-match", "").split(",")}
+        if etag in etags_cliente or "*" in etags_cliente:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        
+        rutinas = await ejecutar_bd(gestor_bd.obtener_rutinas_alumno, usuario_id, since)
+        
+        return respuesta_json({
+            "exito": True,
+            "version": version,
+            "completo": since == 0,
+            "cantidad": len(rutinas),
+            "rutinas": rutinas
+        }, headers={"ETag": etag})
+    
+    except Exception as e:
+        logger.error(f"Error obteniendo rutinas del usuario {usuario_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error obteniendo rutinas"
+        )
+
+
 @app.post("/api/rutinas", response_model=RespuestaBase, tags=["Rutinas"], status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/minute")
 async def crear_rutina(request: Request, rutina: RutinaCrear):
     """Crear nueva rutina de entrenamiento"""
     try:
-        rutina_id = gestor_bd.crear_rutina(
+        rutina_id = await ejecutar_bd(
+            gestor_bd.crear_rutina,
             nombre=rutina.nombre,
             descripcion=rutina.descripcion,
             nivel_dificultad=rutina.nivel_dificultad,
@@ -404,7 +956,8 @@ async def crear_rutina(request: Request, rutina: RutinaCrear):
 async def registrar_evaluacion(request: Request, evaluacion: EvaluacionCrear):
     """Registrar evaluación corporal de un alumno"""
     try:
-        evaluacion_id = gestor_bd.registrar_evaluacion(
+        evaluacion_id = await ejecutar_bd(
+            gestor_bd.registrar_evaluacion,
             alumno_id=evaluacion.alumno_id,
             peso_kg=evaluacion.peso_kg,
             altura_cm=evaluacion.altura_cm,
@@ -435,7 +988,8 @@ async def registrar_evaluacion(request: Request, evaluacion: EvaluacionCrear):
 async def registrar_pago(request: Request, pago: PagoCrear):
     """Registrar pago de membresía"""
     try:
-        pago_id = gestor_bd.registrar_pago(
+        pago_id = await ejecutar_bd(
+            gestor_bd.registrar_pago,
             alumno_id=pago.alumno_id,
             monto=pago.monto,
             tipo_membresia=pago.tipo_membresia,
@@ -464,7 +1018,8 @@ async def registrar_pago(request: Request, pago: PagoCrear):
 async def enviar_mensaje(request: Request, mensaje: MensajeCrear):
     """Enviar mensaje a un alumno"""
     try:
-        mensaje_id = gestor_bd.enviar_mensaje(
+        mensaje_id = await ejecutar_bd(
+            gestor_bd.enviar_mensaje,
             remitente_id=mensaje.remitente_id,
             destinatario_id=mensaje.destinatario_id,
             asunto=mensaje.asunto,
@@ -487,12 +1042,175 @@ async def enviar_mensaje(request: Request, mensaje: MensajeCrear):
         )
 
 
+def _resumen_lote(resultados: List[Dict]) -> Dict:
+    """Construir respuesta estándar con el resultado por elemento de un lote"""
+    exitosos = sum(1 for r in resultados if r['exito'])
+    return {
+        "exito": exitosos == len(resultados),
+        "procesados": len(resultados),
+        "exitosos": exitosos,
+        "fallidos": len(resultados) - exitosos,
+        "resultados": resultados
+    }
+
+
+def _mensaje_validacion(error: ValidationError) -> str:
+    """Resumir los errores de pydantic de un elemento en una línea"""
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in e['loc']) or 'registro'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+async def _procesar_lote(modelo: type, items: List[Dict[str, Any]],
+                         registrar: Callable[[List[Dict]], List[Dict]]) -> Dict:
+    """
+    Validar cada elemento de un lote por separado y registrar los válidos
+    
+    Un elemento mal formado no rechaza el lote entero: se informa como
+    {'indice', 'exito': False, 'error'} y el resto se registra en una sola
+    transacción con la función de gestor_bd recibida.
+    """
+    resultados: List[Optional[Dict]] = [None] * len(items)
+    validos, indices = [], []
+    for i, item in enumerate(items):
+        try:
+            validos.append(modelo.model_validate(item).model_dump())
+            indices.append(i)
+        except ValidationError as e:
+            resultados[i] = {'indice': i, 'exito': False, 'error': _mensaje_validacion(e)}
+    
+    if validos:
+        for resultado in await ejecutar_bd(registrar, validos):
+            # Volver a los índices del lote original
+            resultado['indice'] = indices[resultado['indice']]
+            resultados[resultado['indice']] = resultado
+    
+    return _resumen_lote(resultados)
+
+
+@app.post("/api/evaluaciones/lote", response_model=Dict, tags=["Evaluaciones"])
+@limiter.limit(f"{config.RATE_LIMIT_LOTE_POR_MINUTO}/minute")
+async def registrar_evaluaciones_lote(request: Request, lote: EvaluacionLote):
+    """
+    Registrar evaluaciones corporales en lote
+    Una sola transacción; informa éxito o error por cada evaluación
+    """
+    try:
+        return await _procesar_lote(
+            EvaluacionLoteItem, lote.evaluaciones, gestor_bd.registrar_evaluaciones_lote
+        )
+    
+    except Exception as e:
+        logger.error(f"Error registrando lote de evaluaciones: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error registrando lote de evaluaciones"
+        )
+
+
+@app.post("/api/asistencia/lote", response_model=Dict, tags=["Asistencia"])
+@limiter.limit(f"{config.RATE_LIMIT_LOTE_POR_MINUTO}/minute")
+async def registrar_asistencias_lote(request: Request, lote: AsistenciaLote):
+    """
+    Registrar asistencias en lote (integración de molinetes)
+    Una sola transacción; informa éxito o error por cada registro
+    """
+    try:
+        return await _procesar_lote(
+            AsistenciaLoteItem, lote.registros, gestor_bd.registrar_asistencias_lote
+        )
+    
+    except Exception as e:
+        logger.error(f"Error registrando lote de asistencia: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error registrando lote de asistencia"
+        )
+
+
+@app.post("/api/progreso/lote", response_model=Dict, tags=["Progreso"])
+@limiter.limit(f"{config.RATE_LIMIT_LOTE_POR_MINUTO}/minute")
+async def registrar_progresos_lote(request: Request, lote: ProgresoLote):
+    """
+    Registrar en lote el progreso acumulado offline por la app del alumno
+    Las claves de idempotencia ya vistas se informan como duplicadas sin reinsertar
+    """
+    try:
+        return await _procesar_lote(
+            ProgresoLoteItem, lote.registros, gestor_bd.registrar_progresos_lote
+        )
+    
+    except Exception as e:
+        logger.error(f"Error registrando lote de progreso: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error registrando lote de progreso"
+        )
+
+
+@app.post("/api/usuarios/{usuario_id}/progreso", response_model=RespuestaBase, tags=["Progreso"], status_code=status.HTTP_201_CREATED)
+@limiter.limit("60/minute")
+async def registrar_progreso(request: Request, usuario_id: int, datos: Dict[str, Any]):
+    """
+    Registrar progreso de entrenamiento de un alumno
+    La Idempotency-Key se guarda como clave del registro, así un envío que
+    luego se reintenta desde la cola offline no se duplica
+    """
+    try:
+        progreso_id = await ejecutar_bd(
+            gestor_bd.registrar_progreso, usuario_id, datos,
+            clave_idempotencia=request.headers.get("Idempotency-Key")
+        )
+        
+        return RespuestaBase(
+            mensaje="Progreso registrado exitosamente",
+            datos={"progreso_id": progreso_id}
+        )
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error registrando progreso: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error registrando progreso"
+        )
+
+
+@app.get("/api/usuarios/{usuario_id}/progreso", response_model=Dict, tags=["Progreso"])
+@limiter.limit("30/minute")
+@cachear_respuesta('registros_progreso')
+async def obtener_progreso(
+    request: Request,
+    usuario_id: int,
+    limite: int = Query(100, ge=1, le=1000)
+):
+    """Obtener los registros de progreso más recientes de un alumno"""
+    try:
+        progreso = await ejecutar_bd(gestor_bd.obtener_progreso, usuario_id, limite)
+        return {"exito": True, "cantidad": len(progreso), "progreso": progreso}
+    
+    except Exception as e:
+        logger.error(f"Error obteniendo progreso: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error obteniendo progreso"
+        )
+
+
+# Debe declararse después de /api/asistencia/lote para que "lote" no se
+# interprete como alumno_id
 @app.post("/api/asistencia/{alumno_id}", response_model=RespuestaBase, tags=["Asistencia"])
 @limiter.limit("60/minute")
 async def registrar_asistencia(request: Request, alumno_id: int, tipo_sesion: str = "general"):
     """Registrar asistencia de alumno al gimnasio"""
     try:
-        asistencia_id = gestor_bd.registrar_asistencia(
+        asistencia_id = await ejecutar_bd(
+            gestor_bd.registrar_asistencia,
             alumno_id=alumno_id,
             tipo_sesion=tipo_sesion
         )
@@ -514,14 +1232,21 @@ async def registrar_asistencia(request: Request, alumno_id: int, tipo_sesion: st
 
 @app.get("/api/estadisticas", response_model=Dict, tags=["Estadísticas"])
 @limiter.limit("20/minute")
+@cachear_respuesta('estadisticas_mensuales', 'contadores_gimnasio')
 async def obtener_estadisticas(request: Request):
-    """Obtener estadísticas generales del gimnasio"""
+    """
+    Obtener estadísticas generales del gimnasio
+    La respuesta se sirve desde la caché: timestamp y calculado_en indican
+    cuándo se calcularon los valores, no el momento de la petición
+    """
     try:
-        stats = gestor_bd.obtener_estadisticas()
+        stats = await ejecutar_bd(gestor_bd.obtener_estadisticas)
+        calculado_en = datetime.now().isoformat()
         
         return {
             "exito": True,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": calculado_en,
+            "calculado_en": calculado_en,
             "estadisticas": stats
         }
     
@@ -533,6 +1258,107 @@ async def obtener_estadisticas(request: Request):
         )
 
 
+# ============================================================================
+# EXPORTACIÓN MASIVA (STREAMING)
+# ============================================================================
+
+async def _leer_exportacion(recurso: str, desde: Optional[str],
+                            hasta: Optional[str]) -> AsyncIterator[List[Dict]]:
+    """
+    Lotes de filas de una exportación, leídos con ejecutar_bd
+    
+    Cada consulta pasa por el pool de threads de BD acotado (y su métrica),
+    igual que el resto de la API, en lugar del threadpool de Starlette.
+    """
+    posicion = None
+    while True:
+        filas, posicion = await ejecutar_bd(
+            gestor_bd.leer_lote_exportacion, recurso, desde, hasta, posicion
+        )
+        if filas:
+            yield filas
+        if posicion is None:
+            return
+
+
+async def _generar_ndjson(lotes: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    """Serializar filas como JSON delimitado por saltos de línea, un bloque por lote"""
+    if orjson is not None:
+        serializar = orjson.dumps
+    else:
+        def serializar(fila: Dict) -> bytes:
+            return json.dumps(fila, ensure_ascii=False).encode('utf-8')
+    
+    async for filas in lotes:
+        yield b"\n".join(serializar(fila) for fila in filas) + b"\n"
+
+
+async def _generar_csv(lotes: AsyncIterator[List[Dict]], columnas: List[str]) -> AsyncIterator[bytes]:
+    """Serializar filas como CSV, un bloque por lote"""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=columnas)
+    escritor.writeheader()
+    
+    async for filas in lotes:
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    # Solo la cabecera si la exportación no tenía filas
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+@app.get("/api/exportar/{recurso}", tags=["Exportación"])
+@limiter.limit("5/minute")
+async def exportar_recurso(
+    request: Request,
+    recurso: str,
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    desde: Optional[str] = Query(None, description="Fecha inicial ISO (inclusiva)"),
+    hasta: Optional[str] = Query(None, description="Fecha final ISO (inclusiva)")
+):
+    """
+    Exportar usuarios, pagos o asistencia como NDJSON o CSV en streaming
+    Las filas se leen por lotes, sin cargar el resultado completo en memoria
+    """
+    if recurso not in RECURSOS_EXPORTABLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Recurso no exportable. Opciones: {', '.join(RECURSOS_EXPORTABLES)}"
+        )
+    
+    try:
+        for valor in (desde, hasta):
+            if valor:
+                date.fromisoformat(valor[:10])
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Las fechas deben tener formato ISO (AAAA-MM-DD)"
+        )
+    
+    lotes = _leer_exportacion(recurso, desde, hasta[:10] if hasta else None)
+    
+    if formato == "csv":
+        contenido = _generar_csv(lotes, RECURSOS_EXPORTABLES[recurso][1])
+        media_type = "text/csv; charset=utf-8"
+    else:
+        contenido = _generar_ndjson(lotes)
+        media_type = "application/x-ndjson"
+    
+    logger.info(f"Exportación iniciada: {recurso} ({formato}) desde={desde} hasta={hasta}")
+    
+    return StreamingResponse(
+        contenido,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{recurso}.{formato}"'
+        }
+    )
+
+
 # ============================================================================
 # INICIALIZACIÓN
 # ============================================================================
@@ -548,6 +1374,12 @@ async def startup_event():
     config.validar_configuracion()
     config.mostrar_configuracion()
     
+    # Pools de BD y hash listos antes de la primera petición
+    await iniciar_ejecutores()
+    
+    # Checkpoint del WAL y PRAGMA optimize periódicos
+    gestor_bd.pool.iniciar_mantenimiento(config.DB_MANTENIMIENTO_INTERVALO_SEGUNDOS)
+    
     logger.info("✅ Servidor iniciado correctamente")
     logger.info(f"📚 Documentación disponible en: http://{config.SERVER_HOST}:{config.SERVER_PORT}/docs")
 
@@ -556,15 +1388,8 @@ async def startup_event():
 async def shutdown_event():
     """Evento de cierre de la aplicación"""
     logger.info("Cerrando servidor API...")
+    cerrar_ejecutores()
+    cerrar_pools()
+    # Escribir los logs encolados antes de que el proceso termine
+    detener_logging()
 
-
-if __name__ == "__main__":
-    import uvicorn
-    
-    uvicorn.run(
-        "madre_server:app",
-        host=config.SERVER_HOST,
-        port=config.SERVER_PORT,
-        reload=config.DEBUG,
-        log_level=config.LOG_LEVEL.lower()
-    )
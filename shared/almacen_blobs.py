@@ -0,0 +1,121 @@
+"""
+Almacén de Blobs Direccionado por Contenido
+Guarda archivos binarios en disco identificados por su hash SHA-256, de
+modo que el mismo contenido se almacena una sola vez
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import logging
+from pathlib import Path
+from typing import BinaryIO, Union
+
+logger = logging.getLogger(__name__)
+
+# Las claves son hashes SHA-256 en hexadecimal (evita rutas arbitrarias)
+_PATRON_CLAVE = re.compile(r'^[0-9a-f]{64}$')
+_TAMANO_BLOQUE = 1024 * 1024
+
+
+class AlmacenBlobs:
+    """
+    Almacén en disco con deduplicación por SHA-256
+    
+    Estructura: <directorio>/<ab>/<cd>/<hash completo>
+    Las escrituras son atómicas (archivo temporal + rename).
+    """
+    
+    def __init__(self, directorio: str):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+    
+    def ruta(self, clave: str) -> Path:
+        """Obtener la ruta en disco de un blob"""
+        if not _PATRON_CLAVE.match(clave):
+            raise ValueError(f"Clave de blob inválida: {clave!r}")
+        return self.directorio / clave[:2] / clave[2:4] / clave
+    
+    def existe(self, clave: str) -> bool:
+        """Verificar si un blob está almacenado"""
+        return self.ruta(clave).exists()
+    
+    def guardar(self, datos: bytes) -> str:
+        """
+        Guardar contenido en memoria
+        
+        Returns:
+            Clave SHA-256 del contenido
+        """
+        clave = hashlib.sha256(datos).hexdigest()
+        destino = self.ruta(clave)
+        if not destino.exists():
+            self._escribir_atomico(destino, lambda f: f.write(datos))
+        return clave
+    
+    def guardar_archivo(self, origen: Union[str, Path]) -> str:
+        """
+        Guardar un archivo copiándolo por bloques (sin cargarlo entero en memoria)
+        
+        Returns:
+            Clave SHA-256 del contenido
+        """
+        hasher = hashlib.sha256()
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as destino_tmp, open(origen, 'rb') as f:
+                for bloque in iter(lambda: f.read(_TAMANO_BLOQUE), b''):
+                    hasher.update(bloque)
+                    destino_tmp.write(bloque)
+            
+            clave = hasher.hexdigest()
+            destino = self.ruta(clave)
+            if destino.exists():
+                os.unlink(temporal)
+            else:
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temporal, destino)
+            return clave
+        except Exception:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+            raise
+    
+    def ruta_derivado(self, clave: str, nombre: str) -> Path:
+        """
+        Ruta de un archivo derivado de un blob (p. ej. una miniatura)
+        
+        Los derivados se guardan junto al original como <hash>.<nombre>
+        """
+        if not re.match(r'^[0-9a-z_.]+$', nombre):
+            raise ValueError(f"Nombre de derivado inválido: {nombre!r}")
+        ruta = self.ruta(clave)
+        return ruta.with_name(f"{ruta.name}.{nombre}")
+    
+    def guardar_derivado(self, clave: str, nombre: str, datos: bytes) -> Path:
+        """Guardar un archivo derivado de un blob existente"""
+        destino = self.ruta_derivado(clave, nombre)
+        self._escribir_atomico(destino, lambda f: f.write(datos))
+        return destino
+    
+    def leer(self, clave: str) -> bytes:
+        """Leer el contenido completo de un blob"""
+        return self.ruta(clave).read_bytes()
+    
+    def abrir(self, clave: str) -> BinaryIO:
+        """Abrir un blob para lectura por streaming"""
+        return open(self.ruta(clave), 'rb')
+    
+    def _escribir_atomico(self, destino: Path, escritor):
+        """Escribir en un temporal del mismo directorio y renombrar"""
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                escritor(f)
+            os.replace(temporal, destino)
+        except Exception:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+            raise
@@ -3,12 +3,133 @@ Sistema de Logging Estructurado con Rotación Automática
 Implementa mejores prácticas de logging profesional
 """
 
+import atexit
+import copy
+import itertools
+import json
 import logging
+import queue
 import sys
+import time
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config.settings import config
+
+
+# Atributos propios de LogRecord; el resto son campos pasados con extra=
+_ATRIBUTOS_REGISTRO = frozenset(
+    logging.LogRecord('', 0, '', 0, '', (), None).__dict__
+) | {'message', 'asctime', 'taskName'}
+
+
+def campos_extra(record: logging.LogRecord) -> Dict:
+    """Campos estructurados que el llamador adjuntó al registro con extra="""
+    return {k: v for k, v in record.__dict__.items() if k not in _ATRIBUTOS_REGISTRO}
+
+
+class CacheMarcaTiempo:
+    """
+    Formateo de marcas de tiempo con resolución de segundo cacheada
+    
+    strftime se llama una vez por segundo en lugar de una vez por registro;
+    la tupla (segundo, texto) se reemplaza entera, así que leerla desde
+    varios threads no necesita lock.
+    """
+    
+    def __init__(self, formato: str = '%Y-%m-%d %H:%M:%S'):
+        self.formato = formato
+        self._ultimo: Tuple[int, str] = (-1, '')
+    
+    def __call__(self, created: float) -> str:
+        segundo = int(created)
+        ultimo_segundo, texto = self._ultimo
+        if segundo != ultimo_segundo:
+            texto = time.strftime(self.formato, time.localtime(segundo))
+            self._ultimo = (segundo, texto)
+        return texto
+
+
+class FormateadorTexto(logging.Formatter):
+    """Formatter estándar con la marca de tiempo cacheada por segundo"""
+    
+    def __init__(self, fmt: Optional[str] = None, datefmt: str = '%Y-%m-%d %H:%M:%S'):
+        super().__init__(fmt, datefmt)
+        self._marca_tiempo = CacheMarcaTiempo(datefmt)
+    
+    def formatTime(self, record, datefmt=None):
+        return self._marca_tiempo(record.created)
+
+
+class FormateadorJSON(logging.Formatter):
+    """
+    Un objeto JSON por línea, apto para consultar los logs con jq o
+    ingerirlos en un agregador
+    
+    Campos fijos: ts, nivel, logger, mensaje, modulo, funcion, linea; se
+    añaden excepcion si la hay y los campos pasados con extra=.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._marca_tiempo = CacheMarcaTiempo('%Y-%m-%dT%H:%M:%S')
+        self._zona = CacheMarcaTiempo('%z')
+    
+    def format(self, record):
+        datos = {
+            'ts': f"{self._marca_tiempo(record.created)}.{int(record.msecs):03d}{self._zona(record.created)}",
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'modulo': record.module,
+            'funcion': record.funcName,
+            'linea': record.lineno
+        }
+        datos.update(campos_extra(record))
+        
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos['excepcion'] = record.exc_text
+        
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Muestreo de registros de alto volumen
+    
+    Deja pasar 1 de cada `tasa` registros marcados con extra={'muestreo':
+    clave}, contando por separado cada clave. Los registros sin marca y los
+    de nivel WARNING o superior pasan siempre. En los que pasan, el campo
+    muestreo pasa a valer la tasa, para poder extrapolar los conteos.
+    
+    Se cuelga del logger (logger.addFilter), así que lo descartado no llega
+    a formatearse ni a encolarse.
+    """
+    
+    def __init__(self, tasa: int):
+        super().__init__()
+        self.tasa = tasa
+        self._contadores: Dict[str, Iterator[int]] = {}
+    
+    def filter(self, record):
+        clave = getattr(record, 'muestreo', None)
+        if clave is None or record.levelno >= logging.WARNING:
+            return True
+        if self.tasa <= 1:
+            record.muestreo = 1
+            return True
+        
+        contador = self._contadores.get(clave)
+        if contador is None:
+            contador = self._contadores.setdefault(clave, itertools.count())
+        # next() sobre itertools.count es atómico bajo el GIL
+        if next(contador) % self.tasa:
+            return False
+        record.muestreo = self.tasa
+        return True
 
 
 class FormateadorPersonalizado(logging.Formatter):
@@ -24,6 +145,8 @@ class FormateadorPersonalizado(logging.Formatter):
         'RESET': '\033[0m'       # Reset
     }
     
+    _marca_tiempo = CacheMarcaTiempo()
+    
     def format(self, record):
         """Formatear registro de log con estructura clara"""
         # Obtener color según nivel
@@ -31,34 +154,137 @@ class FormateadorPersonalizado(logging.Formatter):
         reset = self.COLORES['RESET']
         
         # Formato: [TIMESTAMP] [NIVEL] [MODULO:FUNCION] Mensaje
-        timestamp = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = self._marca_tiempo(record.created)
         nivel = f"{color}{record.levelname:8s}{reset}"
         ubicacion = f"{record.filename}:{record.funcName}"
         
         # Construir mensaje formateado
         mensaje_base = f"[{timestamp}] [{nivel}] [{ubicacion}] {record.getMessage()}"
         
+        # Agregar campos estructurados (extra=) como clave=valor
+        extra = campos_extra(record)
+        if extra:
+            mensaje_base += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        
         # Agregar información de excepción si existe
-        if record.exc_info:
-            mensaje_base += f"\n{self.formatException(record.exc_info)}"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            mensaje_base += f"\n{record.exc_text}"
         
         return mensaje_base
 
 
+class ManejadorColaAcotada(QueueHandler):
+    """
+    QueueHandler con cola acotada y política de desborde
+    
+    El thread que loggea solo encola el registro; la escritura a disco y
+    consola ocurre en el thread del QueueListener. Con la cola llena:
+    
+    - 'descartar': DEBUG/INFO se descartan (se informa cuántos al volver a
+      haber espacio); WARNING o superior esperan como en 'bloquear'.
+    - 'bloquear': el llamador espera hasta bloqueo_max_segundos y, si la
+      cola sigue llena, descarta el registro.
+    """
+    
+    def __init__(self, cola: queue.Queue, politica: str = 'descartar',
+                 bloqueo_max_segundos: float = 1.0):
+        super().__init__(cola)
+        self.politica = politica
+        self.bloqueo_max_segundos = bloqueo_max_segundos
+        self.descartados = 0
+        self._descartados_sin_informar = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Resolver lo que no puede esperar al otro thread (argumentos del
+        mensaje y traza de la excepción) sin formatear el registro completo;
+        así cada handler de destino aplica su propio formato y la excepción
+        llega como campo aparte.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _formateador_excepciones.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.politica == 'bloquear' or record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.bloqueo_max_segundos)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+            self._descartados_sin_informar += 1
+            return
+        
+        if self._descartados_sin_informar:
+            aviso = logging.LogRecord(
+                record.name, logging.WARNING, __file__, 0,
+                f"Cola de logging llena: {self._descartados_sin_informar} registros descartados",
+                None, None
+            )
+            try:
+                self.queue.put_nowait(aviso)
+                self._descartados_sin_informar = 0
+            except queue.Full:
+                pass
+
+
+_formateador_excepciones = logging.Formatter()
+
+# Pipelines asíncronos activos: (logger, manejador de cola, listener, handlers directos)
+_pipelines: List[Tuple[logging.Logger, QueueHandler, QueueListener, List[logging.Handler]]] = []
+
+
+def detener_logging():
+    """
+    Vaciar las colas de logging y volver a escritura directa
+    
+    QueueListener.stop() procesa los registros pendientes antes de
+    terminar; los handlers de destino se vuelven a colgar del logger para
+    que lo que se loggee después del cierre no se pierda.
+    """
+    while _pipelines:
+        logger, manejador, listener, handlers = _pipelines.pop()
+        logger.removeHandler(manejador)
+        listener.stop()
+        for handler in handlers:
+            logger.addHandler(handler)
+
+
+atexit.register(detener_logging)
+
+
 def configurar_logging(nombre_app: str = 'gym_app', 
                        nivel: str = 'INFO',
                        archivo_log: str = 'logs/app.log',
                        max_bytes: int = 10 * 1024 * 1024,  # 10MB
-                       backup_count: int = 5) -> logging.Logger:
+                       backup_count: int = 5,
+                       asincrono: Optional[bool] = None,
+                       formato_archivo: Optional[str] = None) -> logging.Logger:
     """
     Configurar sistema de logging con rotación automática
     
+    Con asincrono (por defecto config.LOG_ASINCRONO) los handlers de archivo
+    y consola se atienden desde un QueueListener en segundo plano, con una
+    cola de config.LOG_COLA_MAX registros y la política config.LOG_POLITICA_COLA.
+    
+    El archivo se escribe en JSON por línea (FormateadorJSON) o en texto,
+    según formato_archivo (por defecto config.LOG_FORMATO_ARCHIVO).
+    
     Args:
         nombre_app: Nombre de la aplicación para el logger
         nivel: Nivel de logging (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         archivo_log: Ruta al archivo de log
         max_bytes: Tamaño máximo del archivo antes de rotar (bytes)
         backup_count: Número de archivos de respaldo a mantener
+        asincrono: Escribir los logs desde un thread aparte (None = config)
+        formato_archivo: 'json' o 'texto' (None = config)
     
     Returns:
         Logger configurado
@@ -83,21 +309,30 @@ def configurar_logging(nombre_app: str = 'gym_app',
     )
     file_handler.setLevel(logging.DEBUG)
     
-    # Formato para archivo (más detallado, sin colores)
-    formato_archivo = logging.Formatter(
-        '[%(asctime)s] [%(levelname)-8s] [%(name)s:%(funcName)s:%(lineno)d] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(formato_archivo)
+    # Formato para archivo (estructurado o texto detallado, sin colores)
+    if (formato_archivo or config.LOG_FORMATO_ARCHIVO).lower() == 'json':
+        file_handler.setFormatter(FormateadorJSON())
+    else:
+        file_handler.setFormatter(FormateadorTexto(
+            '[%(asctime)s] [%(levelname)-8s] [%(name)s:%(funcName)s:%(lineno)d] %(message)s'
+        ))
     
     # Handler para consola con colores
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(getattr(logging, nivel.upper()))
     console_handler.setFormatter(FormateadorPersonalizado())
     
-    # Agregar handlers al logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Agregar handlers al logger (directamente o detrás de una cola)
+    if config.LOG_ASINCRONO if asincrono is None else asincrono:
+        cola: queue.Queue = queue.Queue(maxsize=config.LOG_COLA_MAX)
+        manejador = ManejadorColaAcotada(cola, config.LOG_POLITICA_COLA)
+        listener = QueueListener(cola, file_handler, console_handler, respect_handler_level=True)
+        listener.start()
+        logger.addHandler(manejador)
+        _pipelines.append((logger, manejador, listener, [file_handler, console_handler]))
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
     
     # Log inicial
     logger.info(f"Sistema de logging inicializado - Nivel: {nivel}")
@@ -127,6 +362,9 @@ def log_con_contexto(logger: logging.Logger, nivel: str, mensaje: str,
     """
     Loggear con contexto adicional de usuario y datos
     
+    El contexto viaja como campos del registro (usuario_id, contexto), no
+    concatenado al mensaje, para poder filtrar por ellos en los logs JSON.
+    
     Args:
         logger: Logger a usar
         nivel: Nivel de log (debug, info, warning, error, critical)
@@ -134,20 +372,16 @@ def log_con_contexto(logger: logging.Logger, nivel: str, mensaje: str,
         usuario_id: ID de usuario asociado (opcional)
         contexto: Diccionario con contexto adicional (opcional)
     """
-    # Construir mensaje con contexto
-    partes_mensaje = [mensaje]
-    
-    if usuario_id:
-        partes_mensaje.append(f"[Usuario: {usuario_id}]")
-    
+    # Contexto como campos estructurados (anidado para no chocar con los
+    # atributos propios de LogRecord)
+    extra = {}
+    if usuario_id is not None:
+        extra['usuario_id'] = usuario_id
     if contexto:
-        contexto_str = " ".join([f"{k}={v}" for k, v in contexto.items()])
-        partes_mensaje.append(f"[{contexto_str}]")
-    
-    mensaje_completo = " ".join(partes_mensaje)
+        extra['contexto'] = contexto
     
     # Loggear según nivel
-    getattr(logger, nivel.lower())(mensaje_completo)
+    getattr(logger, nivel.lower())(mensaje, extra=extra, stacklevel=2)
 
 
 # Logger por defecto para la aplicación
@@ -0,0 +1,187 @@
+"""
+Métricas de Rendimiento en Formato Prometheus
+Contadores, medidores e histogramas con etiquetas, expuestos en el formato
+de texto que consume Prometheus (GET /metrics)
+"""
+
+import bisect
+import threading
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites por defecto de los histogramas de latencia (segundos)
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class FragmentosPorThread:
+    """
+    Valores repartidos en un fragmento por thread
+
+    Cada thread escribe solo en su propio dict, así que registrar una
+    observación no toma ningún lock; la lectura (poco frecuente) suma los
+    fragmentos de todos los threads. Los fragmentos de threads terminados
+    se conservan para no perder lo ya contado.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._todos: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def propio(self) -> Dict:
+        """Fragmento del thread actual (se crea en su primer uso)"""
+        try:
+            return self._local.valores
+        except AttributeError:
+            valores: Dict = {}
+            with self._lock:
+                self._todos.append(valores)
+            self._local.valores = valores
+            return valores
+
+    def todos(self) -> List[Dict]:
+        with self._lock:
+            return list(self._todos)
+
+
+def _formatear_etiquetas(nombres: Sequence[str], valores: Tuple, extra: str = '') -> str:
+    pares = [f'{n}="{_escapar(str(v))}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear_numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._fragmentos = FragmentosPorThread()
+
+    def _cabecera(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Valor que solo crece (peticiones, rechazos, errores)"""
+
+    tipo = 'counter'
+
+    def inc(self, *valores_etiquetas, cantidad: float = 1):
+        fragmento = self._fragmentos.propio()
+        fragmento[valores_etiquetas] = fragmento.get(valores_etiquetas, 0) + cantidad
+
+    def valores(self) -> Dict[Tuple, float]:
+        total: Dict[Tuple, float] = {}
+        for fragmento in self._fragmentos.todos():
+            for clave, valor in list(fragmento.items()):
+                total[clave] = total.get(clave, 0) + valor
+        return total
+
+    def exponer(self) -> List[str]:
+        lineas = self._cabecera()
+        for clave, valor in sorted(self.valores().items()):
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Medidor(Contador):
+    """Valor que sube y baja (peticiones en curso)"""
+
+    tipo = 'gauge'
+
+    def dec(self, *valores_etiquetas, cantidad: float = 1):
+        self.inc(*valores_etiquetas, cantidad=-cantidad)
+
+
+class Histograma(_Metrica):
+    """Distribución de observaciones (latencias) en buckets acumulativos"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 limites: Sequence[float] = LIMITES_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor: float, *valores_etiquetas):
+        fragmento = self._fragmentos.propio()
+        serie = fragmento.get(valores_etiquetas)
+        if serie is None:
+            # [conteo por bucket..., conteo en +Inf, suma]
+            serie = fragmento[valores_etiquetas] = [0] * (len(self.limites) + 1) + [0.0]
+        serie[bisect.bisect_left(self.limites, valor)] += 1
+        serie[-1] += valor
+
+    def exponer(self) -> List[str]:
+        total: Dict[Tuple, List] = {}
+        for fragmento in self._fragmentos.todos():
+            for clave, serie in list(fragmento.items()):
+                acumulada = total.setdefault(clave, [0] * len(serie))
+                for i, valor in enumerate(list(serie)):
+                    acumulada[i] += valor
+
+        lineas = self._cabecera()
+        for clave, serie in sorted(total.items()):
+            conteo = 0
+            for limite, en_bucket in zip(self.limites + (float('inf'),), serie):
+                conteo += en_bucket
+                le = f'le="{_formatear_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, clave, le)} {conteo}")
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {conteo}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas de un proceso, expuestas juntas"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                   limites: Sequence[float] = LIMITES_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def exponer(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas: List[str] = []
+        for metrica in metricas:
+            lineas.extend(metrica.exponer())
+        return '\n'.join(lineas) + '\n'
+
+
+# Registro global del proceso
+metricas = RegistroMetricas()
@@ -0,0 +1,150 @@
+"""
+Miniaturas de Fotos de Progreso
+Genera tamaños fijos de cada foto en segundo plano y los sirve desde una
+caché LRU acotada por memoria, para que la interfaz nunca decodifique
+los originales
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from shared.almacen_blobs import AlmacenBlobs
+
+logger = logging.getLogger(__name__)
+
+# Tamaños máximos (ancho, alto) de cada variante
+TAMANOS: Dict[str, Tuple[int, int]] = {
+    'tarjeta': (160, 160),
+    'visor': (550, 550),
+}
+CALIDAD_JPEG = 85
+
+
+class CacheMiniaturas:
+    """
+    Caché LRU de imágenes decodificadas con presupuesto en bytes
+    
+    El costo de cada entrada es el tamaño de sus píxeles en memoria
+    (ancho x alto x bandas).
+    """
+    
+    def __init__(self, presupuesto_bytes: int):
+        self.presupuesto_bytes = presupuesto_bytes
+        self._entradas: "OrderedDict[Tuple[str, str], Tuple[object, int]]" = OrderedDict()
+        self._usados = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _costo(imagen) -> int:
+        return imagen.width * imagen.height * len(imagen.getbands())
+    
+    def obtener(self, clave: Tuple[str, str]):
+        """Obtener una imagen y marcarla como usada recientemente"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[0]
+    
+    def guardar(self, clave: Tuple[str, str], imagen):
+        """Guardar una imagen expulsando las menos usadas si hace falta"""
+        costo = self._costo(imagen)
+        if costo > self.presupuesto_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._usados -= anterior[1]
+            self._entradas[clave] = (imagen, costo)
+            self._usados += costo
+            while self._usados > self.presupuesto_bytes:
+                _, (_, costo_expulsado) = self._entradas.popitem(last=False)
+                self._usados -= costo_expulsado
+    
+    def estadisticas(self) -> Dict:
+        """Obtener ocupación actual de la caché"""
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes_usados': self._usados,
+                'presupuesto_bytes': self.presupuesto_bytes
+            }
+
+
+class ServicioMiniaturas:
+    """
+    Genera, persiste y sirve miniaturas de imágenes del almacén de blobs
+    
+    Las miniaturas se guardan como derivados del blob original
+    (<hash>.<tamaño>.jpg). Todos los métodos hacen I/O y decodificación,
+    así que deben llamarse fuera del hilo de la interfaz.
+    """
+    
+    def __init__(self, almacen: AlmacenBlobs, presupuesto_cache_bytes: int):
+        self.almacen = almacen
+        self.cache = CacheMiniaturas(presupuesto_cache_bytes)
+    
+    @staticmethod
+    def _nombre_derivado(tamano: str) -> str:
+        return f"{tamano}.jpg"
+    
+    def generar(self, imagen_ref: str):
+        """
+        Generar todas las variantes de una imagen que aún no existan
+        
+        Decodifica el original una sola vez y reduce a cada tamaño.
+        """
+        from PIL import Image
+        
+        pendientes = [
+            tamano for tamano in TAMANOS
+            if not self.almacen.ruta_derivado(imagen_ref, self._nombre_derivado(tamano)).exists()
+        ]
+        if not pendientes:
+            return
+        
+        with self.almacen.abrir(imagen_ref) as f:
+            original = Image.open(f)
+            # draft() permite a JPEG decodificar directamente a menor escala
+            original.draft('RGB', max(TAMANOS[t] for t in pendientes))
+            original = original.convert('RGB')
+        
+        # De mayor a menor: cada variante se reduce a partir de la anterior
+        for tamano in sorted(pendientes, key=lambda t: TAMANOS[t], reverse=True):
+            original.thumbnail(TAMANOS[tamano], Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            original.save(buffer, format='JPEG', quality=CALIDAD_JPEG, optimize=True)
+            self.almacen.guardar_derivado(
+                imagen_ref, self._nombre_derivado(tamano), buffer.getvalue()
+            )
+        logger.debug(f"Miniaturas generadas para {imagen_ref[:12]}: {pendientes}")
+    
+    def obtener(self, imagen_ref: str, tamano: str):
+        """
+        Obtener una miniatura decodificada (PIL.Image)
+        
+        Busca primero en la caché, luego en disco y, si la variante no
+        existe todavía (p. ej. fotos migradas), la genera en el momento.
+        """
+        from PIL import Image
+        
+        if tamano not in TAMANOS:
+            raise ValueError(f"Tamaño de miniatura desconocido: {tamano}")
+        
+        clave = (imagen_ref, tamano)
+        imagen = self.cache.obtener(clave)
+        if imagen is not None:
+            return imagen
+        
+        ruta = self.almacen.ruta_derivado(imagen_ref, self._nombre_derivado(tamano))
+        if not ruta.exists():
+            self.generar(imagen_ref)
+        
+        with Image.open(ruta) as archivo:
+            imagen = archivo.copy()
+        self.cache.guardar(clave, imagen)
+        return imagen
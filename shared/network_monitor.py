@@ -1 +1,151 @@
+"""
+Monitor de Conectividad con el Servidor
+Mantiene en segundo plano el estado de la conexión para que consultarlo
+desde cualquier punto (interfaz, cola offline) no haga requests
+"""
 
+import random
+import threading
+import time
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorRed:
+    """
+    Sondeo de conectividad en un thread propio con estado cacheado
+
+    - Conectado: sondea cada intervalo_conectado segundos, salvo que el
+      tráfico real (reportar) haya confirmado la conexión hace menos.
+    - Sin conexión: reintenta con backoff exponencial y jitter entre
+      espera_minima y espera_maxima, para no sincronizar a todos los
+      clientes cuando el servidor vuelve.
+
+    Los suscriptores reciben el nuevo estado (bool) solo en las
+    transiciones, desde el thread que detectó el cambio.
+    """
+
+    def __init__(self, sondear: Callable[[], bool],
+                 intervalo_conectado: float = 30.0,
+                 espera_minima: float = 1.0,
+                 espera_maxima: float = 60.0):
+        """
+        Args:
+            sondear: Función bloqueante que devuelve True si el servidor responde
+            intervalo_conectado: Segundos entre sondeos mientras hay conexión
+            espera_minima: Primera espera del backoff sin conexión
+            espera_maxima: Tope de la espera del backoff
+        """
+        self._sondear = sondear
+        self.intervalo_conectado = intervalo_conectado
+        self.espera_minima = espera_minima
+        self.espera_maxima = espera_maxima
+
+        self.conectado = False
+        self.ultima_verificacion: Optional[float] = None
+        self.fallos_consecutivos = 0
+
+        self._lock = threading.Lock()
+        self._suscriptores: List[Callable[[bool], None]] = []
+        self._despertar = threading.Event()
+        self._forzar_sondeo = False
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        """Lanzar el thread de sondeo (el primer sondeo es inmediato)"""
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="monitor-red", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detener el thread de sondeo"""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+    def suscribir(self, callback: Callable[[bool], None]):
+        """Registrar una función a invocar con el nuevo estado en cada transición"""
+        with self._lock:
+            self._suscriptores.append(callback)
+
+    def desuscribir(self, callback: Callable[[bool], None]):
+        """Dejar de notificar a una función suscrita"""
+        with self._lock:
+            if callback in self._suscriptores:
+                self._suscriptores.remove(callback)
+
+    def solicitar_verificacion(self):
+        """Adelantar el próximo sondeo sin esperar a que venza el intervalo"""
+        self._forzar_sondeo = True
+        self._despertar.set()
+
+    def reportar(self, conectado: bool):
+        """
+        Registrar el resultado de un contacto con el servidor
+
+        Lo usan tanto el sondeo como las requests normales, que así sirven
+        de sondeo gratuito.
+        """
+        with self._lock:
+            cambio = conectado != self.conectado
+            self.conectado = conectado
+            if conectado:
+                self.fallos_consecutivos = 0
+                self.ultima_verificacion = time.monotonic()
+            else:
+                self.fallos_consecutivos += 1
+            suscriptores = list(self._suscriptores) if cambio else []
+
+        if cambio:
+            logger.info("Conectividad recuperada" if conectado else "Conectividad perdida")
+            if not conectado:
+                # Empezar el backoff desde la espera mínima
+                self._despertar.set()
+        for callback in suscriptores:
+            try:
+                callback(conectado)
+            except Exception as e:
+                logger.error(f"Error notificando cambio de conectividad: {e}", exc_info=True)
+
+    def _espera_sin_conexion(self) -> float:
+        """Backoff exponencial con jitter ("equal jitter") según los fallos seguidos"""
+        exponente = min(max(self.fallos_consecutivos - 1, 0), 16)
+        tope = min(self.espera_maxima, self.espera_minima * 2 ** exponente)
+        return tope / 2 + random.uniform(0, tope / 2)
+
+    def _proxima_espera(self) -> float:
+        if not self.conectado:
+            return self._espera_sin_conexion()
+        # El tráfico real reciente cuenta como verificación
+        transcurrido = time.monotonic() - (self.ultima_verificacion or 0)
+        return max(self.intervalo_conectado - transcurrido, 0.0)
+
+    def _bucle(self):
+        espera = 0.0
+        while not self._detener.is_set():
+            if espera > 0:
+                self._despertar.wait(espera)
+                self._despertar.clear()
+                if self._detener.is_set():
+                    break
+
+            # Un reporte de tráfico real puede haber hecho innecesario el sondeo
+            if self._forzar_sondeo or not self.conectado or self._proxima_espera() <= 0:
+                self._forzar_sondeo = False
+                try:
+                    resultado = bool(self._sondear())
+                except Exception as e:
+                    logger.debug(f"Sondeo de conectividad fallido: {e}")
+                    resultado = False
+                self.reportar(resultado)
+                # El cambio a desconectado no debe saltarse la primera espera
+                self._despertar.clear()
+
+            espera = self._proxima_espera()
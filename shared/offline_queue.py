@@ -1 +1,288 @@
+"""
+Almacén Local SQLite para la Aplicación Hija
+Cola de operaciones offline y caché de datos del servidor en una base
+embebida (WAL), en lugar de reescribir archivos JSON completos
+"""
 
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AlmacenOffline:
+    """
+    Base SQLite local del cliente
+
+    - operaciones_offline: cola append-only; encolar es un INSERT y
+      completar un DELETE por clave primaria, sin importar su tamaño.
+    - cache_rutinas: una fila por asignación, indexada por usuario, para
+      aplicar la sincronización incremental fila a fila.
+    - cache_sync: versión y ETag sincronizados por usuario y recurso.
+
+    Usa una única conexión protegida por un lock: el cliente tiene pocos
+    threads y las operaciones son breves.
+    """
+
+    def __init__(self, db_path: str = 'data/hija_offline.db'):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("PRAGMA busy_timeout = 5000")
+        self._crear_tablas()
+
+    def _crear_tablas(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS operaciones_offline (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo TEXT NOT NULL,
+                    datos_json TEXT NOT NULL,
+                    creada TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    disponible_desde REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_operaciones_disponibles
+                ON operaciones_offline(disponible_desde, id)
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_rutinas (
+                    usuario_id INTEGER NOT NULL,
+                    asignacion_id INTEGER NOT NULL,
+                    datos_json TEXT NOT NULL,
+                    PRIMARY KEY (usuario_id, asignacion_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_sync (
+                    usuario_id INTEGER NOT NULL,
+                    recurso TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    etag TEXT,
+                    actualizado TEXT NOT NULL,
+                    PRIMARY KEY (usuario_id, recurso)
+                ) WITHOUT ROWID
+            """)
+
+    # ---- Cola de operaciones ----
+
+    def encolar(self, operacion: Dict) -> int:
+        """
+        Agregar operación al final de la cola
+
+        Args:
+            operacion: Diccionario con al menos 'tipo'
+
+        Returns:
+            ID de la operación en la cola
+        """
+        datos = {k: v for k, v in operacion.items() if k not in ('id', 'intentos', 'timestamp')}
+        with self._lock, self._conn:
+            cursor = self._conn.execute("""
+                INSERT INTO operaciones_offline (tipo, datos_json, creada, intentos)
+                VALUES (?, ?, ?, ?)
+            """, (
+                operacion['tipo'],
+                json.dumps(datos),
+                operacion.get('timestamp') or datetime.now().isoformat(),
+                operacion.get('intentos', 0)
+            ))
+            return cursor.lastrowid
+
+    def siguiente_lote(self, limite: int) -> List[Dict]:
+        """Obtener las operaciones más antiguas listas para enviarse"""
+        with self._lock:
+            filas = self._conn.execute("""
+                SELECT id, datos_json, creada, intentos
+                FROM operaciones_offline
+                WHERE disponible_desde <= ?
+                ORDER BY disponible_desde, id
+                LIMIT ?
+            """, (time.time(), limite)).fetchall()
+
+        operaciones = []
+        for fila in filas:
+            operacion = json.loads(fila['datos_json'])
+            operacion.update(id=fila['id'], timestamp=fila['creada'], intentos=fila['intentos'])
+            operaciones.append(operacion)
+        return operaciones
+
+    def siguiente_operacion(self) -> Optional[Dict]:
+        """Obtener la operación más antigua lista para enviarse (o None)"""
+        lote = self.siguiente_lote(1)
+        return lote[0] if lote else None
+
+    def completar(self, operacion_id: int):
+        """Eliminar una operación enviada con éxito"""
+        self.completar_lote([operacion_id])
+
+    def completar_lote(self, operacion_ids: List[int]):
+        """Eliminar varias operaciones enviadas con éxito en una transacción"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM operaciones_offline WHERE id = ?",
+                [(operacion_id,) for operacion_id in operacion_ids]
+            )
+
+    def registrar_fallo(self, operacion_id: int, max_intentos: int = 3,
+                        espera_segundos: float = 5.0) -> int:
+        """
+        Contar un intento fallido; la operación se descarta al llegar al máximo
+
+        Returns:
+            Intentos acumulados (>= max_intentos si se descartó)
+        """
+        with self._lock, self._conn:
+            fila = self._conn.execute(
+                "SELECT intentos FROM operaciones_offline WHERE id = ?", (operacion_id,)
+            ).fetchone()
+            if fila is None:
+                return max_intentos
+
+            intentos = fila['intentos'] + 1
+            if intentos >= max_intentos:
+                self._conn.execute("DELETE FROM operaciones_offline WHERE id = ?", (operacion_id,))
+            else:
+                # Backoff: la operación no vuelve a ofrecerse hasta pasada la espera
+                self._conn.execute("""
+                    UPDATE operaciones_offline
+                    SET intentos = ?, disponible_desde = ?
+                    WHERE id = ?
+                """, (intentos, time.time() + espera_segundos * 2 ** (intentos - 1), operacion_id))
+            return intentos
+
+    def contar_pendientes(self) -> int:
+        """Número de operaciones en cola"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM operaciones_offline").fetchone()[0]
+
+    # ---- Caché de rutinas ----
+
+    def leer_rutinas(self, usuario_id: int) -> Dict:
+        """Obtener rutinas en caché junto con la versión y ETag sincronizados"""
+        with self._lock:
+            filas = self._conn.execute("""
+                SELECT datos_json FROM cache_rutinas
+                WHERE usuario_id = ?
+                ORDER BY asignacion_id
+            """, (usuario_id,)).fetchall()
+            sync = self._conn.execute("""
+                SELECT version, etag FROM cache_sync
+                WHERE usuario_id = ? AND recurso = 'rutinas'
+            """, (usuario_id,)).fetchone()
+
+        return {
+            'rutinas': [json.loads(f['datos_json']) for f in filas],
+            'version': sync['version'] if sync else 0,
+            'etag': sync['etag'] if sync else None
+        }
+
+    def aplicar_cambios_rutinas(self, usuario_id: int, cambios: List[Dict],
+                                completo: bool, version: int,
+                                etag: Optional[str]) -> List[Dict]:
+        """
+        Aplicar a la caché solo las asignaciones cambiadas
+
+        Args:
+            usuario_id: Usuario dueño de la caché
+            cambios: Asignaciones recibidas (las inactivas se eliminan)
+            completo: True si 'cambios' es la lista completa (reemplaza la caché)
+            version: Versión del servidor ya sincronizada
+            etag: ETag de la respuesta
+
+        Returns:
+            Rutinas en caché tras aplicar los cambios
+        """
+        with self._lock, self._conn:
+            if completo:
+                self._conn.execute("DELETE FROM cache_rutinas WHERE usuario_id = ?", (usuario_id,))
+
+            activas = [r for r in cambios if r.get('activa', True)]
+            inactivas = [r for r in cambios if not r.get('activa', True)]
+            self._conn.executemany("""
+                INSERT INTO cache_rutinas (usuario_id, asignacion_id, datos_json)
+                VALUES (?, ?, ?)
+                ON CONFLICT(usuario_id, asignacion_id) DO UPDATE SET datos_json = excluded.datos_json
+            """, [(usuario_id, r['asignacion_id'], json.dumps(r)) for r in activas])
+            self._conn.executemany(
+                "DELETE FROM cache_rutinas WHERE usuario_id = ? AND asignacion_id = ?",
+                [(usuario_id, r['asignacion_id']) for r in inactivas]
+            )
+            self._conn.execute("""
+                INSERT INTO cache_sync (usuario_id, recurso, version, etag, actualizado)
+                VALUES (?, 'rutinas', ?, ?, ?)
+                ON CONFLICT(usuario_id, recurso) DO UPDATE SET
+                    version = excluded.version,
+                    etag = excluded.etag,
+                    actualizado = excluded.actualizado
+            """, (usuario_id, version, etag, datetime.now().isoformat()))
+
+        return self.leer_rutinas(usuario_id)['rutinas']
+
+    # ---- Migración desde JSON ----
+
+    def migrar_desde_json(self, directorio: str = 'data') -> int:
+        """
+        Importar la cola y las cachés de rutinas guardadas en archivos JSON
+
+        Los archivos migrados se renombran a *.migrado para no volver a
+        importarlos.
+
+        Returns:
+            Número de archivos migrados
+        """
+        base = Path(directorio)
+        migrados = 0
+
+        archivo_cola = base / 'operaciones_offline.json'
+        if archivo_cola.exists():
+            try:
+                operaciones = json.loads(archivo_cola.read_text() or '[]')
+                for operacion in operaciones:
+                    # Las operaciones antiguas no tenían clave para el reenvío en lote
+                    operacion.setdefault('clave_idempotencia', str(uuid.uuid4()))
+                    self.encolar(operacion)
+                archivo_cola.rename(archivo_cola.with_name(archivo_cola.name + '.migrado'))
+                migrados += 1
+                logger.info(f"Migradas {len(operaciones)} operaciones offline desde JSON")
+            except Exception as e:
+                logger.error(f"Error migrando cola offline: {e}")
+
+        for archivo in base.glob('cache_rutinas_*.json'):
+            try:
+                usuario_id = int(archivo.stem.rsplit('_', 1)[1])
+                cache = json.loads(archivo.read_text())
+                rutinas = cache.get('rutinas', [])
+                # Cachés antiguas no tienen asignacion_id: se asignan claves
+                # negativas y la versión 0 fuerza una sync completa que las reemplaza
+                for i, rutina in enumerate(rutinas, start=1):
+                    rutina.setdefault('asignacion_id', -i)
+                self.aplicar_cambios_rutinas(
+                    usuario_id, rutinas, completo=True,
+                    version=cache.get('version', 0), etag=cache.get('etag')
+                )
+                archivo.rename(archivo.with_name(archivo.name + '.migrado'))
+                migrados += 1
+            except Exception as e:
+                logger.error(f"Error migrando caché {archivo.name}: {e}")
+
+        return migrados
+
+    def cerrar(self):
+        """Cerrar la conexión local"""
+        with self._lock:
+            self._conn.close()
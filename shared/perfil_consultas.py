@@ -0,0 +1,136 @@
+"""
+Perfil de Consultas SQLite
+Tiempo acumulado por huella de sentencia y registro de consultas lentas
+con su EXPLAIN QUERY PLAN, alimentado por las conexiones del pool
+"""
+
+import re
+import sqlite3
+import time
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from config.settings import config
+from shared.metricas import FragmentosPorThread, metricas
+
+logger = logging.getLogger(__name__)
+
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+# Sentencias para las que EXPLAIN QUERY PLAN tiene sentido
+_EXPLICABLES = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+metrica_lentas = metricas.contador(
+    "gym_bd_consultas_lentas_total", "Sentencias SQL que superaron DB_SLOW_QUERY_MS"
+)
+
+
+@lru_cache(maxsize=1024)
+def huella_sentencia(sql: str) -> str:
+    """
+    Normalizar una sentencia para agrupar sus ejecuciones
+
+    Colapsa espacios, reemplaza literales por ? y las listas IN (?, ?, ...)
+    por IN (...), así consultas que solo difieren en valores comparten huella.
+    """
+    huella = _RE_CADENA.sub('?', sql)
+    huella = _RE_NUMERO.sub('?', huella)
+    huella = _RE_LISTA.sub('(...)', huella)
+    return _RE_ESPACIOS.sub(' ', huella).strip()
+
+
+class PerfilConsultas:
+    """
+    Estadísticas por huella: llamadas, tiempo total y máximo
+
+    Cada thread acumula en su propio fragmento (sin locks en el camino de
+    ejecución); resumen() suma los fragmentos al consultarse.
+    """
+
+    def __init__(self, umbral_lenta_ms: float = 100.0, segundos_entre_planes: float = 60.0):
+        self.umbral_lenta_ms = umbral_lenta_ms
+        self.segundos_entre_planes = segundos_entre_planes
+        self._fragmentos = FragmentosPorThread()
+        self._ultimo_plan: Dict[str, float] = {}
+
+    def registrar(self, conn: sqlite3.Connection, sql: str, parametros: Any, segundos: float):
+        """Acumular una ejecución y registrar la sentencia si fue lenta"""
+        huella = huella_sentencia(sql)
+        fragmento = self._fragmentos.propio()
+        datos = fragmento.get(huella)
+        if datos is None:
+            datos = fragmento[huella] = [0, 0.0, 0.0]
+        datos[0] += 1
+        datos[1] += segundos
+        if segundos > datos[2]:
+            datos[2] = segundos
+
+        if self.umbral_lenta_ms > 0 and segundos * 1000 >= self.umbral_lenta_ms:
+            metrica_lentas.inc()
+            self._registrar_lenta(conn, sql, huella, parametros, segundos)
+
+    def _registrar_lenta(self, conn: sqlite3.Connection, sql: str, huella: str,
+                         parametros: Any, segundos: float):
+        # El plan se calcula como mucho una vez por intervalo y huella
+        ahora = time.monotonic()
+        plan = None
+        if ahora - self._ultimo_plan.get(huella, float('-inf')) >= self.segundos_entre_planes:
+            self._ultimo_plan[huella] = ahora
+            plan = self._plan_consulta(conn, sql, parametros)
+
+        mensaje = f"Consulta lenta ({segundos * 1000:.1f} ms): {huella}"
+        if plan:
+            mensaje += "\n    Plan: " + "\n          ".join(plan)
+        logger.warning(mensaje)
+
+    @staticmethod
+    def _plan_consulta(conn: sqlite3.Connection, sql: str, parametros: Any) -> Optional[List[str]]:
+        """EXPLAIN QUERY PLAN en un cursor aparte (no altera los resultados pendientes)"""
+        if not sql.lstrip().upper().startswith(_EXPLICABLES):
+            return None
+        try:
+            cursor = sqlite3.Cursor(conn)
+            filas = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()
+            cursor.close()
+            return [fila[-1] for fila in filas]
+        except sqlite3.Error as e:
+            logger.debug(f"No se pudo obtener el plan de la consulta: {e}")
+            return None
+
+    def resumen(self, limite: int = 20, orden: str = 'total') -> List[Dict]:
+        """
+        Sentencias más costosas
+
+        Args:
+            limite: Número de sentencias a devolver
+            orden: 'total', 'media', 'max' o 'llamadas'
+        """
+        total: Dict[str, List] = {}
+        for fragmento in self._fragmentos.todos():
+            for huella, (llamadas, suma, maximo) in list(fragmento.items()):
+                acumulado = total.setdefault(huella, [0, 0.0, 0.0])
+                acumulado[0] += llamadas
+                acumulado[1] += suma
+                acumulado[2] = max(acumulado[2], maximo)
+
+        filas = [
+            {
+                'consulta': huella,
+                'llamadas': llamadas,
+                'total_ms': round(suma * 1000, 3),
+                'media_ms': round(suma * 1000 / llamadas, 3),
+                'max_ms': round(maximo * 1000, 3)
+            }
+            for huella, (llamadas, suma, maximo) in total.items()
+        ]
+        clave = {'total': 'total_ms', 'media': 'media_ms', 'max': 'max_ms'}.get(orden, orden)
+        filas.sort(key=lambda f: f[clave], reverse=True)
+        return filas[:limite]
+
+
+# Perfil global del proceso (lo alimentan todas las conexiones del pool)
+perfil_consultas = PerfilConsultas(config.DB_SLOW_QUERY_MS)
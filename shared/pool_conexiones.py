@@ -0,0 +1,346 @@
+"""
+Pool de Conexiones SQLite Compartido
+Mantiene conexiones de larga duración para evitar el costo de abrir/cerrar
+la base de datos en cada operación
+"""
+
+import sqlite3
+import threading
+import queue
+import time
+import logging
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config.settings import config
+from shared.perfil_consultas import perfil_consultas
+
+logger = logging.getLogger(__name__)
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """
+    Cursor que mide cada execute/executemany y lo registra en perfil_consultas
+
+    El tiempo medido es el de preparar y ejecutar la sentencia hasta la
+    primera fila; lo que tarde el código en recorrer los resultados con
+    fetch* no se incluye.
+    """
+
+    def execute(self, sql, parametros=()):
+        if not config.DB_PERFIL_CONSULTAS:
+            return super().execute(sql, parametros)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            perfil_consultas.registrar(self.connection, sql, parametros, time.perf_counter() - inicio)
+
+    def executemany(self, sql, secuencia):
+        if not config.DB_PERFIL_CONSULTAS:
+            return super().executemany(sql, secuencia)
+        if not isinstance(secuencia, (list, tuple)):
+            secuencia = list(secuencia)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, secuencia)
+        finally:
+            perfil_consultas.registrar(
+                self.connection, sql, secuencia[0] if secuencia else (), time.perf_counter() - inicio
+            )
+
+
+class ConexionPool(sqlite3.Connection):
+    """
+    Conexión SQLite que pertenece a un pool
+
+    Llamar a close() devuelve la conexión al pool en lugar de cerrarla,
+    así el código existente que hace conn.close() sigue funcionando.
+    Sus cursores son CursorInstrumentado, incluidos los que crean
+    conn.execute() y conn.executemany().
+    """
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+    def close(self):
+        """Devolver conexión al pool (o cerrarla si no pertenece a ninguno)"""
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            super().close()
+        else:
+            pool.liberar(self)
+
+    def cerrar_definitivamente(self):
+        """Cerrar la conexión real con la base de datos"""
+        super().close()
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones SQLite basado en cola
+
+    Las conexiones se crean bajo demanda hasta el tamaño máximo y se
+    reutilizan entre threads. Cada conexión nueva recibe el perfil de
+    PRAGMAs configurado (WAL, synchronous, caché, mmap...). Antes de
+    entregar una conexión que estuvo inactiva se verifica su salud con
+    un SELECT 1.
+    """
+
+    def __init__(self, db_path: str, tamano: int = 4, timeout: float = 30.0,
+                 segundos_verificacion: float = 30.0,
+                 pragmas: Optional[Dict[str, Any]] = None):
+        self.db_path = db_path
+        self.tamano = max(1, tamano)
+        self.timeout = timeout
+        self.segundos_verificacion = segundos_verificacion
+        self.pragmas = pragmas or {}
+        
+        self._hilo_mantenimiento: Optional[threading.Thread] = None
+        self._detener_mantenimiento = threading.Event()
+
+        self._disponibles: queue.LifoQueue = queue.LifoQueue(maxsize=self.tamano)
+        self._creadas = 0
+        self._lock = threading.Lock()
+        self._cerrado = False
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _crear_conexion(self) -> ConexionPool:
+        """Abrir una nueva conexión física"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            factory=ConexionPool
+        )
+        conn.row_factory = sqlite3.Row
+        self._aplicar_pragmas(conn)
+        conn._pool = self
+        conn._ultimo_uso = time.monotonic()
+        # Si una conexión prestada nunca se devuelve (p. ej. por una excepción
+        # antes de close()), su cupo se recupera cuando el GC la recolecta
+        conn._finalizador = weakref.finalize(conn, self._liberar_cupo)
+        logger.debug(f"Nueva conexión creada para {self.db_path}")
+        return conn
+
+    def _aplicar_pragmas(self, conn: sqlite3.Connection):
+        """Aplicar el perfil de PRAGMAs a una conexión recién creada"""
+        for nombre, valor in self.pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {nombre} = {valor}")
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudo aplicar PRAGMA {nombre}={valor}: {e}")
+
+    def _liberar_cupo(self):
+        """Descontar una conexión del total creado"""
+        with self._lock:
+            self._creadas -= 1
+
+    def _descartar(self, conn: ConexionPool):
+        """Cerrar una conexión rota y liberar su cupo"""
+        try:
+            conn.cerrar_definitivamente()
+        except Exception:
+            pass
+        conn._finalizador()
+
+    def _esta_sana(self, conn: ConexionPool) -> bool:
+        """Verificar que la conexión sigue respondiendo"""
+        if time.monotonic() - conn._ultimo_uso < self.segundos_verificacion:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Conexión del pool no saludable, descartando: {e}")
+            return False
+
+    def adquirir(self, timeout: Optional[float] = None) -> ConexionPool:
+        """
+        Obtener una conexión del pool
+
+        Args:
+            timeout: Segundos máximos de espera si el pool está agotado
+
+        Returns:
+            Conexión lista para usar
+        """
+        if self._cerrado:
+            raise RuntimeError("El pool de conexiones está cerrado")
+
+        espera = self.timeout if timeout is None else timeout
+        limite = time.monotonic() + espera
+
+        while True:
+            try:
+                conn = self._disponibles.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    if self._creadas < self.tamano:
+                        self._creadas += 1
+                        crear = True
+                    else:
+                        crear = False
+                if crear:
+                    try:
+                        return self._crear_conexion()
+                    except Exception:
+                        self._liberar_cupo()
+                        raise
+
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise TimeoutError(
+                        f"No hay conexiones disponibles en el pool ({self.tamano})"
+                    )
+                try:
+                    conn = self._disponibles.get(timeout=restante)
+                except queue.Empty:
+                    continue
+
+            if self._esta_sana(conn):
+                return conn
+            self._descartar(conn)
+
+    def liberar(self, conn: ConexionPool):
+        """Devolver una conexión al pool"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._descartar(conn)
+            return
+
+        if self._cerrado:
+            self._descartar(conn)
+            return
+
+        conn._ultimo_uso = time.monotonic()
+        try:
+            self._disponibles.put_nowait(conn)
+        except queue.Full:
+            self._descartar(conn)
+
+    @contextmanager
+    def conexion(self):
+        """Context manager que adquiere y libera una conexión"""
+        conn = self.adquirir()
+        try:
+            yield conn
+        finally:
+            self.liberar(conn)
+
+    def ejecutar_mantenimiento(self):
+        """Hacer checkpoint del WAL y actualizar estadísticas del planificador"""
+        with self.conexion() as conn:
+            ocupado, paginas_log, paginas_copiadas = conn.execute(
+                "PRAGMA wal_checkpoint(PASSIVE)"
+            ).fetchone()
+            conn.execute("PRAGMA optimize")
+        logger.debug(
+            f"Mantenimiento BD: checkpoint {paginas_copiadas}/{paginas_log} páginas"
+            f"{' (bloqueado por lectores)' if ocupado else ''}"
+        )
+
+    def iniciar_mantenimiento(self, intervalo_segundos: float):
+        """
+        Iniciar tarea periódica de mantenimiento en segundo plano
+        
+        Args:
+            intervalo_segundos: Tiempo entre ejecuciones (0 desactiva la tarea)
+        """
+        if intervalo_segundos <= 0 or self._hilo_mantenimiento is not None:
+            return
+
+        def _bucle():
+            while not self._detener_mantenimiento.wait(intervalo_segundos):
+                try:
+                    self.ejecutar_mantenimiento()
+                except Exception as e:
+                    logger.warning(f"Error en mantenimiento de BD: {e}")
+
+        self._detener_mantenimiento.clear()
+        self._hilo_mantenimiento = threading.Thread(
+            target=_bucle,
+            name="mantenimiento-bd",
+            daemon=True
+        )
+        self._hilo_mantenimiento.start()
+        logger.info(f"Mantenimiento de BD programado cada {intervalo_segundos}s")
+
+    def detener_mantenimiento(self):
+        """Detener la tarea periódica de mantenimiento"""
+        self._detener_mantenimiento.set()
+        if self._hilo_mantenimiento is not None:
+            self._hilo_mantenimiento.join(timeout=5)
+            self._hilo_mantenimiento = None
+
+    def cerrar(self):
+        """Cerrar todas las conexiones inactivas del pool"""
+        self.detener_mantenimiento()
+        self._cerrado = True
+        while True:
+            try:
+                conn = self._disponibles.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+        logger.info(f"Pool de conexiones cerrado: {self.db_path}")
+
+    def estadisticas(self) -> Dict:
+        """Obtener estado actual del pool"""
+        return {
+            'tamano': self.tamano,
+            'creadas': self._creadas,
+            'disponibles': self._disponibles.qsize(),
+            'en_uso': self._creadas - self._disponibles.qsize()
+        }
+
+
+# Registro de pools por ruta de base de datos
+_pools: Dict[str, PoolConexiones] = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(db_path: str, tamano: Optional[int] = None) -> PoolConexiones:
+    """
+    Obtener el pool compartido para una base de datos
+
+    Todos los gestores que usan la misma ruta comparten el mismo pool.
+
+    Args:
+        db_path: Ruta al archivo de base de datos
+        tamano: Tamaño del pool (por defecto config.DB_POOL_SIZE)
+
+    Returns:
+        Pool de conexiones para esa base de datos
+    """
+    clave = str(Path(db_path).resolve())
+    with _pools_lock:
+        pool = _pools.get(clave)
+        if pool is None or pool._cerrado:
+            pool = PoolConexiones(
+                db_path,
+                tamano=tamano or config.DB_POOL_SIZE,
+                timeout=config.DB_POOL_TIMEOUT_SECONDS,
+                pragmas=config.pragmas_sqlite()
+            )
+            _pools[clave] = pool
+        return pool
+
+
+def cerrar_pools():
+    """Cerrar todos los pools registrados"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.cerrar()
+        _pools.clear()
@@ -0,0 +1,49 @@
+"""
+Utilidades de Seguridad para Contraseñas
+Funciones de hash bcrypt sin dependencias de la base de datos, para poder
+ejecutarse en procesos separados sin arrastrar el estado del servidor
+"""
+
+import signal
+
+import bcrypt
+from typing import Union
+
+
+def iniciar_proceso_hash():
+    """
+    Inicializador de los workers del pool de hash
+    
+    Ctrl+C lo gestiona el proceso principal, que cierra el pool; los workers
+    lo ignoran para no volcar un KeyboardInterrupt cada uno.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def generar_hash_password(password: str) -> bytes:
+    """
+    Generar hash bcrypt de una contraseña
+    
+    Args:
+        password: Contraseña en texto plano
+    
+    Returns:
+        Hash bcrypt (incluye la sal)
+    """
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+
+def verificar_password(password: str, password_hash: Union[bytes, str]) -> bool:
+    """
+    Verificar una contraseña contra su hash bcrypt
+    
+    Args:
+        password: Contraseña en texto plano
+        password_hash: Hash almacenado en la base de datos
+    
+    Returns:
+        True si la contraseña coincide
+    """
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash)
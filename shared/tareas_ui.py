@@ -0,0 +1,189 @@
+"""
+Puente entre Tareas en Segundo Plano y la Interfaz
+Ejecuta trabajo fuera del hilo de Tk y entrega los resultados al main loop
+de customtkinter, que no es thread-safe
+"""
+
+import asyncio
+import queue
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _DespachadorTk:
+    """
+    Entrega en el hilo de Tk los resultados de tareas ejecutadas en otros threads
+
+    Los futures terminados se encolan desde cualquier thread y un sondeo con
+    after(), activo solo mientras haya tareas pendientes, invoca los
+    callbacks en el hilo de la interfaz.
+
+    Cada tarea puede asociarse a una vista: lanzar una tarea nueva para la
+    misma vista (o llamar a cancelar()) invalida la anterior, cuyo
+    resultado se descarta aunque ya esté en curso.
+    """
+
+    def __init__(self, widget, intervalo_ms: int = 30):
+        self.widget = widget
+        self.intervalo_ms = intervalo_ms
+        self._resultados: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._pendientes = 0
+        self._sondeando = False
+        self._generaciones: Dict[str, int] = {}
+        self._futuros: Dict[str, Future] = {}
+
+    def _registrar(self, futuro: Future, vista: Optional[str],
+                   al_terminar: Optional[Callable[[Any], None]],
+                   al_fallar: Optional[Callable[[BaseException], None]]) -> Future:
+        """Seguir un future recién lanzado (llamar desde el hilo de Tk)"""
+        generacion = None
+        if vista is not None:
+            self.cancelar(vista)
+            generacion = self._generaciones[vista]
+            self._futuros[vista] = futuro
+
+        self._pendientes += 1
+        futuro.add_done_callback(
+            lambda f: self._resultados.put((f, vista, generacion, al_terminar, al_fallar))
+        )
+        if not self._sondeando:
+            self._sondeando = True
+            self.widget.after(self.intervalo_ms, self._sondear)
+        return futuro
+
+    def cancelar(self, vista: str):
+        """Invalidar la tarea en curso de una vista"""
+        self._generaciones[vista] = self._generaciones.get(vista, 0) + 1
+        anterior = self._futuros.pop(vista, None)
+        if anterior is not None:
+            anterior.cancel()
+
+    def _sondear(self):
+        """Entregar en el hilo de Tk los resultados ya disponibles"""
+        while True:
+            try:
+                futuro, vista, generacion, al_terminar, al_fallar = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            self._pendientes -= 1
+
+            if vista is not None:
+                if generacion != self._generaciones.get(vista):
+                    continue  # Reemplazada por una carga más reciente
+                self._futuros.pop(vista, None)
+            if futuro.cancelled():
+                continue
+
+            error = futuro.exception()
+            try:
+                if error is None:
+                    if al_terminar:
+                        al_terminar(futuro.result())
+                elif al_fallar:
+                    al_fallar(error)
+                else:
+                    logger.error(f"Error en tarea en segundo plano: {error}", exc_info=error)
+            except Exception as e:
+                logger.error(f"Error en callback de tarea en segundo plano: {e}", exc_info=True)
+
+        if self._pendientes > 0:
+            self.widget.after(self.intervalo_ms, self._sondear)
+        else:
+            self._sondeando = False
+
+
+class EjecutorTareasUI(_DespachadorTk):
+    """
+    Pool de threads para llamadas bloqueantes (BD, red) lanzadas desde la interfaz
+
+    Ejemplo:
+        self.tareas.ejecutar(gestor_bd.obtener_estadisticas,
+                             vista='principal', al_terminar=self._pintar_stats)
+    """
+
+    def __init__(self, widget, max_workers: int = 4, intervalo_ms: int = 30):
+        super().__init__(widget, intervalo_ms)
+        self._ejecutor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="tarea-ui"
+        )
+
+    def ejecutar(self, funcion: Callable, *args,
+                 vista: Optional[str] = None,
+                 al_terminar: Optional[Callable[[Any], None]] = None,
+                 al_fallar: Optional[Callable[[BaseException], None]] = None,
+                 **kwargs) -> Future:
+        """
+        Ejecutar una función bloqueante en segundo plano (llamar desde el hilo de Tk)
+
+        Args:
+            funcion: Función a ejecutar en el pool
+            vista: Vista a la que pertenece la carga (cancela la anterior)
+            al_terminar: Callback con el resultado, invocado en el hilo de Tk
+            al_fallar: Callback con la excepción, invocado en el hilo de Tk
+
+        Returns:
+            Future de la tarea
+        """
+        futuro = self._ejecutor.submit(funcion, *args, **kwargs)
+        return self._registrar(futuro, vista, al_terminar, al_fallar)
+
+    def cerrar(self):
+        """Descartar tareas pendientes sin esperar a las que están en curso"""
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+class PuenteAsyncio(_DespachadorTk):
+    """
+    Event loop de asyncio en un thread propio, conectado a un widget de Tk
+
+    Las corrutinas se envían al loop con ejecutar() y sus callbacks se
+    invocan en el hilo de la interfaz.
+    """
+
+    def __init__(self, widget, intervalo_ms: int = 30):
+        super().__init__(widget, intervalo_ms)
+        self.loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(
+            target=self._ejecutar_loop,
+            name="asyncio-ui",
+            daemon=True
+        )
+        self._hilo.start()
+
+    def _ejecutar_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def ejecutar(self, corrutina: Coroutine,
+                 vista: Optional[str] = None,
+                 al_terminar: Optional[Callable[[Any], None]] = None,
+                 al_fallar: Optional[Callable[[BaseException], None]] = None) -> Future:
+        """
+        Ejecutar una corrutina en el loop de fondo (llamar desde el hilo de Tk)
+
+        Args:
+            corrutina: Corrutina a ejecutar
+            vista: Vista a la que pertenece la carga (cancela la anterior)
+            al_terminar: Callback con el resultado, invocado en el hilo de Tk
+            al_fallar: Callback con la excepción, invocado en el hilo de Tk
+
+        Returns:
+            Future concurrente (cancelarlo cancela la corrutina)
+        """
+        futuro = asyncio.run_coroutine_threadsafe(corrutina, self.loop)
+        return self._registrar(futuro, vista, al_terminar, al_fallar)
+
+    def cerrar(self, corrutina_cierre: Optional[Coroutine] = None):
+        """Detener el loop (opcionalmente tras ejecutar una corrutina de cierre)"""
+        if corrutina_cierre is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(corrutina_cierre, self.loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Error cerrando recursos asíncronos: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._hilo.join(timeout=5)
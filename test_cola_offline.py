@@ -0,0 +1,79 @@
+"""
+Pruebas de la cola offline del cliente: reintentos con backoff
+"""
+
+import pytest
+
+from shared import offline_queue
+from shared.offline_queue import AlmacenOffline
+
+
+class Reloj:
+    """Sustituto de time.time controlado por la prueba"""
+
+    def __init__(self, ahora: float = 1_000_000.0):
+        self.ahora = ahora
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(offline_queue.time, 'time', reloj)
+    return reloj
+
+
+@pytest.fixture
+def almacen(tmp_path, reloj):
+    almacen = AlmacenOffline(str(tmp_path / "offline.db"))
+    yield almacen
+    almacen._conn.close()
+
+
+def _disponible_desde(almacen, operacion_id):
+    return almacen._conn.execute(
+        "SELECT disponible_desde FROM operaciones_offline WHERE id = ?", (operacion_id,)
+    ).fetchone()[0]
+
+
+def test_fallo_aplaza_la_operacion(almacen, reloj):
+    primera = almacen.encolar({'tipo': 'progreso', 'datos': {'n': 1}})
+    segunda = almacen.encolar({'tipo': 'progreso', 'datos': {'n': 2}})
+
+    assert almacen.registrar_fallo(primera, max_intentos=5, espera_segundos=10) == 1
+
+    assert [op['id'] for op in almacen.siguiente_lote(10)] == [segunda]
+    assert almacen.contar_pendientes() == 2
+
+    reloj.ahora += 10
+    lote = almacen.siguiente_lote(10)
+    assert [op['id'] for op in lote] == [segunda, primera]
+    assert lote[1]['intentos'] == 1
+    assert lote[1]['datos'] == {'n': 1}
+
+
+def test_espera_exponencial(almacen, reloj):
+    operacion_id = almacen.encolar({'tipo': 'progreso'})
+
+    for intentos, espera in [(1, 5), (2, 10), (3, 20)]:
+        assert almacen.registrar_fallo(operacion_id, max_intentos=5, espera_segundos=5) == intentos
+        assert _disponible_desde(almacen, operacion_id) == pytest.approx(reloj.ahora + espera)
+
+        reloj.ahora += espera - 1
+        assert almacen.siguiente_operacion() is None
+        reloj.ahora += 1
+        assert almacen.siguiente_operacion()['id'] == operacion_id
+
+
+def test_se_descarta_al_llegar_al_maximo(almacen):
+    operacion_id = almacen.encolar({'tipo': 'progreso'})
+
+    assert almacen.registrar_fallo(operacion_id, max_intentos=2) == 1
+    assert almacen.registrar_fallo(operacion_id, max_intentos=2) == 2
+    assert almacen.contar_pendientes() == 0
+
+
+def test_fallo_de_operacion_inexistente(almacen):
+    assert almacen.registrar_fallo(12345, max_intentos=3) == 3
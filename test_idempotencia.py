@@ -0,0 +1,155 @@
+"""
+Pruebas de las claves de idempotencia: reserva en la base de datos y
+middleware Idempotency-Key del servidor
+"""
+
+import hashlib
+import json
+
+import pytest
+
+from madre_db import GestorBaseDatos
+from shared.pool_conexiones import cerrar_pools
+
+
+@pytest.fixture
+def gestor(tmp_path):
+    gestor = GestorBaseDatos(str(tmp_path / "gym.db"))
+    yield gestor
+    cerrar_pools()
+
+
+# ---- Base de datos ----
+
+def test_primera_reserva_y_repeticion_en_curso(gestor):
+    assert gestor.reservar_clave_idempotencia('clave-1', 'huella-a', 60) is None
+
+    existente = gestor.reservar_clave_idempotencia('clave-1', 'huella-a', 60)
+    assert existente['huella'] == 'huella-a'
+    assert existente['status_code'] is None
+
+
+def test_respuesta_guardada_se_repite(gestor):
+    gestor.reservar_clave_idempotencia('clave-1', 'huella-a', 60)
+    gestor.guardar_respuesta_idempotente('clave-1', 201, b'{"id": 7}', 'application/json', 3600)
+
+    existente = gestor.reservar_clave_idempotencia('clave-1', 'huella-a', 60)
+    assert existente == {
+        'huella': 'huella-a', 'status_code': 201,
+        'cuerpo': b'{"id": 7}', 'content_type': 'application/json'
+    }
+
+
+def test_liberar_solo_afecta_reservas_en_curso(gestor):
+    gestor.reservar_clave_idempotencia('en-curso', 'huella-a', 60)
+    gestor.reservar_clave_idempotencia('guardada', 'huella-b', 60)
+    gestor.guardar_respuesta_idempotente('guardada', 200, b'{}', 'application/json', 3600)
+
+    gestor.liberar_clave_idempotencia('en-curso')
+    gestor.liberar_clave_idempotencia('guardada')
+
+    assert gestor.reservar_clave_idempotencia('en-curso', 'huella-a', 60) is None
+    assert gestor.reservar_clave_idempotencia('guardada', 'huella-b', 60)['status_code'] == 200
+
+
+def test_claves_caducadas_se_pueden_reservar(gestor):
+    # Reserva interrumpida cuyo plazo en curso ya venció
+    gestor.reservar_clave_idempotencia('interrumpida', 'huella-a', -1)
+    assert gestor.reservar_clave_idempotencia('interrumpida', 'huella-a', 60) is None
+
+    # Respuesta guardada con el TTL vencido
+    gestor.reservar_clave_idempotencia('vieja', 'huella-b', 60)
+    gestor.guardar_respuesta_idempotente('vieja', 200, b'{}', 'application/json', -1)
+    assert gestor.reservar_clave_idempotencia('vieja', 'huella-c', 60) is None
+
+
+# ---- Middleware ----
+
+@pytest.fixture
+def cliente(gestor, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+    from fastapi.testclient import TestClient
+
+    import madre_server
+
+    monkeypatch.setattr(madre_server, 'gestor_bd', gestor)
+
+    app = FastAPI()
+    app.middleware("http")(madre_server.middleware_idempotencia)
+    llamadas = []
+
+    @app.post("/eco")
+    async def eco(request: Request):
+        llamadas.append(await request.json())
+        return {"llamada": len(llamadas)}
+
+    @app.post("/no-disponible")
+    async def no_disponible():
+        llamadas.append(None)
+        return JSONResponse(status_code=503, content={"llamada": len(llamadas)})
+
+    @app.post("/api/auth/login")
+    async def login():
+        llamadas.append(None)
+        return {"token": f"token-{len(llamadas)}"}
+
+    with TestClient(app) as cliente:
+        cliente.llamadas = llamadas
+        yield cliente
+
+
+def _post(cliente, ruta, cuerpo, clave):
+    return cliente.post(
+        ruta, content=json.dumps(cuerpo).encode(),
+        headers={"Content-Type": "application/json", "Idempotency-Key": clave}
+    )
+
+
+def test_repeticion_devuelve_la_respuesta_guardada(cliente):
+    primera = _post(cliente, "/eco", {"serie": 1}, "clave-1")
+    segunda = _post(cliente, "/eco", {"serie": 1}, "clave-1")
+
+    assert primera.status_code == segunda.status_code == 200
+    assert segunda.json() == primera.json() == {"llamada": 1}
+    assert segunda.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in primera.headers
+    assert len(cliente.llamadas) == 1
+
+
+def test_misma_clave_con_otro_cuerpo(cliente):
+    _post(cliente, "/eco", {"serie": 1}, "clave-1")
+    respuesta = _post(cliente, "/eco", {"serie": 2}, "clave-1")
+
+    assert respuesta.status_code == 422
+    assert len(cliente.llamadas) == 1
+
+
+def test_peticion_original_en_curso(cliente, gestor):
+    cuerpo = json.dumps({"serie": 1}).encode()
+    huella = hashlib.sha256(b"POST /eco?\n" + cuerpo).hexdigest()
+    gestor.reservar_clave_idempotencia("clave-1", huella, 60)
+
+    respuesta = _post(cliente, "/eco", {"serie": 1}, "clave-1")
+
+    assert respuesta.status_code == 409
+    assert cliente.llamadas == []
+
+
+def test_error_transitorio_libera_la_clave(cliente):
+    primera = _post(cliente, "/no-disponible", {}, "clave-1")
+    segunda = _post(cliente, "/no-disponible", {}, "clave-1")
+
+    assert (primera.status_code, segunda.status_code) == (503, 503)
+    assert segunda.json() == {"llamada": 2}
+    assert "Idempotent-Replayed" not in segunda.headers
+
+
+def test_rutas_de_autenticacion_no_se_guardan(cliente, gestor):
+    primera = _post(cliente, "/api/auth/login", {}, "clave-1")
+    segunda = _post(cliente, "/api/auth/login", {}, "clave-1")
+
+    assert primera.json() != segunda.json()
+    assert gestor.reservar_clave_idempotencia("clave-1", "huella", 60) is None
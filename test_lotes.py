@@ -0,0 +1,83 @@
+"""
+Pruebas de la ingesta en lote de asistencias y evaluaciones
+"""
+
+import pytest
+
+from madre_db import GestorBaseDatos
+from shared.pool_conexiones import cerrar_pools
+
+
+@pytest.fixture
+def gestor(tmp_path):
+    gestor = GestorBaseDatos(str(tmp_path / "gym.db"))
+    yield gestor
+    cerrar_pools()
+
+
+@pytest.fixture
+def alumnos(gestor):
+    return [
+        gestor.crear_usuario(nombre, f"{nombre.lower()}@example.com", "clave-segura-1",
+                             password_hash=b"hash-de-prueba")
+        for nombre in ("Ana", "Bruno")
+    ]
+
+
+def _fila(gestor, tabla, fila_id):
+    with gestor._obtener_conexion() as conn:
+        return dict(conn.execute(f"SELECT * FROM {tabla} WHERE id = ?", (fila_id,)).fetchone())
+
+
+def test_ids_de_asistencia_corresponden_a_cada_fila(gestor, alumnos):
+    ana, bruno = alumnos
+    # Filas previas para que los IDs del lote no empiecen en 1
+    gestor.registrar_asistencias_lote([{'alumno_id': ana, 'fecha_hora': '2024-01-01T08:00:00'}] * 3)
+
+    resultados = gestor.registrar_asistencias_lote([
+        {'alumno_id': ana, 'fecha_hora': '2024-03-01T08:00:00', 'tipo_sesion': 'fuerza'},
+        {'alumno_id': 999, 'fecha_hora': '2024-03-01T09:00:00'},
+        {'alumno_id': bruno, 'fecha_hora': '2024-03-02T10:30:00', 'tipo_sesion': 'cardio'},
+        {'alumno_id': ana, 'fecha_hora': 'ayer'},
+        {'alumno_id': bruno, 'fecha_hora': '2024-03-03T18:15:00'},
+    ])
+
+    assert [r['exito'] for r in resultados] == [True, False, True, False, True]
+    assert resultados[1]['error'] == 'Alumno no encontrado'
+    assert resultados[3]['error'] == 'fecha_hora inválida'
+
+    esperadas = {
+        0: (ana, '2024-03-01', '08:00:00', 'fuerza'),
+        2: (bruno, '2024-03-02', '10:30:00', 'cardio'),
+        4: (bruno, '2024-03-03', '18:15:00', 'general'),
+    }
+    for indice, (alumno_id, fecha, hora, tipo) in esperadas.items():
+        fila = _fila(gestor, 'asistencia', resultados[indice]['asistencia_id'])
+        assert (fila['alumno_id'], fila['fecha'], fila['hora_entrada'], fila['tipo_sesion']) == \
+            (alumno_id, fecha, hora, tipo)
+
+
+def test_ids_de_evaluacion_corresponden_a_cada_fila(gestor, alumnos):
+    ana, bruno = alumnos
+    gestor.registrar_evaluaciones_lote([{'alumno_id': bruno, 'peso_kg': 80, 'altura_cm': 180}])
+
+    resultados = gestor.registrar_evaluaciones_lote([
+        {'alumno_id': ana, 'peso_kg': 60, 'altura_cm': 165, 'fecha': '2024-02-01T10:00:00'},
+        {'alumno_id': bruno, 'peso_kg': 82, 'altura_cm': 0},
+        {'alumno_id': bruno, 'peso_kg': 81, 'altura_cm': 180, 'notas': 'control'},
+    ])
+
+    assert [r['exito'] for r in resultados] == [True, False, True]
+    assert resultados[1]['error'] == 'Altura inválida'
+
+    primera = _fila(gestor, 'evaluaciones', resultados[0]['evaluacion_id'])
+    assert (primera['alumno_id'], primera['peso_kg'], primera['fecha']) == (ana, 60, '2024-02-01T10:00:00')
+    tercera = _fila(gestor, 'evaluaciones', resultados[2]['evaluacion_id'])
+    assert (tercera['alumno_id'], tercera['peso_kg'], tercera['notas']) == (bruno, 81, 'control')
+
+
+def test_lote_sin_filas_validas(gestor):
+    assert gestor.registrar_asistencias_lote([]) == []
+    assert gestor.registrar_asistencias_lote([{'alumno_id': 1}]) == [
+        {'indice': 0, 'exito': False, 'error': 'Alumno no encontrado'}
+    ]
@@ -0,0 +1,110 @@
+"""
+Pruebas de la paginación por cursor (keyset) del listado de alumnos
+"""
+
+import base64
+
+import pytest
+
+from madre_db import GestorBaseDatos, codificar_cursor, decodificar_cursor
+from shared.pool_conexiones import cerrar_pools
+
+
+@pytest.fixture
+def gestor(tmp_path):
+    gestor = GestorBaseDatos(str(tmp_path / "gym.db"))
+    yield gestor
+    cerrar_pools()
+
+
+def _crear_alumnos(gestor, nombres):
+    return [
+        gestor.crear_usuario(nombre, f"alumno{i}@example.com", "clave-segura-1",
+                             password_hash=b"hash-de-prueba")
+        for i, nombre in enumerate(nombres)
+    ]
+
+
+def _recorrer(gestor, limite, **filtros):
+    """Recorrer todas las páginas devolviendo los IDs y los tamaños de página"""
+    ids, tamanos, cursor_pagina = [], [], None
+    while True:
+        alumnos, cursor_pagina = gestor.obtener_alumnos_pagina(
+            limite=limite, cursor_pagina=cursor_pagina, **filtros
+        )
+        ids.extend(a.id for a in alumnos)
+        tamanos.append(len(alumnos))
+        if cursor_pagina is None:
+            return ids, tamanos
+
+
+def test_cursor_ida_y_vuelta():
+    for nombre, alumno_id in [("Ana", 1), ("José Núñez", 42), ("", 0), ("a/b+c=", 10 ** 12)]:
+        cursor = codificar_cursor(nombre, alumno_id)
+        assert "=" not in cursor
+        assert decodificar_cursor(cursor) == (nombre, alumno_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "no es base64!",
+    base64.urlsafe_b64encode(b"no es json").decode(),
+    base64.urlsafe_b64encode(b'{"nombre": "Ana"}').decode(),
+    base64.urlsafe_b64encode(b'["Ana", "uno"]').decode(),
+    base64.urlsafe_b64encode(b'["Ana"]').decode(),
+])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError, match="Cursor de paginación inválido"):
+        decodificar_cursor(cursor)
+
+
+def test_paginas_recorren_todos_en_orden(gestor):
+    # Nombres repetidos para que el desempate por id caiga entre páginas
+    ids = _crear_alumnos(gestor, ["Carla", "Ana", "Bruno", "Ana", "Ana", "Bruno", "Dario"])
+
+    recorridos, tamanos = _recorrer(gestor, limite=2)
+
+    esperados = [a.id for a in gestor.obtener_alumnos(limite=100)]
+    assert recorridos == esperados
+    assert sorted(recorridos) == sorted(ids)
+    assert tamanos == [2, 2, 2, 1]
+
+
+def test_ultima_pagina_completa_no_devuelve_cursor(gestor):
+    _crear_alumnos(gestor, ["Ana", "Bruno", "Carla", "Dario"])
+
+    primera, cursor_pagina = gestor.obtener_alumnos_pagina(limite=2)
+    segunda, siguiente = gestor.obtener_alumnos_pagina(limite=2, cursor_pagina=cursor_pagina)
+
+    assert [a.nombre for a in primera] == ["Ana", "Bruno"]
+    assert [a.nombre for a in segunda] == ["Carla", "Dario"]
+    assert siguiente is None
+
+
+def test_cursor_continua_tras_la_ultima_fila(gestor):
+    _crear_alumnos(gestor, ["Ana", "Ana", "Ana"])
+    primera, _ = gestor.obtener_alumnos_pagina(limite=3)
+
+    cursor_pagina = codificar_cursor(primera[1].nombre, primera[1].id)
+    resto, siguiente = gestor.obtener_alumnos_pagina(limite=10, cursor_pagina=cursor_pagina)
+
+    assert [a.id for a in resto] == [primera[2].id]
+    assert siguiente is None
+
+
+def test_paginas_con_filtros(gestor):
+    ids = _crear_alumnos(gestor, ["Ana", "Andrés", "An%to", "Bruno", "Anabel"])
+    with gestor._obtener_conexion() as conn:
+        conn.execute("UPDATE usuarios SET estado = 'inactivo' WHERE id = ?", (ids[1],))
+
+    activos, _ = _recorrer(gestor, limite=1, estado="activo", buscar="an")
+    assert activos == [ids[2], ids[0], ids[4]]
+
+    # '%' se busca literal, no como comodín
+    literales, _ = _recorrer(gestor, limite=1, buscar="An%")
+    assert literales == [ids[2]]
+
+
+def test_lista_vacia(gestor):
+    alumnos, siguiente = gestor.obtener_alumnos_pagina(limite=5)
+    assert alumnos == []
+    assert siguiente is None
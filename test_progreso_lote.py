@@ -0,0 +1,106 @@
+"""
+Pruebas del registro de progreso en lote con claves de idempotencia
+"""
+
+import threading
+
+import pytest
+
+from madre_db import GestorBaseDatos
+from shared.pool_conexiones import cerrar_pools
+
+
+@pytest.fixture
+def gestor(tmp_path):
+    gestor = GestorBaseDatos(str(tmp_path / "gym.db"))
+    yield gestor
+    cerrar_pools()
+
+
+@pytest.fixture
+def alumno_id(gestor):
+    return gestor.crear_usuario("Ana", "ana@example.com", "clave-segura-1")
+
+
+def _contar_registros(gestor) -> int:
+    with gestor._obtener_conexion() as conn:
+        return conn.execute("SELECT COUNT(*) FROM registros_progreso").fetchone()[0]
+
+
+def _registro(alumno_id, clave, **extra):
+    return {'usuario_id': alumno_id, 'clave_idempotencia': clave, 'datos': {'series': 3}, **extra}
+
+
+def test_misma_clave_en_lotes_separados(gestor, alumno_id):
+    primero = gestor.registrar_progresos_lote([_registro(alumno_id, 'clave-a')])[0]
+    segundo = gestor.registrar_progresos_lote([_registro(alumno_id, 'clave-a')])[0]
+
+    assert primero['exito'] and not primero['duplicado']
+    assert segundo['exito'] and segundo['duplicado']
+    assert segundo['progreso_id'] == primero['progreso_id']
+    assert _contar_registros(gestor) == 1
+
+
+def test_misma_clave_dentro_del_lote(gestor, alumno_id):
+    resultados = gestor.registrar_progresos_lote([
+        _registro(alumno_id, 'clave-a'),
+        _registro(alumno_id, 'clave-b'),
+        _registro(alumno_id, 'clave-a'),
+    ])
+
+    assert [r['indice'] for r in resultados] == [0, 1, 2]
+    assert [r['duplicado'] for r in resultados] == [False, False, True]
+    assert resultados[2]['progreso_id'] == resultados[0]['progreso_id']
+    assert resultados[1]['progreso_id'] != resultados[0]['progreso_id']
+    assert _contar_registros(gestor) == 2
+
+
+def test_lotes_concurrentes_con_la_misma_clave(gestor, alumno_id):
+    # Reintento del cliente compitiendo con el envío original: varios lotes
+    # con la misma clave a la vez, repetido para abrir la ventana de carrera
+    errores = []
+    for ronda in range(40):
+        barrera = threading.Barrier(8)
+        resultados = []
+
+        def enviar():
+            barrera.wait()
+            try:
+                resultados.append(gestor.registrar_progresos_lote([_registro(alumno_id, f'clave-{ronda}')])[0])
+            except Exception as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=enviar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert errores == []
+        assert len({r['progreso_id'] for r in resultados}) == 1
+        assert sum(not r['duplicado'] for r in resultados) == 1
+
+    assert _contar_registros(gestor) == 40
+
+
+def test_registros_sin_clave_no_se_deduplican(gestor, alumno_id):
+    resultados = gestor.registrar_progresos_lote([
+        _registro(alumno_id, None),
+        _registro(alumno_id, None),
+    ])
+
+    assert all(r['exito'] and not r['duplicado'] for r in resultados)
+    assert resultados[0]['progreso_id'] != resultados[1]['progreso_id']
+
+
+def test_errores_por_elemento(gestor, alumno_id):
+    resultados = gestor.registrar_progresos_lote([
+        _registro(alumno_id, 'clave-a', fecha='no-es-fecha'),
+        _registro(alumno_id + 999, 'clave-b'),
+        _registro(alumno_id, 'clave-c'),
+    ])
+
+    assert resultados[0] == {'indice': 0, 'exito': False, 'error': 'Fecha inválida'}
+    assert resultados[1] == {'indice': 1, 'exito': False, 'error': 'Alumno no encontrado'}
+    assert resultados[2]['exito']
+    assert _contar_registros(gestor) == 1